@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmark project name suggestions.
+
+Compares stashbot.fuzzy.NameIndex with a linear scan over every project name
+for misspelled names. Run from the top of the repository::
+
+    $ python3 bench/fuzzy_projects.py
+    $ python3 bench/fuzzy_projects.py --names projects.txt
+
+The --names file has one project or tool account name per line, for example
+the cn values of ou=projects and ou=servicegroups from LDAP. Without it a
+synthetic list of a similar size and shape is used.
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stashbot import fuzzy  # noqa: E402
+
+
+def synthetic_names(rng, projects=800, tools=3500):
+    alphabet = string.ascii_lowercase + "-"
+
+    def word():
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 16)))
+
+    names = {word().strip("-") or "x" for _ in range(projects)}
+    names.update("tools.%s" % word().strip("-") for _ in range(tools))
+    return sorted(names)
+
+
+def misspell(rng, name):
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        pos = rng.randrange(len(chars))
+        op = rng.choice("sdi")
+        if op == "s":
+            chars[pos] = rng.choice(string.ascii_lowercase)
+        elif op == "d" and len(chars) > 1:
+            del chars[pos]
+        else:
+            chars.insert(pos, rng.choice(string.ascii_lowercase))
+    return "".join(chars)
+
+
+def linear(names, word, k=3, max_distance=2):
+    found = [(fuzzy.distance(word, n), n) for n in names]
+    return [n for d, n in sorted(found)[:k] if d <= max_distance]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", help="File of project names")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=808)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.names:
+        with open(args.names) as f:
+            names = sorted({line.strip() for line in f if line.strip()})
+    else:
+        names = synthetic_names(rng)
+    queries = [misspell(rng, rng.choice(names)) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    index = fuzzy.NameIndex(names)
+    build = time.perf_counter() - start
+    print("%d names, index built in %.1f ms" % (len(index), build * 1000))
+
+    start = time.perf_counter()
+    got = [index.search(q) for q in queries]
+    indexed = (time.perf_counter() - start) / len(queries)
+
+    sample = queries[: max(1, len(queries) // 10)]
+    start = time.perf_counter()
+    want = [linear(names, q) for q in sample]
+    scan = (time.perf_counter() - start) / len(sample)
+
+    mismatches = sum(
+        1
+        for g, w, q in zip(got, want, sample)
+        if [fuzzy.distance(q, n) for n in g]
+        != [fuzzy.distance(q, n) for n in w]
+    )
+    print("index search: %8.1f us/query" % (indexed * 1e6))
+    print("linear scan:  %8.1f us/query" % (scan * 1e6))
+    print("speedup:      %8.1fx" % (scan / indexed))
+    if mismatches:
+        print("%d results differ from the linear scan" % mismatches)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
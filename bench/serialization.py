@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmark JSON encoding of Elasticsearch and Conduit requests.
+
+Compares stashbot.serializer with the stdlib json encoding that the
+elasticsearch client and phab.Client used before, for irc-* documents sent
+one at a time and in bulk, and for maniphest.edit params. Run from the top
+of the repository::
+
+    $ python3 bench/serialization.py
+    $ python3 bench/serialization.py --docs 50000
+
+The backend is orjson or msgspec if installed, otherwise stdlib json.
+Uninstall them to measure the fallback.
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import elasticsearch.helpers  # noqa: E402
+import elasticsearch.serializer  # noqa: E402
+
+from stashbot import es  # noqa: E402
+from stashbot import serializer  # noqa: E402
+
+
+def synthetic_docs(rng, count):
+    words = [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+        for n in range(2, 10)
+        for _ in range(50)
+    ]
+    nicks = ["user%d" % n for n in range(200)]
+    docs = []
+    for n in range(count):
+        nick = rng.choice(nicks)
+        message = " ".join(
+            rng.choice(words) for _ in range(rng.randint(3, 25))
+        )
+        if n % 20 == 0:
+            message += " ünïcødé ✓"
+        docs.append(
+            es.make_doc(
+                message,
+                1767225600 + n,
+                "%s!~%s@user/%s" % (nick, nick, nick),
+                "#wikimedia-cloud",
+                "irc.libera.chat",
+            )
+        )
+    return docs
+
+
+def old_bulk(actions):
+    # What elasticsearch.helpers.bulk and urllib3 did with our actions
+    ser = elasticsearch.serializer.JSONSerializer()
+    lines = []
+    for action in actions:
+        head, doc = elasticsearch.helpers.expand_action(action)
+        lines.append(ser.dumps(head))
+        lines.append(ser.dumps(doc))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def new_bulk(actions):
+    return b"".join(body for body, docs in serializer.bulk_chunks(actions))
+
+
+def old_index(docs):
+    ser = elasticsearch.serializer.JSONSerializer()
+    return [ser.dumps(doc).encode("utf-8") for doc in docs]
+
+
+def new_index(docs):
+    return [serializer.dumps(doc) for doc in docs]
+
+
+def old_phab(params):
+    return [json.dumps(p) for p in params]
+
+
+def new_phab(params):
+    return [serializer.dumps(p) for p in params]
+
+
+def timed(func, arg, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=808)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs = synthetic_docs(rng, args.docs)
+    actions = [{"_index": "irc-2026.01", "_source": d} for d in docs]
+    params = [
+        {
+            "objectIdentifier": "PHID-TASK-%020d" % n,
+            "transactions": [{"type": "comment", "value": d["message"]}],
+            "__conduit__": {"token": "api-xxxxxxxxxxxxxxxxxxxxxxxxxxxx"},
+        }
+        for n, d in enumerate(docs)
+    ]
+
+    print("Backend: %s" % serializer.BACKEND)
+    print("%d documents, best of %d runs" % (args.docs, args.runs))
+    print("%-20s %12s %12s %8s" % ("", "stdlib us", "new us", "speedup"))
+    for name, old, new, arg in (
+        ("index (per doc)", old_index, new_index, docs),
+        ("bulk (per doc)", old_bulk, new_bulk, actions),
+        ("conduit params", old_phab, new_phab, params),
+    ):
+        before = timed(old, arg, args.runs) / len(arg) * 1e6
+        after = timed(new, arg, args.runs) / len(arg) * 1e6
+        print(
+            "%-20s %12.2f %12.2f %7.1fx"
+            % (name, before, after, before / after)
+        )
+    old_body, new_body = old_bulk(actions), new_bulk(actions)
+    assert [json.loads(x) for x in old_body.splitlines()] == [
+        json.loads(x) for x in new_body.splitlines()
+    ]
+
+
+if __name__ == "__main__":
+    main()
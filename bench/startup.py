@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmark bot startup.
+
+Each run starts a new interpreter that imports stashbot.cli, loads the
+config and builds the bots, stopping just before they connect. That is the
+part of the time to first join that does not depend on the IRC server; the
+bot logs the full time to its first join when it runs. The slowest imports
+are taken from ``python -X importtime``. Run from the top of the
+repository::
+
+    $ python3 bench/startup.py
+    $ python3 bench/startup.py --config etc/config.yaml --runs 20
+
+Without --config a config with only the required sections is used, which
+is what a channel without wikis or Mastodon accounts needs.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+MINIMAL_CONFIG = """\
+irc:
+  server: irc.invalid
+  port: 6697
+  nick: stashbot
+  realname: Stashbot
+  password: secret
+  channels: ['#test']
+elasticsearch:
+  servers: ['http://localhost:9200']
+  options: {}
+  index: irc-%Y.%m
+ldap:
+  uri: ldap://ldap.invalid
+  base: dc=invalid
+phab:
+  url: https://phab.invalid
+  user: stashbot
+  key: key
+  delay:
+    __default__: 300
+bash:
+  view_url: https://bash.invalid/%s
+sal:
+  view_url: https://sal.invalid/%s
+  channels:
+    '#test':
+      project: test
+"""
+
+# Runs in the child; prints seconds spent importing and building the bots
+CHILD = """\
+import logging, sys, time
+start = time.perf_counter()
+import stashbot.backends, stashbot.bot, stashbot.cli, stashbot.config
+imported = time.perf_counter()
+config = stashbot.config.load(sys.argv[1])
+loaded = time.perf_counter()
+log = logging.getLogger("bench")
+shared = stashbot.backends.Backends(config, log)
+for network in stashbot.backends.network_configs(config):
+    stashbot.bot.Stashbot(network, log, shared)
+built = time.perf_counter()
+print(imported - start, loaded - imported, built - loaded)
+"""
+
+
+def run_child(config):
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, config],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    total = time.perf_counter() - start
+    return [float(x) for x in out.split()] + [total]
+
+
+def import_times(module):
+    """Get the cumulative import time of each top level package.
+
+    :return: dict of package name to microseconds
+    """
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % module],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.split("|")
+        cumulative = parts[1].strip()
+        if not cumulative.isdigit():
+            continue
+        top = parts[2].strip().split(".")[0]
+        if top != "stashbot":
+            times[top] = max(times.get(top, 0), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--config", help="Config file to start with")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    config = args.config
+    tmp = None
+    if config is None:
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False)
+        tmp.write(MINIMAL_CONFIG)
+        tmp.close()
+        config = tmp.name
+    try:
+        run_child(config)  # warm the page cache and .pyc files
+        runs = [run_child(config) for _ in range(args.runs)]
+    finally:
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+    print("Median of %d runs:" % args.runs)
+    for i, label in enumerate(
+        ("import", "load config", "build bots", "process total")
+    ):
+        print(
+            "  %-14s %8.1f ms"
+            % (label, statistics.median(r[i] for r in runs) * 1000)
+        )
+
+    times = import_times("stashbot.cli")
+    print("Slowest packages imported by stashbot.cli:")
+    for name, us in sorted(times.items(), key=lambda x: -x[1])[: args.top]:
+        print("  %-20s %8.1f ms" % (name, us / 1000))
+
+
+if __name__ == "__main__":
+    main()
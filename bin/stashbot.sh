@@ -32,7 +32,7 @@ case "$1" in
         date +%Y-%m-%dT%H:%M:%S
         echo "Running stashbot..."
         cd ${TOOL_DIR}
-        exec python3 -m stashbot --config ${CONFIG}
+        exec python3 -m stashbot --config ${CONFIG} --http 0.0.0.0:8080
         ;;
     stop)
         echo "Stopping stashbot k8s deployment..."
@@ -15,8 +15,19 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
-from .bot import Stashbot
+import time
+
+# For measuring the time to the first channel join
+STARTED = time.monotonic()
 
 __all__ = ("Stashbot",)
 
-any((Stashbot,))
+
+def __getattr__(name):
+    # The bot is imported on first use so that maintenance commands and
+    # worker processes that don't need it start faster.
+    if name == "Stashbot":
+        from .bot import Stashbot
+
+        return Stashbot
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
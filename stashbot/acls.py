@@ -19,8 +19,13 @@
 import fnmatch
 import irc.client
 
+GROUP_PREFIX = "group:"
 
-def check(config, source):
+# Cloaks that are only given to verified accounts
+TRUSTED_CLOAKS = ("wikimedia/",)
+
+
+def check(config, source, groups=None):
     """Check a message source against an acl collection.
 
     The dict of acls can contain these keys:
@@ -32,14 +37,22 @@ def check(config, source):
     Account masks have three parts: nick!user@host
     Each part can use shell style "glob" pattern matching.
 
+    A 'group:<cn>' entry matches the members of an LDAP group by the last
+    part of their cloak (e.g. wikimedia/<account>). Only the trusted cloaks
+    of the groups.Membership are used.
+
     :param config: dict of access control rules
     :param source: message source to check
+    :param groups: groups.Membership used for 'group:<cn>' entries
     :return: bool
     """
     order = config.get("order", "allow,deny").split(",")
     for check_type in order:
         action = check_list(
-            config.get(check_type, []), source, check_type == "allow"
+            config.get(check_type, []),
+            source,
+            check_type == "allow",
+            groups,
         )
         if action is not None:
             return action
@@ -47,29 +60,73 @@ def check(config, source):
     return config.get("default", "allow") == "allow"
 
 
-def check_list(masks, source, match_action):
+def check_list(masks, source, match_action, groups=None):
     """Check a message source against a list of masks.
 
     :param masks: list of masks
     :param source: message source to check
+    :param groups: groups.Membership used for 'group:<cn>' entries
     :return: match_action or None
     """
     for mask in masks:
-        if check_mask(mask, source):
+        if check_mask(mask, source, groups):
             return match_action
-        return None
+    return None
 
 
-def check_mask(mask, source):
+def check_mask(mask, source, groups=None):
     """Compare a mask to a source.
 
-    :param mask: nick mask
+    :param mask: nick mask or 'group:<cn>'
     :param source: message source to check
+    :param groups: groups.Membership used for 'group:<cn>' entries
     :return: bool
     """
+    if mask.startswith(GROUP_PREFIX):
+        if groups is None:
+            return False
+        name = cloak_name(source, groups.cloaks)
+        if name is None:
+            return False
+        return name in groups.get(mask.split(":", 1)[1])
     nick_mask = irc.client.NickMask(mask)
     return (
         fnmatch.fnmatch(source.nick, nick_mask.nick)
         and fnmatch.fnmatch(source.user, nick_mask.user)
         and fnmatch.fnmatch(source.host, nick_mask.host)
     )
+
+
+def normalize(name):
+    """Normalize an account or cloak name for comparison.
+
+    >>> normalize("Bryan Davis")
+    'bryan-davis'
+    >>> normalize("Bryan_Davis")
+    'bryan-davis'
+    """
+    return name.strip().lower().replace(" ", "-").replace("_", "-")
+
+
+def cloak_name(source, prefixes=TRUSTED_CLOAKS):
+    """Get the account name from a message source's trusted cloak.
+
+    Cloaks look like 'wikimedia/bd808'. Anyone can get a 'user/<account>'
+    cloak by registering an account, so only cloaks starting with one of
+    prefixes name a known person.
+
+    >>> cloak_name(irc.client.NickMask("bd808!~bd808@wikimedia/BD808"))
+    'bd808'
+    >>> cloak_name(irc.client.NickMask("bd808!~bd808@user/bd808")) is None
+    True
+
+    :param source: message source
+    :param prefixes: trusted cloak prefixes
+    :return: normalized name or None
+    """
+    host = (source.host or "").lower()
+    if "/" not in host or not host.startswith(
+        tuple(p.lower() for p in prefixes)
+    ):
+        return None
+    return normalize(host.rsplit("/", 1)[1])
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compressed daily archive of channel messages on local disk
+
+Each UTC day is stored as a segment file of JSON lines made of
+independently compressed blocks: gzip members, or zstd frames if the
+zstandard package is installed and selected. Both formats allow members to
+be concatenated, so a segment can also be read with zcat or zstdcat.
+
+Next to each segment is an .idx file with one tab separated line per block::
+
+    <first timestamp> <offset> <length>
+
+Readers use the index to decompress only the blocks that can hold the
+times they are looking for. A block is only listed in the index after it
+has been written, so a block cut short by a crash is never read.
+"""
+
+import calendar
+import gzip
+import json
+import os
+import time
+
+from . import dedupe
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+CODECS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def _compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def parse_time(value):
+    """Parse a date or @timestamp style time to seconds since the epoch.
+
+    >>> parse_time("2026-01-02")
+    1767312000
+    >>> parse_time("2026-01-02T03:04:05Z")
+    1767323045
+    """
+    for fmt in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    raise ValueError("Unrecognized time %r" % value)
+
+
+class Writer(object):
+    """Append channel message documents to daily segments.
+
+    Documents are buffered in memory and written as one compressed block
+    when flush() is called or when the buffer holds block_size documents.
+    Messages still buffered when the process dies are lost, so flush()
+    should be called regularly and on shutdown.
+    """
+
+    def __init__(self, directory, logger, codec="gzip", block_size=1000):
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd archives need the zstandard package")
+        if codec not in CODECS:
+            raise ValueError("Unknown archive codec %r" % codec)
+        self.directory = os.path.expanduser(directory)
+        self.logger = logger
+        self.codec = codec
+        self.block_size = block_size
+        self._day = None
+        self._first = None
+        self._lines = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def append(self, doc):
+        """Add a document to the archive."""
+        when = dedupe.parse_timestamp(doc["@timestamp"])
+        day = doc["@timestamp"][:10]
+        if day != self._day:
+            self.flush()
+            self._day = day
+        if not self._lines:
+            self._first = when
+        self._lines.append(json.dumps(doc, sort_keys=True))
+        if len(self._lines) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered documents as a compressed block."""
+        if not self._lines:
+            return
+        lines, self._lines = self._lines, []
+        data = _compress(self.codec, ("\n".join(lines) + "\n").encode("utf-8"))
+        base = os.path.join(self.directory, self._day)
+        try:
+            with open(base + CODECS[self.codec], "ab") as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(base + ".idx", "a") as f:
+                f.write("%d\t%d\t%d\n" % (self._first, offset, len(data)))
+        except OSError:
+            self.logger.exception("Failed to archive %d messages", len(lines))
+
+
+class Reader(object):
+    """Read documents from an archive directory."""
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+
+    def days(self):
+        """List the days in the archive."""
+        return sorted(
+            name[:-4]
+            for name in os.listdir(self.directory)
+            if name.endswith(".idx")
+        )
+
+    def _segment(self, day):
+        for codec, suffix in CODECS.items():
+            path = os.path.join(self.directory, day + suffix)
+            if os.path.exists(path):
+                return codec, path
+        return None, None
+
+    def _blocks(self, day):
+        with open(os.path.join(self.directory, day + ".idx")) as f:
+            for line in f:
+                parts = line.split("\t")
+                if len(parts) == 3:
+                    yield tuple(int(p) for p in parts)
+
+    def read(self, start=None, end=None):
+        """Iterate over the documents in a time range in time order.
+
+        :param start: seconds since the epoch, inclusive
+        :param end: seconds since the epoch, exclusive
+        """
+        first_day = None if start is None else time.gmtime(start)[:3]
+        last_day = None if end is None else time.gmtime(end)[:3]
+        for day in self.days():
+            key = tuple(int(p) for p in day.split("-"))
+            if (first_day and key < first_day) or (
+                last_day and key > last_day
+            ):
+                continue
+            codec, path = self._segment(day)
+            if path is None:
+                continue
+            blocks = list(self._blocks(day))
+            with open(path, "rb") as f:
+                for pos, (first, offset, length) in enumerate(blocks):
+                    if end is not None and first >= end:
+                        break
+                    following = (
+                        blocks[pos + 1][0] if pos + 1 < len(blocks) else None
+                    )
+                    if (
+                        start is not None
+                        and following is not None
+                        and following < start
+                    ):
+                        # Every message in this block is too old
+                        continue
+                    f.seek(offset)
+                    data = _decompress(codec, f.read(length))
+                    for line in data.decode("utf-8").splitlines():
+                        doc = json.loads(line)
+                        when = dedupe.parse_timestamp(doc["@timestamp"])
+                        if start is not None and when < start:
+                            continue
+                        if end is not None and when >= end:
+                            return
+                        yield doc
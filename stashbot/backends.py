@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Reactor and backend clients shared by the bots of each network"""
+
+import irc.client
+
+from . import archive
+from . import bash
+from . import config as configuration
+from . import es
+from . import phab
+from . import policy
+from . import profiling
+from . import ratelimit
+from . import sal
+from . import tracing
+from . import watchdog
+from . import webserver
+from . import worker
+from . import workload
+
+
+class SharedReactor(irc.client.Reactor):
+    """Run the connections of several bots in one select loop."""
+
+    def network(self):
+        """Make a reactor for one bot's connection."""
+        return NetworkReactor(self)
+
+
+class NetworkReactor(irc.client.Reactor):
+    """One bot's view of a SharedReactor.
+
+    Connections, the scheduler and the lock belong to the parent so that
+    one process_forever() call serves every network. Event handlers are
+    kept per view, so that a bot only sees events from its own connection.
+    """
+
+    def __init__(self, parent):
+        super(NetworkReactor, self).__init__()
+        self.parent = parent
+        self.scheduler = parent.scheduler
+        self.connections = parent.connections
+        self.mutex = parent.mutex
+
+
+def network_configs(config):
+    """Get the configuration of each network to connect to.
+
+    Without a 'networks' list the whole config is the only network. Each
+    'networks' entry has a 'name' and sections (usually 'irc' and 'ha')
+    that are merged over the top level sections of the same name.
+
+    >>> confs = network_configs({
+    ...     "irc": {"nick": "stashbot", "port": 6697},
+    ...     "networks": [
+    ...         {"name": "libera", "irc": {"server": "irc.libera.chat"}},
+    ...         {"name": "oftc", "irc": {"server": "irc.oftc.net"}},
+    ...     ],
+    ... })
+    >>> [(c["name"], c["irc"]["server"], c["irc"]["port"]) for c in confs]
+    [('libera', 'irc.libera.chat', 6697), ('oftc', 'irc.oftc.net', 6697)]
+    """
+    if "networks" not in config:
+        return [dict(config, name=config["irc"]["server"])]
+    confs = []
+    for network in config["networks"]:
+        conf = {k: v for k, v in config.items() if k != "networks"}
+        for key, value in network.items():
+            if isinstance(value, dict) and isinstance(conf.get(key), dict):
+                value = dict(conf[key], **value)
+            conf[key] = value
+        confs.append(conf)
+    return confs
+
+
+class Backends(object):
+    """Clients, caches and background work shared by all networks.
+
+    One instance is made per process. Bots for each network register
+    themselves in 'bots' and use these clients rather than making their
+    own, so adding a network only adds an IRC connection.
+
+    This also stands in for the bot as sal.Logger's 'irc' argument:
+    replies are sent on the connection that the event came from.
+
+    With the 'split' config the 'frontend' role sends jobs to processes
+    running the 'worker' role instead of doing them itself. Workers do
+    not connect to IRC.
+    """
+
+    def __init__(self, config, logger, role=None, path=None, overrides=None):
+        self.config = config
+        self.logger = logger
+        self.role = role
+        self.path = path
+        self.overrides = overrides
+        self.bots = []
+        self.reactor = SharedReactor()
+        self.snapshot = configuration.snapshot(config, policy.clean_nick)
+        self.reload_requested = False
+
+        self.dispatcher = None
+        if role == "frontend":
+            self.dispatcher = worker.Dispatcher(
+                self.config["split"].get("socket", "~/stashbot.sock"),
+                self,
+                self.logger,
+                size=self.config["split"].get("queue", 1000),
+            )
+
+        self.es = es.Client(
+            self.config["elasticsearch"]["servers"],
+            self.config["elasticsearch"]["options"],
+            self.logger,
+        )
+
+        self.index_policy = self.snapshot.index_policy
+
+        self.phab = phab.Client(
+            self.config["phab"]["url"],
+            self.config["phab"]["user"],
+            self.config["phab"]["key"],
+        )
+
+        self.tracer = tracing.make_tracer(
+            self.config.get("trace"), self.logger
+        )
+        self.sal = sal.Logger(
+            self, self.phab, self.es, self.config, self.logger, self.tracer
+        )
+
+        self.quips = bash.Quips(
+            self.es,
+            self.logger,
+            secret=self.config["bash"].get("vote_secret"),
+        )
+
+        self.throttle = ratelimit.Limiter()
+
+        self.archive = None
+        if "archive" in self.config:
+            self.archive = archive.Writer(
+                self.config["archive"]["dir"],
+                self.logger,
+                codec=self.config["archive"].get("codec", "gzip"),
+                block_size=self.config["archive"].get("block_size", 1000),
+            )
+
+        self.web = None
+        if "http" in self.config and role != "worker":
+            self.web = webserver.Server(
+                self.config["http"].get("host", "127.0.0.1"),
+                self.config["http"]["port"],
+                self.logger,
+            )
+            self.web.route("/sal/", self.sal.feed.handle_latest)
+            self.web.route("/stats", self.handle_stats)
+            self.web.route("/healthz", self.handle_healthz)
+            self.web.route("/readyz", self.handle_readyz)
+
+        self.workload = workload.Scheduler(
+            self.reactor, self.logger, self.config.get("workload")
+        )
+
+        wd_conf = self.config.get("watchdog", {})
+        self.watchdog = watchdog.Watchdog(
+            self.reactor,
+            self.logger,
+            interval=wd_conf.get("interval", 1),
+            threshold=wd_conf.get("threshold", 5),
+        )
+        # Loop lag that makes /healthz fail
+        self.max_lag = wd_conf.get("unhealthy", 60)
+
+        prof_conf = self.config.get("profiling", {})
+        self.profiler = profiling.Profiler(
+            self.reactor,
+            self.logger,
+            prof_conf.get("dir", "~/profiles"),
+            top=prof_conf.get("top", 25),
+        )
+
+        self.reactor.scheduler.execute_every(
+            period=3600, func=self.do_report_stats
+        )
+        self.reactor.scheduler.execute_every(period=1, func=self.check_reload)
+        self.reactor.scheduler.execute_every(
+            period=1, func=self.profiler.check_requests
+        )
+
+        if self.dispatcher is None:
+            # Keep the quip cache fresh and save votes
+            self.reactor.scheduler.execute_after(5, self.quips.refresh_async)
+            self.reactor.scheduler.execute_every(
+                period=self.config["bash"].get("refresh", 900),
+                func=self.quips.refresh_async,
+            )
+            self.reactor.scheduler.execute_every(
+                period=60, func=self.quips.flush
+            )
+
+        if self.archive is not None:
+            self.reactor.scheduler.execute_every(
+                period=self.config["archive"].get("flush", 60),
+                func=self.archive.flush,
+            )
+
+    def start(self):
+        """Connect every bot and run the reactor."""
+        self.watchdog.start()
+        # The front end does jobs itself when no worker can take them
+        self.sal.groups.start()
+        if self.dispatcher is not None:
+            self.dispatcher.start()
+        if self.web is not None:
+            self.web.start()
+        if self.role != "worker":
+            for bot in self.bots:
+                bot._connect()
+        self.reactor.process_forever()
+
+    def shutdown(self, msg="I'll be back!"):
+        """Flush pending work and disconnect every bot."""
+        try:
+            # Finish the work that people are waiting on
+            self.workload.run(budget=30, classes=(workload.SAL, workload.BASH))
+        except Exception:
+            self.logger.exception("Error finishing queued work")
+        try:
+            self.sal.flush()
+        except Exception:
+            self.logger.exception("Error flushing SAL work")
+        try:
+            self.quips.flush()
+        except Exception:
+            self.logger.exception("Error flushing quip votes")
+        if self.archive is not None:
+            self.archive.flush()
+        if self.role != "worker":
+            for bot in self.bots:
+                bot.leave(msg)
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+        self.watchdog.stop()
+        self.sal.groups.stop()
+        if self.web is not None:
+            self.web.stop()
+        self.tracer.stop()
+
+    def request_reload(self):
+        """Ask for the config file to be reloaded on the next tick.
+
+        Safe to call from a signal handler.
+        """
+        self.reload_requested = True
+
+    def check_reload(self):
+        if self.reload_requested:
+            self.reload_requested = False
+            self.reload()
+
+    def reload(self):
+        """Load the config file again and use it if it is valid.
+
+        :return: True if the new configuration is in use
+        """
+        try:
+            snapshot = configuration.snapshot(
+                configuration.load(self.path, self.overrides),
+                policy.clean_nick,
+            )
+        except Exception:
+            self.logger.exception(
+                "Keeping current configuration; %s is not valid", self.path
+            )
+            return False
+        self.configure(snapshot)
+        return True
+
+    def configure(self, snapshot):
+        """Switch to a new configuration snapshot.
+
+        This runs on the reactor thread between events, so every handler
+        sees either the old or the new configuration. Settings that are
+        only read at startup are logged and left as they are.
+        """
+        changed = snapshot.restart_required(self.snapshot)
+        if changed:
+            self.logger.warning(
+                "Restart to apply changes to %s", ", ".join(changed)
+            )
+        snapshot.index_policy.dropped.update(self.index_policy.dropped)
+        self.snapshot = snapshot
+        self.config = snapshot.raw
+        self.index_policy = snapshot.index_policy
+        self.sal.configure(snapshot)
+        networks = {c["name"]: c for c in network_configs(snapshot.raw)}
+        for bot in self.bots:
+            if bot.name in networks:
+                bot.configure(networks[bot.name])
+        self.logger.warning("Loaded new configuration")
+
+    def _clean_nick(self, nick):
+        return policy.clean_nick(nick)
+
+    def respond(self, conn, event, msg):
+        """Respond to an event with a message."""
+        to = event.target
+        if to == conn.get_nickname():
+            to = event.source.nick
+        conn.privmsg(to, msg.replace("\n", " "))
+
+    def get_stats(self):
+        """Get counters describing the work the bots have skipped."""
+        return {
+            "index_dropped": self.index_policy.stats(),
+            "workload": self.workload.stats(),
+            "watchdog": self.watchdog.stats(),
+            "workers": self.dispatcher and self.dispatcher.stats(),
+        }
+
+    def handle_stats(self, request, query):
+        """HTTP handler for /stats."""
+        return 200, self.get_stats()
+
+    def get_health(self):
+        """Check the reactor loop and the bot for each network.
+
+        With more than one network the details of each bot are reported
+        under 'networks' and every bot must be ready for the process to be
+        ready.
+
+        :return: tuple of (live, ready, details)
+        """
+        lag = self.watchdog.lag()
+        live = lag < self.max_lag
+        ready = live and lag < self.watchdog.threshold
+        es_failures = self.es.failures
+        if self.dispatcher is not None:
+            # Workers do most of the writes in split mode
+            es_failures = max(es_failures, self.dispatcher.get_es_failures())
+        networks = {}
+        for bot in self.bots:
+            details = bot.get_health()
+            details["elasticsearch_failures"] = es_failures
+            networks[bot.name] = details
+            ready = (
+                ready
+                and details["primary_nick"]
+                and details["leader"]
+                and es_failures < 5
+            )
+        if len(networks) == 1:
+            details = dict(networks.popitem()[1], loop_lag=round(lag, 3))
+        else:
+            details = {"loop_lag": round(lag, 3), "networks": networks}
+        return live, ready, details
+
+    def handle_healthz(self, request, query):
+        """HTTP handler for /healthz (liveness)."""
+        live, ready, details = self.get_health()
+        return (200 if live else 503), details
+
+    def handle_readyz(self, request, query):
+        """HTTP handler for /readyz (readiness)."""
+        live, ready, details = self.get_health()
+        return (200 if ready else 503), details
+
+    def do_report_stats(self):
+        """Log counters every once in a while."""
+        self.logger.info("Stats: %s", self.get_stats())
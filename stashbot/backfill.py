@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Restore SAL messages from wiki pages to Elasticsearch"""
+
+import collections
+import concurrent.futures
+import datetime
+import hashlib
+import re
+
+from . import export
+from .sal import ARCHIVE_LINK_PREFIX
+from .sal import Logger
+
+RE_ENTRY = re.compile(
+    r"^\*\s*\{\{(?:safesubst:|subst:)?SAL entry\|1="
+    r"(\d{1,2}):(\d{2}) ([^\s:]+): (.*)\}\}\s*$"
+)
+# Entries written before the SAL entry template was used
+RE_PLAIN_ENTRY = re.compile(r"^\*\s*(\d{1,2}):(\d{2}) ([^\s:]+): (.*?)\s*$")
+RE_ARCHIVE_LINK = re.compile(
+    r"^%s\[\[([^|\]]+)" % re.escape(ARCHIVE_LINK_PREFIX)
+)
+
+
+def _heading_res(leader):
+    """Make regexs for dated section headings and any heading of the same
+    level as them.
+    """
+    lead = re.escape(leader)
+    return (
+        re.compile(r"^%s\s*(\d{4}-\d{2}-\d{2})\s*%s\s*$" % (lead, lead)),
+        re.compile(r"^%s(?!=).*(?<!=)%s\s*$" % (lead, lead)),
+    )
+
+
+def parse_wiki_page(lines, leader="=="):
+    """Parse !log messages from the lines of a SAL wiki page.
+
+    This is the inverse of sal.Logger._write_to_wiki(). Lines are consumed
+    one at a time so very large pages can be parsed from a stream. Entries
+    belong to the closest dated heading above them. Deeper headings do not
+    end a day, other headings of the same level do.
+
+    >>> list(parse_wiki_page([
+    ...     "== 2026-01-02 ==",
+    ...     "=== Deploys ===",
+    ...     "* {{SAL entry|1=03:04 nick: a{{!}}b}}",
+    ...     "== Notes ==",
+    ...     "* 05:06 nick: not logged",
+    ... ]))
+    [{'@timestamp': '2026-01-02T03:04:00Z', 'nick': 'nick', 'message': 'a|b'}]
+
+    :param lines: iterable of wikitext lines
+    :param leader: section header leader (e.g. '==')
+    :return: generator of dicts with @timestamp, nick and message keys
+    """
+    dated, heading = _heading_res(leader)
+    day = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if heading.match(line):
+            m = dated.match(line)
+            day = m.group(1) if m else None
+            continue
+        if day is None:
+            continue
+        m = RE_ENTRY.match(line) or RE_PLAIN_ENTRY.match(line)
+        if m:
+            hour, minute, nick, message = m.groups()
+            yield {
+                "@timestamp": "%sT%02d:%s:00Z" % (day, int(hour), minute),
+                "nick": nick,
+                "message": Logger.unsafe_arg(message),
+            }
+
+
+def find_archives(text):
+    """Find the titles of archive pages linked from a SAL page."""
+    return [
+        m.group(1)
+        for m in (RE_ARCHIVE_LINK.match(line) for line in text.split("\n"))
+        if m
+    ]
+
+
+def message_hash(nick, message):
+    """Hash a message for reconciliation."""
+    return hashlib.sha1(
+        ("%s\x00%s" % (nick, message.strip())).encode("utf-8")
+    ).hexdigest()
+
+
+def _minute(ts):
+    return export.parse_timestamp(ts).replace(second=0)
+
+
+def missing_entries(entries, existing):
+    """Find wiki entries that are not in Elasticsearch.
+
+    Wiki entries only have minute resolution and are written a moment
+    after the Elasticsearch document, so an entry matches a document with
+    the same nick and message from the same or the previous minute. Each
+    document can only match one entry so that repeated messages are
+    counted correctly.
+
+    :param entries: iterable of parsed wiki entries
+    :param existing: iterable of SAL documents from Elasticsearch
+    :return: generator of entries with no matching document
+    """
+    seen = collections.defaultdict(collections.Counter)
+    for doc in existing:
+        key = message_hash(doc["nick"], doc["message"])
+        seen[key][_minute(doc["@timestamp"])] += 1
+
+    one_minute = datetime.timedelta(minutes=1)
+    for entry in entries:
+        key = message_hash(entry["nick"], entry["message"])
+        when = _minute(entry["@timestamp"])
+        for candidate in (when, when - one_minute):
+            if seen[key][candidate] > 0:
+                seen[key][candidate] -= 1
+                break
+        else:
+            yield entry
+
+
+def page_revisions(site, title, start=None, end=None):
+    """List the revision ids of a page, newest first.
+
+    :param site: stashbot.mediawiki.Client
+    :param title: page title
+    :param start: oldest revision time (ISO 8601) to list
+    :param end: newest revision time (ISO 8601) to list
+    :return: list of revision ids; only the current revision if neither
+        start nor end is given
+    """
+    page = site.get_page(title)
+    if start is None and end is None:
+        return [page.revision] if page.exists else []
+    return [
+        rev["revid"]
+        for rev in page.revisions(start=end, end=start, prop="ids")
+    ]
+
+
+def fetch_texts(site, revids, workers=4):
+    """Fetch the text of several revisions concurrently.
+
+    Texts are yielded in the order of revids. At most 'workers' texts are
+    fetched ahead of the caller.
+
+    :return: generator of wikitext
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for lo in range(0, len(revids), workers):
+            hi = lo + workers
+            yield from pool.map(site.get_revision_text, revids[lo:hi])
+
+
+def _day_existing(es, project, day):
+    """Get the SAL documents from around one day."""
+    first = datetime.datetime.strptime(day, "%Y-%m-%d")
+    margin = datetime.timedelta(minutes=2)
+    return (
+        hit["_source"]
+        for hit in es.search_after(
+            "sal",
+            export.sal_query(
+                project,
+                start=(first - margin).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                end=(first + datetime.timedelta(days=1) + margin).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+            ),
+            [{"@timestamp": "asc"}],
+        )
+    )
+
+
+def find_missing(
+    es,
+    site,
+    titles,
+    project,
+    leader="==",
+    workers=4,
+    start=None,
+    end=None,
+    logger=None,
+):
+    """Find SAL messages on wiki pages that are not in Elasticsearch.
+
+    Archive pages linked from the given pages are checked too. Pages are
+    read one at a time. The entries of each revision of a page are merged,
+    so an entry that was later removed from the page is still found, and
+    then matched one day at a time against that day's documents. Memory
+    use depends on the size of a page, not of the whole history.
+
+    :param es: stashbot.es.Client
+    :param site: stashbot.mediawiki.Client
+    :param titles: list of page titles
+    :param project: SAL project
+    :param leader: section header leader
+    :param workers: number of revisions to fetch at once
+    :param start: read revisions saved since this time (ISO 8601)
+    :param end: read revisions saved until this time (ISO 8601)
+    :return: generator of missing entries
+    """
+    todo = list(titles)
+    seen = set()
+    while todo:
+        title = todo.pop(0)
+        if title in seen:
+            continue
+        seen.add(title)
+        revids = page_revisions(site, title, start, end)
+        days = collections.defaultdict(collections.Counter)
+        for text in fetch_texts(site, revids, workers):
+            found = collections.defaultdict(collections.Counter)
+            for entry in parse_wiki_page(text.split("\n"), leader):
+                key = (entry["@timestamp"], entry["nick"], entry["message"])
+                found[entry["@timestamp"][:10]][key] += 1
+            for day, counts in found.items():
+                # Keep the most copies of an entry that any revision has
+                days[day] |= counts
+            todo.extend(t for t in find_archives(text) if t not in seen)
+        if logger:
+            logger.info(
+                "Checking %d days from %d revisions of %s",
+                len(days),
+                len(revids),
+                title,
+            )
+        for day in sorted(days):
+            entries = (
+                {"@timestamp": ts, "nick": nick, "message": message}
+                for (ts, nick, message), count in sorted(days[day].items())
+                for _ in range(count)
+            )
+            yield from missing_entries(
+                entries, _day_existing(es, project, day)
+            )
+
+
+def backfill(
+    es,
+    site,
+    titles,
+    channel,
+    project,
+    leader="==",
+    workers=4,
+    start=None,
+    end=None,
+    logger=None,
+):
+    """Index SAL messages found on wiki pages but not in Elasticsearch.
+
+    Missing entries are indexed as they are found.
+
+    :param channel: irc channel to record for restored messages
+    :return: tuple of (number of entries indexed, list of errors)
+    """
+    missing = find_missing(
+        es, site, titles, project, leader, workers, start, end, logger
+    )
+    ok, errors = es.bulk(
+        {
+            "_index": "sal",
+            "_source": dict(
+                entry, type="sal", project=project, channel=channel
+            ),
+        }
+        for entry in missing
+    )
+    if logger:
+        logger.info("Indexed %d missing messages", ok)
+        if errors:
+            logger.error("Failed to index %d messages", len(errors))
+    return ok, errors
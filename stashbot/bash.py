@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Quip cache"""
+
+import collections
+import hashlib
+import hmac
+import random
+import threading
+
+# Keep the vote counters, score and voters consistent without reindexing the
+# whole document.
+VOTE_SCRIPT = (
+    "ctx._source.up_votes = (ctx._source.up_votes ?: 0) + params.up;"
+    "ctx._source.down_votes = (ctx._source.down_votes ?: 0) + params.down;"
+    "ctx._source.score = ctx._source.up_votes - ctx._source.down_votes;"
+    "if (ctx._source.voters == null) { ctx._source.voters = []; }"
+    "ctx._source.voters.addAll(params.voters);"
+)
+
+
+class Quips(object):
+    """In-memory copy of the quips stored in the bash index.
+
+    The whole index is small enough to keep in memory, so lookups never hit
+    Elasticsearch. Votes are applied to the cache immediately and sent to
+    Elasticsearch in batches as scripted partial updates. Each voter can
+    vote once per quip. Voters are stored as an HMAC of their host keyed
+    with 'secret', so hosts are not saved with the quips.
+
+    refresh_async() reloads the cache on a thread so that scanning the
+    index never blocks the reactor.
+    """
+
+    def __init__(self, es, logger, index="bash", secret=None):
+        self.es = es
+        self.logger = logger
+        self.index = index
+        self.secret = secret
+        self.quips = {}
+        self._ids = []
+        self._top = []
+        self._votes = collections.defaultdict(lambda: [0, 0, []])
+        self._added = {}
+        self._lock = threading.Lock()
+        self._loading = False
+
+    def __contains__(self, quip_id):
+        return quip_id in self.quips
+
+    def __len__(self):
+        return len(self.quips)
+
+    def refresh_async(self):
+        """Start a refresh() on a thread unless one is running."""
+        if self._loading:
+            return
+        self._loading = True
+        threading.Thread(
+            target=self.refresh, name="quips-refresh", daemon=True
+        ).start()
+
+    def refresh(self):
+        """Reload all quips from Elasticsearch."""
+        self._loading = True
+        try:
+            self._load()
+        finally:
+            self._loading = False
+
+    def _load(self):
+        with self._lock:
+            self._added = {}
+        quips = {}
+        fields = ["message", "nick", "up_votes", "down_votes", "voters"]
+        try:
+            for hit in self.es.scan(self.index, _source=fields):
+                quips[hit["_id"]] = self._make_quip(hit["_source"])
+        except Exception:
+            self.logger.exception("Failed to load quips")
+            return
+        with self._lock:
+            # Quips stored while loading may not have been seen by the scan
+            for quip_id, quip in self._added.items():
+                quips.setdefault(quip_id, quip)
+            # Votes that have not been flushed yet are not in the index.
+            for quip_id, (up, down, voters) in self._votes.items():
+                if quip_id in quips:
+                    self._apply_vote(quips[quip_id], up, down, voters)
+            self.quips = quips
+            self._ids = list(quips.keys())
+            self._rank()
+        self.logger.info("Cached %d quips", len(quips))
+
+    def _make_quip(self, source):
+        quip = {
+            "message": source.get("message", ""),
+            "nick": source.get("nick", ""),
+            "up_votes": source.get("up_votes") or 0,
+            "down_votes": source.get("down_votes") or 0,
+            "voters": set(source.get("voters") or ()),
+        }
+        quip["score"] = quip["up_votes"] - quip["down_votes"]
+        return quip
+
+    def _apply_vote(self, quip, up, down, voters):
+        quip["up_votes"] += up
+        quip["down_votes"] += down
+        quip["score"] = quip["up_votes"] - quip["down_votes"]
+        quip["voters"].update(voters)
+
+    def _rank(self, size=10):
+        self._top = sorted(
+            self.quips, key=lambda i: self.quips[i]["score"], reverse=True
+        )[:size]
+
+    def add(self, quip_id, doc):
+        """Add a newly stored quip to the cache."""
+        quip = self._make_quip(doc)
+        with self._lock:
+            self.quips[quip_id] = quip
+            self._ids.append(quip_id)
+            self._added[quip_id] = quip
+
+    def get(self, quip_id):
+        """Get a quip by id, or None if not cached."""
+        return self.quips.get(quip_id)
+
+    def random(self):
+        """Get a random (id, quip) tuple, or None if there are no quips."""
+        with self._lock:
+            ids, quips = self._ids, self.quips
+        if not ids:
+            return None
+        quip_id = random.choice(ids)
+        return quip_id, quips[quip_id]
+
+    def top(self):
+        """Get the best scoring (id, quip) tuple, or None."""
+        with self._lock:
+            ranked, quips = self._top, self.quips
+        if not ranked:
+            return None
+        return ranked[0], quips[ranked[0]]
+
+    def voter_key(self, host):
+        """Get the key stored for a voter's host.
+
+        :raises ValueError: if no secret is configured
+        """
+        if not self.secret:
+            raise ValueError("Quip votes need a secret")
+        return hmac.new(
+            self.secret.encode("utf-8"),
+            host.lower().encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+    def vote(self, quip_id, host, up=True):
+        """Record a vote for a quip.
+
+        :param quip_id: quip to vote for
+        :param host: host (usually a cloak) of the person voting
+        :param up: True for an up vote, False for a down vote
+        :return: updated quip, False if the voter has already voted for the
+            quip or None if quip_id is not known
+        """
+        voter = self.voter_key(host)
+        with self._lock:
+            quip = self.quips.get(quip_id)
+            if quip is None:
+                return None
+            if voter in quip["voters"]:
+                return False
+            delta = (1, 0) if up else (0, 1)
+            self._apply_vote(quip, delta[0], delta[1], (voter,))
+            pending = self._votes[quip_id]
+            pending[0] += delta[0]
+            pending[1] += delta[1]
+            pending[2].append(voter)
+            self._rank()
+        return quip
+
+    def flush(self):
+        """Send pending votes to Elasticsearch."""
+        if not self._votes:
+            return
+        with self._lock:
+            votes, self._votes = self._votes, collections.defaultdict(
+                lambda: [0, 0, []]
+            )
+        actions = [
+            {
+                "_op_type": "update",
+                "_index": self.index,
+                "_id": quip_id,
+                "script": {
+                    "source": VOTE_SCRIPT,
+                    "lang": "painless",
+                    "params": {"up": up, "down": down, "voters": voters},
+                },
+            }
+            for quip_id, (up, down, voters) in votes.items()
+        ]
+        try:
+            ok, errors = self.es.bulk(actions)
+        except Exception:
+            self.logger.exception("Failed to save quip votes; will retry")
+            with self._lock:
+                for quip_id, (up, down, voters) in votes.items():
+                    pending = self._votes[quip_id]
+                    pending[0] += up
+                    pending[1] += down
+                    pending[2].extend(voters)
+            return
+        if errors:
+            self.logger.error("Failed to save quip votes: %s", errors)
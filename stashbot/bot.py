@@ -18,6 +18,7 @@
 """IRC bot"""
 
 import collections
+import functools
 import ib3
 import ib3.auth
 import ib3.connection
@@ -26,13 +27,30 @@ import ib3.nick
 import re
 import time
 
-from . import es
-from . import phab
-from . import sal
+from . import STARTED
+from . import acls
+from . import backends
+from . import dedupe
+from . import lease
+from . import policy
+from . import workload
 
 RE_PHAB_NOURL = re.compile(r"(?:^|[^/%])\b([DMT]\d{3,})\b")
 
 
+def _then(func, callback):
+    """Wrap func so that callback is called after it returns or raises."""
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return func(*args)
+        finally:
+            callback()
+
+    return wrapper
+
+
 class Stashbot(
     ib3.auth.SASL,
     ib3.connection.SSL,
@@ -43,33 +61,50 @@ class Stashbot(
     ib3.nick.Regain,
     ib3.Bot,
 ):
-    def __init__(self, config, logger):
+    def __init__(self, config, logger, shared=None):
         """Create bot.
 
-        :param config: Dict of configuration values
+        :param config: Dict of configuration values for this network
         :param logger: Logger
+        :param shared: backends.Backends shared with the bots of other
+            networks; made from config when not given
         """
         self.config = config
         self.logger = logger
-
-        self.es = es.Client(
-            self.config["elasticsearch"]["servers"],
-            self.config["elasticsearch"]["options"],
-            self.logger,
-        )
-
-        self.phab = phab.Client(
-            self.config["phab"]["url"],
-            self.config["phab"]["user"],
-            self.config["phab"]["key"],
-        )
-
-        self.sal = sal.Logger(
-            self, self.phab, self.es, self.config, self.logger
-        )
+        self.name = config.get("name", config["irc"]["server"])
+        self.joined = False
+
+        if shared is None:
+            shared = backends.Backends(config, logger)
+        self.backends = shared
+        self.backends.bots.append(self)
+        self.es = shared.es
+        self.index_policy = shared.index_policy
+        self.phab = shared.phab
+        self.tracer = shared.tracer
+        self.sal = shared.sal
+        self.quips = shared.quips
+        self.throttle = shared.throttle
+        self.archive = shared.archive
+        self.workload = shared.workload
+        self.profiler = shared.profiler
 
         self.recent_phab = collections.defaultdict(dict)
 
+        # Share the select loop and scheduler with the other networks
+        self.reactor_class = shared.reactor.network
+
+        # Active/passive pair: only the lease holder acts on messages
+        self.ha = self.config.get("ha")
+        self.lease = None
+        self.leader = True
+        if self.ha:
+            self.lease = lease.make_lease(self.ha, self.es.es, self.logger)
+            self.leader = self.lease.acquire()
+            self.standby_buffer = collections.deque(
+                maxlen=self.ha.get("buffer", 500)
+            )
+
         super(Stashbot, self).__init__(
             server_list=[
                 (self.config["irc"]["server"], self.config["irc"]["port"])
@@ -78,6 +113,7 @@ class Stashbot(
             realname=self.config["irc"]["realname"],
             ident_password=self.config["irc"]["password"],
             channels=self.config["irc"]["channels"],
+            altnick=(self.ha or {}).get("altnick"),
         )
 
         # Clean phab recent cache every once in a while
@@ -85,13 +121,57 @@ class Stashbot(
             period=3600, func=self.do_clean_recent_phab
         )
 
+        if self.lease is not None:
+            self.reactor.scheduler.execute_every(
+                period=self.ha.get("renew", 5), func=self.do_lease
+            )
+
+    def configure(self, config):
+        """Use new settings for this network.
+
+        Channels added to or removed from 'irc.channels' are joined or
+        left.
+        """
+        old = set(self.config["irc"]["channels"])
+        self.config = config
+        self.index_policy = self.backends.index_policy
+        self._channels = list(config["irc"]["channels"])
+        if self.connection.is_connected():
+            for channel in self._channels:
+                if channel not in old:
+                    self.connection.join(channel)
+            for channel in old.difference(self._channels):
+                self.connection.part(channel)
+
     def get_version(self):
         return "Stashbot"
 
+    def start(self):
+        self.backends.start()
+
+    def shutdown(self, msg="I'll be back!"):
+        """Flush pending work and disconnect from the server."""
+        self.backends.shutdown(msg)
+
+    def leave(self, msg):
+        """Disconnect from this network."""
+        if self.lease is not None:
+            # Let the standby take over without waiting for the lease to
+            # expire
+            self.lease.release()
+        self.disconnect(msg)
+
     def on_join(self, conn, event):
         nick = event.source.nick
         if nick == conn.get_nickname():
             self.logger.info("Joined %s", event.target)
+            if not self.joined:
+                self.joined = True
+                self.logger.warning(
+                    "First join on %s %.2fs after start",
+                    self.name,
+                    time.monotonic() - STARTED,
+                )
 
     def on_privnotice(self, conn, event):
         self.logger.warning(str(event))
@@ -99,17 +179,126 @@ class Stashbot(
     def on_pubnotice(self, conn, event):
         self.logger.warning(str(event))
 
+    def is_active(self):
+        """Should this instance act on channel messages?"""
+        return self.leader and self.has_primary_nick()
+
+    def _recover_nick(self):
+        """Only try to take the primary nick while holding the lease."""
+        if self.leader:
+            super(Stashbot, self)._recover_nick()
+
+    def do_lease(self):
+        """Acquire or renew the leadership lease.
+
+        A standby that becomes leader takes the primary nick and then
+        replays the !log messages it saw while passive. A leader that
+        loses the lease switches to its alternate nick.
+        """
+        was_leader = self.leader
+        self.leader = self.lease.acquire()
+        conn = self.connection
+        if self.leader and not was_leader:
+            self.logger.warning("Acquired leader lease")
+        elif was_leader and not self.leader:
+            self.logger.warning("Lost leader lease")
+
+        if not conn.is_connected():
+            return
+        if self.leader:
+            if not self.has_primary_nick():
+                self._recover_nick()
+            elif self.standby_buffer:
+                self.do_replay()
+        elif self.has_primary_nick():
+            # Leave the primary nick for the leader
+            conn.nick(self._altnick)
+
+    def do_replay(self):
+        """Log the !log messages buffered while this instance was passive.
+
+        Messages that the old leader already stored are skipped. Messages
+        older than 'ha.max_age' seconds (default 600) are dropped. Replayed
+        messages are logged without replies, so that messages the old
+        leader rejected are not answered twice.
+        """
+        buffered = list(self.standby_buffer)
+        self.standby_buffer.clear()
+        cutoff = time.time() - self.ha.get("max_age", 600)
+        buffered = [b for b in buffered if b[3] >= cutoff]
+        if not buffered:
+            return
+        window = self.ha.get("replay_window", 60)
+        since = min(
+            dedupe.parse_timestamp(b[2]["@timestamp"]) for b in buffered
+        )
+        try:
+            stored = [
+                hit["_source"]
+                for hit in self.es.search_after(
+                    "sal",
+                    {
+                        "range": {
+                            "@timestamp": {
+                                "gte": time.strftime(
+                                    "%Y-%m-%dT%H:%M:%SZ",
+                                    time.gmtime(since - window),
+                                )
+                            }
+                        }
+                    },
+                    [{"@timestamp": "asc"}],
+                )
+            ]
+        except Exception:
+            # Better to log something twice than not at all
+            self.logger.exception("Failed to read recent SAL messages")
+            stored = []
+
+        replayed = 0
+        for conn, event, doc, received in buffered:
+            if dedupe.already_logged(doc, stored, window, self._clean_nick):
+                continue
+            self.submit(workload.SAL, conn, event, doc, replay=True)
+            replayed += 1
+        self.logger.warning(
+            "Replaying %d of %d buffered !log messages",
+            replayed,
+            len(buffered),
+        )
+
     def on_pubmsg(self, conn, event):
-        if not self.has_primary_nick():
-            # Don't do anything if we haven't aquired the primary nick
+        if not self.is_active():
+            # Don't do anything if we haven't aquired the primary nick or
+            # are the standby instance, but remember !log messages to SAL
+            # channels in case we need to take over.
+            msg = event.arguments[0]
+            if (
+                self.lease is not None
+                and msg.startswith("!log ")
+                and not msg.startswith("!log help")
+                and self.sal.router.route(event.target) is not None
+            ):
+                self.standby_buffer.append(
+                    (
+                        conn,
+                        event,
+                        self.es.event_to_doc(conn, event),
+                        time.time(),
+                    )
+                )
             return
 
-        # Log all public channel messages we receive
+        # Log public channel messages we receive
         doc = self.es.event_to_doc(conn, event)
-        self.do_write_to_elasticsearch(conn, event, doc)
+        msg = event.arguments[0]
+        if self.index_policy.should_index(event.target, doc["nick"], msg):
+            if self.archive is not None:
+                # Cheap enough to do even when indexing work is shed
+                self.archive.append(doc)
+            self.submit(workload.IRC, conn, event, doc)
 
         # Look for special messages
-        msg = event.arguments[0]
 
         if msg.startswith("!log help"):
             self.do_help(conn, event)
@@ -121,10 +310,12 @@ class Stashbot(
             self.do_help(conn, event)
 
         elif msg.startswith("!log "):
-            self.sal.log(conn, event, doc)
+            if self.check_throttle(conn, event):
+                self.submit(workload.SAL, conn, event, doc)
 
         elif msg.startswith("!bash "):
-            self.do_bash(conn, event, doc)
+            if self.check_throttle(conn, event):
+                self.submit(workload.BASH, conn, event, doc)
 
         ignore = self.config["irc"].get("ignore", [])
         if self._clean_nick(doc["nick"]) in ignore:
@@ -135,16 +326,146 @@ class Stashbot(
             and "echo" in self.config["phab"]
             and RE_PHAB_NOURL.search(msg)
         ):
-            self.do_phabecho(conn, event, doc)
+            self.submit(workload.PHAB, conn, event, doc)
 
     def on_privmsg(self, conn, event):
         msg = event.arguments[0]
         if msg.startswith("!bash "):
-            doc = self.es.event_to_doc(conn, event)
-            self.do_bash(conn, event, doc)
+            if self.check_throttle(conn, event):
+                doc = self.es.event_to_doc(conn, event)
+                self.submit(workload.BASH, conn, event, doc)
+        elif msg == "!profile" or msg.startswith("!profile "):
+            self.do_profile(conn, event, msg[9:].split())
         else:
             self.respond(conn, event, event.arguments[0][::-1])
 
+    def do_profile(self, conn, event, args):
+        """Handle a !profile command.
+
+        Usage: !profile cpu [seconds] | !profile heap
+
+        Only sources allowed by the 'profiling.acl' config may use the
+        command. Unlike other acls the default is 'deny'.
+        """
+        acl = dict(
+            {"default": "deny"},
+            **self.config.get("profiling", {}).get("acl", {}),
+        )
+        if not acls.check(acl, event.source, self.sal.groups):
+            self.logger.warning("Denied !profile from %s", event.source)
+            return
+        if args[:1] == ["cpu"]:
+            seconds = args[1] if len(args) > 1 else 30
+            try:
+                started = self.profiler.cpu(int(seconds))
+            except ValueError:
+                self.respond(conn, event, "Usage: !profile cpu [seconds]")
+                return
+            if started:
+                self.respond(conn, event, "CPU profile started")
+            else:
+                self.respond(conn, event, "A CPU profile is already running")
+        elif args[:1] == ["heap"]:
+            path = self.profiler.heap()
+            if path is None:
+                self.respond(conn, event, "Heap tracing started")
+            else:
+                self.respond(conn, event, "Wrote %s" % path)
+        else:
+            self.respond(conn, event, "Usage: !profile cpu [seconds]|heap")
+
+    def submit(self, klass, conn, event, doc, **attrs):
+        """Queue a job for an event.
+
+        In split mode the job is sent to a worker process. It is done here
+        if no worker can take it.
+
+        :param klass: workload class of the job
+        :param attrs: extra trace attributes for !log jobs
+        """
+        dispatcher = self.backends.dispatcher
+        if dispatcher is not None and dispatcher.send(
+            klass, self.name, conn, event, doc, attrs
+        ):
+            return
+        self.run_job(klass, conn, event, doc, **attrs)
+
+    def run_job(self, klass, conn, event, doc, done=None, **attrs):
+        """Queue a job to be run by this process.
+
+        :param done: called once the job has run or has been shed
+        """
+        if klass == workload.SAL:
+            trace = self.tracer.start(
+                "!log", channel=event.target, nick=doc["nick"], **attrs
+            )
+            func = self.do_log
+            args = (conn, event, doc, trace, attrs.get("replay", False))
+        else:
+            func = {
+                workload.BASH: self.do_bash,
+                workload.PHAB: self.do_phabecho,
+                workload.IRC: self.do_write_to_elasticsearch,
+            }[klass]
+            args = (conn, event, doc)
+        if done is not None:
+            func = _then(func, done)
+        if not self.workload.submit(klass, func, *args) and done is not None:
+            done()
+
+    def do_log(self, conn, event, doc, trace, replay=False):
+        """Process a !log message as part of a trace.
+
+        :param replay: message was buffered while this instance was the
+            standby; store it without replying on IRC
+        """
+        try:
+            self.sal.log(
+                conn,
+                event,
+                doc,
+                respond_to_channel=not replay,
+                trace=trace,
+                do_phab=True,
+            )
+        finally:
+            trace.finish()
+
+    def check_throttle(self, conn, event):
+        """Check an event against the per-user command rate limits.
+
+        Each user gets one token bucket, keyed on their normalized nick and
+        host, that is shared by all channels so that a script can not get a
+        fresh burst by moving to another channel. The rate and burst size
+        come from the 'throttle' config section and can be set per channel.
+        Sources matching a mask in the 'exempt' list (e.g. trusted relay
+        bots) are never throttled.
+
+        :return: True if the command should be processed
+        """
+        conf = self.backends.snapshot.throttle
+        if conf is None:
+            return True
+        source = event.source
+        if any(acls.check_mask(m, source) for m in conf.exempt):
+            return True
+
+        channel = event.target
+        rate, burst = conf.channels.get(channel, conf.default)
+        key = (self._clean_nick(source.nick), source.host)
+        if self.throttle.allow(key, rate, burst):
+            return True
+
+        self.logger.warning("Throttled %s in %s", source, channel)
+        if self.throttle.warn(key):
+            self.respond(
+                conn,
+                event,
+                "%s: Slow down! Ignoring commands from you for a bit."
+                % source.nick,
+            )
+        return False
+
     def do_write_to_elasticsearch(self, conn, event, doc):
         """Log an IRC channel message to Elasticsearch."""
         fmt = self.config["elasticsearch"]["index"]
@@ -160,6 +481,79 @@ class Stashbot(
 
     def do_bash(self, conn, event, doc):
         """Process a !bash message"""
+        cmd = doc["message"][6:].strip()
+        parts = cmd.split()
+        nick = event.source.nick
+
+        if cmd in ("random", "top"):
+            found = getattr(self.quips, cmd)()
+            if found is None:
+                self.respond(conn, event, "%s: No quips found." % nick)
+            else:
+                self.do_bash_show(conn, event, *found)
+
+        elif (
+            len(parts) == 2
+            and parts[0] in ("up", "down")
+            and parts[1] in self.quips
+        ):
+            self.do_bash_vote(conn, event, parts[1], parts[0] == "up")
+
+        elif len(parts) == 1 and cmd in self.quips:
+            self.do_bash_show(conn, event, cmd, self.quips.get(cmd))
+
+        else:
+            self.do_bash_store(conn, event, doc)
+
+    def do_bash_vote(self, conn, event, quip_id, up):
+        """Vote for a quip.
+
+        Votes are only taken in channels and from sources allowed by the
+        'bash.vote_acl' config. Unlike other acls the default is 'deny', so
+        voting is off unless an acl is configured. Each host (usually a
+        cloak) can vote once per quip.
+        """
+        nick = event.source.nick
+        acl = dict(
+            {"default": "deny"}, **self.config["bash"].get("vote_acl", {})
+        )
+        if event.type != "pubmsg" or not acls.check(
+            acl, event.source, self.sal.groups
+        ):
+            self.respond(
+                conn, event, "%s: You can not vote for quips here." % nick
+            )
+            return
+        quip = self.quips.vote(quip_id, event.source.host, up=up)
+        if quip is False:
+            self.respond(
+                conn,
+                event,
+                "%s: You have already voted for quip %s" % (nick, quip_id),
+            )
+        elif quip is not None:
+            self.respond(
+                conn,
+                event,
+                "%s: Quip %s now has a score of %d"
+                % (nick, quip_id, quip["score"]),
+            )
+
+    def do_bash_show(self, conn, event, quip_id, quip):
+        """Show a cached quip"""
+        self.respond(
+            conn,
+            event,
+            "%s (score: %d, %s)"
+            % (
+                quip["message"],
+                quip["score"],
+                self.config["bash"]["view_url"] % quip_id,
+            ),
+        )
+
+    def do_bash_store(self, conn, event, doc):
+        """Store a new quip"""
         bash = dict(doc)
         # Trim '!bash ' from the front of the message
         msg = bash["message"][6:]
@@ -178,6 +572,7 @@ class Stashbot(
         ret = self.es.index(index="bash", body=bash)
 
         if "result" in ret and ret["result"] == "created":
+            self.quips.add(ret["_id"], bash)
             self.respond(
                 conn,
                 event,
@@ -221,9 +616,7 @@ class Stashbot(
 
     def get_phab_echo_cutoff(self, channel):
         """Get phab echo delay for the given channel."""
-        return time.time() - self.config["phab"]["delay"].get(
-            channel, self.config["phab"]["delay"]["__default__"]
-        )
+        return time.time() - self.backends.snapshot.get_phab_delay(channel)
 
     def do_clean_recent_phab(self):
         """Clean old items out of the recent_phab cache."""
@@ -233,13 +626,22 @@ class Stashbot(
                 if self.recent_phab[channel][item] < cutoff:
                     del self.recent_phab[channel][item]
 
+    def get_health(self):
+        """Check the connection to this network.
+
+        :return: dict of details
+        """
+        connected = self.connection.is_connected()
+        return {
+            "connected": connected,
+            "primary_nick": connected and self.has_primary_nick(),
+            "leader": self.leader,
+        }
+
     def _clean_nick(self, nick):
         """Remove common status indicators and normlize to lower case."""
-        return nick.split("|", 1)[0].rstrip("`_").lower()
+        return policy.clean_nick(nick)
 
     def respond(self, conn, event, msg):
         """Respond to an event with a message."""
-        to = event.target
-        if to == self.connection.get_nickname():
-            to = event.source.nick
-        conn.privmsg(to, msg.replace("\n", " "))
+        self.backends.respond(conn, event, msg)
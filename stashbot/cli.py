@@ -16,13 +16,291 @@
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 import argparse
+import json
 import logging
 import os.path
+import re
+import signal
+import sys
+import time
 
-import stashbot.bot
 import stashbot.config
 
 
+def _sigterm(signum, frame):
+    """Treat SIGTERM like ^C so pending work is flushed on pod shutdown."""
+    raise KeyboardInterrupt()
+
+
+def _es_client(config, log):
+    """Make an es.Client using the bot's configuration."""
+    import stashbot.es
+
+    return stashbot.es.Client(
+        config["elasticsearch"]["servers"],
+        config["elasticsearch"]["options"],
+        log,
+    )
+
+
+def _overrides(args):
+    """Config sections set on the command line."""
+    overrides = {}
+    if args.http:
+        overrides["http"] = args.http
+    return overrides
+
+
+def run_bot(args, config):
+    """Run the IRC bot."""
+    import stashbot.backends
+    import stashbot.bot
+
+    # Write a log file of severe errors
+    # FIXME: make this configurable
+    fh = logging.FileHandler(os.path.expanduser("~/stashbot.log"), delay=True)
+    fh.setLevel(logging.ERROR)
+    logging.getLogger().addHandler(fh)
+
+    log = logging.getLogger("Stashbot")
+    # One bot per network, all sharing a reactor and backend clients
+    shared = stashbot.backends.Backends(
+        config,
+        log,
+        role="frontend" if "split" in config else None,
+        path=args.config,
+        overrides=_overrides(args),
+    )
+    for network in stashbot.backends.network_configs(config):
+        stashbot.bot.Stashbot(network, log, shared)
+    signal.signal(signal.SIGTERM, _sigterm)
+    # Handlers only set flags; the work is done on the next reactor tick
+    signal.signal(
+        signal.SIGUSR1, lambda signum, frame: shared.profiler.request_cpu()
+    )
+    signal.signal(
+        signal.SIGUSR2, lambda signum, frame: shared.profiler.request_heap()
+    )
+    signal.signal(signal.SIGHUP, lambda signum, frame: shared.request_reload())
+    try:
+        shared.start()
+    except KeyboardInterrupt:
+        shared.shutdown()
+    except Exception:
+        log.exception("Killed by unhandled exception")
+        shared.shutdown()
+        raise SystemExit()
+
+
+def run_worker(args, config):
+    """Run jobs sent by the IRC front end."""
+    if "split" not in config:
+        raise SystemExit("No split section configured")
+    import stashbot.backends
+    import stashbot.bot
+    import stashbot.worker
+
+    log = logging.getLogger("Stashbot")
+    shared = stashbot.backends.Backends(
+        config,
+        log,
+        role="worker",
+        path=args.config,
+        overrides=_overrides(args),
+    )
+    for network in stashbot.backends.network_configs(config):
+        # Only the front end takes part in leader election
+        stashbot.bot.Stashbot(dict(network, ha=None), log, shared)
+    work = stashbot.worker.Worker(
+        config["split"].get("socket", "~/stashbot.sock"), shared, log
+    )
+    work.start()
+    signal.signal(signal.SIGTERM, _sigterm)
+    signal.signal(
+        signal.SIGUSR1, lambda signum, frame: shared.profiler.request_cpu()
+    )
+    signal.signal(
+        signal.SIGUSR2, lambda signum, frame: shared.profiler.request_heap()
+    )
+    signal.signal(signal.SIGHUP, lambda signum, frame: shared.request_reload())
+    try:
+        shared.start()
+    except KeyboardInterrupt:
+        shared.shutdown()
+        work.stop()
+
+
+def run_export(args, config):
+    """Export SAL messages for a project."""
+    import stashbot.export
+
+    log = logging.getLogger("export")
+    if args.output == "-":
+        out = sys.stdout
+    else:
+        out = open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        stashbot.export.export(
+            _es_client(config, log),
+            out,
+            args.project,
+            start=args.start,
+            end=args.end,
+            fmt=args.format,
+            size=args.size,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def run_archive(args, config):
+    """Read or reindex the local message archive."""
+    import stashbot.archive
+
+    log = logging.getLogger("archive")
+    directory = args.dir or config.get("archive", {}).get("dir")
+    if not directory:
+        raise SystemExit("No archive directory configured")
+    start = args.start and stashbot.archive.parse_time(args.start)
+    end = args.end and stashbot.archive.parse_time(args.end)
+    docs = stashbot.archive.Reader(directory).read(start, end)
+    if args.channel:
+        docs = (d for d in docs if d["channel"] == args.channel)
+    if args.grep:
+        pattern = re.compile(args.grep)
+        docs = (d for d in docs if pattern.search(d["message"]))
+
+    if args.action == "cat":
+        for doc in docs:
+            print(json.dumps(doc, sort_keys=True))
+        return
+
+    fmt = config["elasticsearch"]["index"]
+    ok, errors = _es_client(config, log).bulk(
+        (
+            {
+                "_index": time.strftime(
+                    fmt,
+                    time.gmtime(
+                        stashbot.archive.parse_time(doc["@timestamp"])
+                    ),
+                ),
+                "_source": doc,
+            }
+            for doc in docs
+        ),
+        chunk_size=2000,
+    )
+    print("Indexed %d messages with %d errors" % (ok, len(errors)))
+
+
+def run_backfill(args, config):
+    """Restore SAL messages from wiki pages to Elasticsearch."""
+    import stashbot.backfill
+    import stashbot.mediawiki
+
+    log = logging.getLogger("backfill")
+    channels = config["sal"].get("channels", {})
+    conf = channels.get(args.channel, {})
+    if "use_config" in conf:
+        conf = channels.get(conf["use_config"], {})
+    if "wiki" not in conf:
+        raise SystemExit("No wiki configured for %s" % args.channel)
+    project = args.project or conf.get("project")
+    titles = args.page or [conf["page"] % {"project": project}]
+
+    wiki = config["mediawiki"][conf["wiki"]]
+    site = stashbot.mediawiki.Client(
+        wiki["url"],
+        consumer_token=wiki["consumer_token"],
+        consumer_secret=wiki["consumer_secret"],
+        access_token=wiki["access_token"],
+        access_secret=wiki["access_secret"],
+    )
+    kwargs = {
+        "leader": conf.get("leader", "=="),
+        "workers": args.workers,
+        "start": args.start,
+        "end": args.end,
+        "logger": log,
+    }
+    es = _es_client(config, log)
+    if args.dry_run:
+        for entry in stashbot.backfill.find_missing(
+            es, site, titles, project, **kwargs
+        ):
+            print("%(@timestamp)s <%(nick)s> %(message)s" % entry)
+    else:
+        stashbot.backfill.backfill(
+            es, site, titles, args.channel, project, **kwargs
+        )
+
+
+def run_import_logs(args, config):
+    """Import historical IRC logs into Elasticsearch."""
+    import stashbot.ircimport
+
+    if args.format and args.format not in stashbot.ircimport.FORMATS:
+        raise SystemExit(
+            "Unknown log format %r; expected one of: %s"
+            % (args.format, ", ".join(sorted(stashbot.ircimport.FORMATS)))
+        )
+    log = logging.getLogger("import")
+    totals = stashbot.ircimport.import_logs(
+        args.path,
+        config,
+        log,
+        checkpoint=args.checkpoint,
+        workers=args.workers,
+        fmt=args.format,
+        channel=args.channel,
+        server=args.server,
+        dry_run=args.dry_run,
+    )
+    print(
+        "%(indexed)d messages from %(files)d files "
+        "(%(skipped)d skipped, %(failed)d failed, %(errors)d errors)" % totals
+    )
+
+
+def run_templates(args, config):
+    """Show or install Elasticsearch index templates."""
+    import stashbot.templates
+
+    log = logging.getLogger("templates")
+    try:
+        changed = stashbot.templates.install(
+            _es_client(config, log),
+            stashbot.templates.load(
+                args.dir or stashbot.templates.TEMPLATE_DIR
+            ),
+            dry_run=args.action == "diff",
+            out=sys.stdout,
+        )
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    if not changed:
+        print("Index templates are up to date")
+
+
+def run_traces(args, config):
+    """Print the slowest recorded traces."""
+    import stashbot.tracing
+
+    path = args.file or config.get("trace", {}).get(
+        "file", "~/stashbot-traces.jsonl"
+    )
+    traces = stashbot.tracing.slowest(
+        stashbot.tracing.read_traces(os.path.expanduser(path)),
+        count=args.count,
+        name=args.name,
+    )
+    for trace in traces:
+        print(stashbot.tracing.format_trace(trace))
+        print()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Stashbot")
     parser.add_argument(
@@ -36,6 +314,155 @@ def main():
         dest="loglevel",
         help="Increase logging verbosity",
     )
+    parser.add_argument(
+        "--http",
+        metavar="HOST:PORT",
+        type=stashbot.config.parse_listen,
+        help="Serve health checks and the SAL feed here "
+        "(replaces the config's http section)",
+    )
+    parser.set_defaults(func=run_bot)
+    commands = parser.add_subparsers(
+        title="commands",
+        metavar="COMMAND",
+        help="Run a maintenance command instead of the bot",
+    )
+
+    worker = commands.add_parser(
+        "worker", help="Run jobs for an IRC front end (split mode)"
+    )
+    worker.set_defaults(func=run_worker)
+
+    export = commands.add_parser("export", help="Export SAL messages")
+    export.add_argument("project", help="Project to export")
+    export.add_argument(
+        "--start", help="Start date/time, inclusive (e.g. 2024-01-01)"
+    )
+    export.add_argument("--end", help="End date/time, exclusive")
+    export.add_argument(
+        "-f",
+        "--format",
+        default="jsonl",
+        choices=("jsonl", "csv", "wikitext"),
+        help="Output format",
+    )
+    export.add_argument(
+        "-o", "--output", default="-", help="Output file (default: stdout)"
+    )
+    export.add_argument(
+        "--size", type=int, default=1000, help="Documents per request"
+    )
+    export.set_defaults(func=run_export)
+
+    archive = commands.add_parser(
+        "archive", help="Read or reindex the local message archive"
+    )
+    archive.add_argument(
+        "action",
+        choices=("cat", "reindex"),
+        help="Print messages as JSON lines or index them in Elasticsearch",
+    )
+    archive.add_argument(
+        "--start", help="Start date/time, inclusive (e.g. 2024-01-01)"
+    )
+    archive.add_argument("--end", help="End date/time, exclusive")
+    archive.add_argument("--channel", help="Only messages in this channel")
+    archive.add_argument("--grep", help="Only messages matching this regex")
+    archive.add_argument(
+        "--dir", help="Archive directory (default: the configured archive.dir)"
+    )
+    archive.set_defaults(func=run_archive)
+
+    backfill = commands.add_parser(
+        "backfill", help="Restore SAL messages from wiki pages"
+    )
+    backfill.add_argument("channel", help="SAL channel to restore")
+    backfill.add_argument(
+        "--project", help="Project (default: the channel's project)"
+    )
+    backfill.add_argument(
+        "--page",
+        action="append",
+        help="Wiki page to read; repeatable (default: the channel's page)",
+    )
+    backfill.add_argument(
+        "--workers", type=int, default=4, help="Revisions to fetch at once"
+    )
+    backfill.add_argument(
+        "--start",
+        help="Read every revision saved since this time "
+        "(ISO 8601; default: only the current revision)",
+    )
+    backfill.add_argument(
+        "--end", help="Read every revision saved until this time (ISO 8601)"
+    )
+    backfill.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="List missing messages without indexing them",
+    )
+    backfill.set_defaults(func=run_backfill)
+
+    import_logs = commands.add_parser(
+        "import-logs", help="Import historical ZNC or weechat logs"
+    )
+    import_logs.add_argument(
+        "path", nargs="+", help="Log files or directories of log files"
+    )
+    import_logs.add_argument(
+        "-f",
+        "--format",
+        help="Log format: znc or weechat (default: guess from file names)",
+    )
+    import_logs.add_argument(
+        "--channel", help="Channel name (default: guess from file paths)"
+    )
+    import_logs.add_argument(
+        "--server", help="Server name for documents (default: irc.server)"
+    )
+    import_logs.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes",
+    )
+    import_logs.add_argument(
+        "--checkpoint",
+        help="File recording imported logs so a run can be resumed",
+    )
+    import_logs.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Count messages without indexing them",
+    )
+    import_logs.set_defaults(func=run_import_logs)
+
+    templates = commands.add_parser(
+        "templates", help="Manage Elasticsearch index templates"
+    )
+    templates.add_argument(
+        "action",
+        choices=("diff", "install"),
+        help="Show changes or install changed templates",
+    )
+    templates.add_argument(
+        "--dir",
+        help="Directory of *-template.json files (default: extra/)",
+    )
+    templates.set_defaults(func=run_templates)
+
+    traces = commands.add_parser("traces", help="Show the slowest traces")
+    traces.add_argument(
+        "-n", "--count", type=int, default=10, help="Traces to show"
+    )
+    traces.add_argument("--name", help="Only show traces with this name")
+    traces.add_argument(
+        "--file", help="Trace file (default: the configured trace.file)"
+    )
+    traces.set_defaults(func=run_traces)
+
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -45,19 +472,4 @@ def main():
     )
     logging.captureWarnings(True)
 
-    # Write a log file of severe errors
-    # FIXME: make this configurable
-    fh = logging.FileHandler(os.path.expanduser("~/stashbot.log"), delay=True)
-    fh.setLevel(logging.ERROR)
-    logging.getLogger().addHandler(fh)
-
-    log = logging.getLogger("Stashbot")
-    bot = stashbot.bot.Stashbot(stashbot.config.load(args.config), log)
-    try:
-        bot.start()
-    except KeyboardInterrupt:
-        bot.disconnect()
-    except Exception:
-        log.exception("Killed by unhandled exception")
-        bot.disconnect()
-        raise SystemExit()
+    args.func(args, stashbot.config.load(args.config, _overrides(args)))
@@ -15,9 +15,17 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Configuration loading and compiled configuration snapshots"""
+
+import collections
+import types
 
 import yaml
 
+from . import groups
+from . import policy
+from . import routing
+
 
 def yaml_unicode_str(self, node):
     """Create unicode objects for YAML string nodes."""
@@ -25,10 +33,206 @@ def yaml_unicode_str(self, node):
     return self.construct_scalar(node)
 
 
+# Use libyaml when PyYAML was built with it
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 # Attach custom unicode factory to string events
 yaml.Loader.add_constructor("tag:yaml.org,2002:str", yaml_unicode_str)
 yaml.SafeLoader.add_constructor("tag:yaml.org,2002:str", yaml_unicode_str)
+SafeLoader.add_constructor("tag:yaml.org,2002:str", yaml_unicode_str)
+
+
+def load(filename, overrides=None):
+    """Read a YAML config file.
+
+    :param overrides: dict of sections that replace the file's sections
+    """
+    with open(filename, "r") as f:
+        config = yaml.load(f, Loader=SafeLoader)
+    if overrides:
+        config.update(overrides)
+    return config
+
+
+def parse_listen(value):
+    """Parse a HOST:PORT listen address into an 'http' config section.
+
+    >>> sorted(parse_listen("0.0.0.0:8080").items())
+    [('host', '0.0.0.0'), ('port', 8080)]
+    >>> parse_listen(":8080")["host"]
+    '127.0.0.1'
+    """
+    host, sep, port = value.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError("Expected HOST:PORT, got %r" % value)
+    return {"host": host or "127.0.0.1", "port": int(port)}
+
+
+# Settings that each need the named section and keys
+REQUIRED = (
+    ("irc", ("server", "port", "nick", "realname", "password", "channels")),
+    ("elasticsearch", ("servers", "options", "index")),
+    ("ldap", ("uri", "base")),
+    ("phab", ("url", "user", "key", "delay")),
+    ("bash", ("view_url",)),
+    ("sal", ("view_url",)),
+)
+
+# Settings that are only read at startup
+RESTART_REQUIRED = (
+    ("irc", "server"),
+    ("irc", "port"),
+    ("irc", "nick"),
+    ("irc", "password"),
+    ("elasticsearch", "servers"),
+    ("elasticsearch", "options"),
+    ("ldap", "uri"),
+    ("phab", "url"),
+    ("phab", "user"),
+    ("phab", "key"),
+    ("bash", "vote_secret"),
+    ("networks",),
+    ("split",),
+    ("http",),
+    ("archive",),
+    ("trace",),
+    ("ha",),
+)
+
+Throttle = collections.namedtuple(
+    "Throttle",
+    [
+        # (rate, burst) for channels without their own limits
+        "default",
+        # dict of channel to (rate, burst)
+        "channels",
+        # tuple of masks that are never throttled
+        "exempt",
+    ],
+)
+
+
+class Snapshot(
+    collections.namedtuple(
+        "Snapshot",
+        [
+            # Configuration as loaded
+            "raw",
+            # routing.Router for the sal section
+            "router",
+            # policy.IndexPolicy for the elasticsearch section
+            "index_policy",
+            # Throttle or None
+            "throttle",
+            # dict of channel to phab echo delay, with a __default__
+            "phab_delay",
+            # frozenset of LDAP groups used by acls
+            "acl_groups",
+        ],
+    )
+):
+    """Compiled configuration.
+
+    Everything that is read for each message is worked out once when the
+    configuration is loaded. A snapshot is never changed; a new one is
+    compiled and swapped in to change the configuration of a running bot.
+    The 'raw' dict must be treated as read only as well.
+    """
+
+    __slots__ = ()
+
+    def get_phab_delay(self, channel):
+        """Get the phab echo delay for a channel."""
+        return self.phab_delay.get(channel, self.phab_delay["__default__"])
+
+    def restart_required(self, other):
+        """List settings that differ from another snapshot but are only
+        read at startup.
+        """
+        changed = []
+        for path in RESTART_REQUIRED:
+            if _lookup(self.raw, path) != _lookup(other.raw, path):
+                changed.append(".".join(path))
+        return changed
+
+
+def _lookup(config, path):
+    for key in path:
+        if not isinstance(config, dict):
+            return None
+        config = config.get(key)
+    return config
+
+
+def validate(config):
+    """Check a configuration for errors that would break the bot.
+
+    :raises ValueError: if the configuration is not usable
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Configuration must be a mapping")
+    for section, keys in REQUIRED:
+        if section not in config:
+            raise ValueError("Missing '%s' section" % section)
+        for key in keys:
+            if key not in config[section]:
+                raise ValueError("Missing '%s.%s' setting" % (section, key))
+    if "__default__" not in config["phab"]["delay"]:
+        raise ValueError("Missing 'phab.delay.__default__' setting")
+    channels = config["sal"].get("channels", {})
+    for name, conf in channels.items():
+        target = conf.get("use_config")
+        if target is not None and target not in channels:
+            raise ValueError(
+                "sal channel %s uses config of unknown channel %s"
+                % (name, target)
+            )
+    throttle = config.get("throttle") or {}
+    for name, conf in [("throttle", throttle)] + [
+        ("throttle.channels.%s" % k, v)
+        for k, v in throttle.get("channels", {}).items()
+    ]:
+        if float(conf.get("rate", 0.1)) <= 0:
+            raise ValueError("'%s.rate' must be more than 0" % name)
+        if int(conf.get("burst", 5)) < 1:
+            raise ValueError("'%s.burst' must be at least 1" % name)
+    bash = config["bash"]
+    if "vote_acl" in bash and not bash.get("vote_secret"):
+        raise ValueError("'bash.vote_acl' needs a 'bash.vote_secret'")
+    names = [n.get("name") for n in config.get("networks", [])]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("Each network needs a unique 'name'")
+
+
+def _compile_throttle(conf):
+    if not conf:
+        return None
+
+    def limits(c):
+        return (float(c.get("rate", 0.1)), int(c.get("burst", 5)))
+
+    return Throttle(
+        default=limits(conf),
+        channels=types.MappingProxyType(
+            {k: limits(v) for k, v in conf.get("channels", {}).items()}
+        ),
+        exempt=tuple(conf.get("exempt", [])),
+    )
+
 
+def snapshot(config, clean_nick=str.lower):
+    """Validate a configuration and compile it into a Snapshot.
 
-def load(filename):
-    return yaml.safe_load(open(filename, "r"))
+    :param config: dict as returned by load()
+    :param clean_nick: nick normalization used by the index policy
+    :raises ValueError: if the configuration is not usable
+    """
+    validate(config)
+    return Snapshot(
+        raw=config,
+        router=routing.Router(config["sal"]),
+        index_policy=policy.IndexPolicy(config["elasticsearch"], clean_nick),
+        throttle=_compile_throttle(config.get("throttle")),
+        phab_delay=types.MappingProxyType(dict(config["phab"]["delay"])),
+        acl_groups=frozenset(groups.referenced(config)),
+    )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import calendar
+import collections
+import hashlib
+import time
+
+
+def make_key(*parts):
+    """Make a compact key from a list of strings."""
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).digest()
+
+
+class Window(object):
+    """Remember recently seen keys for a limited time.
+
+    At most maxlen keys are remembered. When full, the oldest keys are
+    forgotten first.
+    """
+
+    def __init__(self, maxlen=1024):
+        self.maxlen = maxlen
+        self.seen = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def check(self, key, ttl, now=None):
+        """Check if a key has been seen in the last ttl seconds.
+
+        Unseen keys are remembered for ttl seconds. Seeing a key again does
+        not extend the time that it is remembered.
+
+        :param key: hashable key
+        :param ttl: seconds to remember the key
+        :param now: current monotonic time; for testing
+        :return: True if the key was seen recently
+        """
+        if self.seen_recently(key, now):
+            return True
+        self.add(key, ttl, now)
+        return False
+
+    def seen_recently(self, key, now=None):
+        """Check if a key is remembered, without remembering it.
+
+        :param key: hashable key
+        :param now: current monotonic time; for testing
+        :return: bool
+        """
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+        expires = self.seen.get(key)
+        return expires is not None and expires > now
+
+    def add(self, key, ttl, now=None):
+        """Remember a key for ttl seconds.
+
+        :param key: hashable key
+        :param ttl: seconds to remember the key
+        :param now: current monotonic time; for testing
+        """
+        if now is None:
+            now = time.monotonic()
+        self.seen[key] = now + ttl
+        self.seen.move_to_end(key)
+        while len(self.seen) > self.maxlen:
+            self.seen.popitem(last=False)
+
+    def _expire(self, now):
+        while self.seen:
+            key, expires = next(iter(self.seen.items()))
+            if expires > now:
+                break
+            del self.seen[key]
+
+
+def parse_timestamp(ts):
+    """Convert an '@timestamp' value to seconds since the epoch.
+
+    >>> parse_timestamp("2026-01-02T03:04:05Z")
+    1767323045
+    """
+    return calendar.timegm(time.strptime(ts, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def already_logged(doc, stored, window=60, clean_nick=str.lower):
+    """Check if a raw !log event matches a stored SAL document.
+
+    Events seen by a standby bot are compared to the SAL documents written
+    by the leader. The stored message has had the '!log ', relay and
+    project prefixes removed, so a buffered message matches if its words
+    after '!log ' are the stored message's words, optionally led by the
+    stored project and a relayed 'user@host'. It must also be from the
+    same nick (or relayed user), said in the same channel and have a
+    timestamp within window seconds.
+
+    :param doc: document made from the buffered IRC event
+    :param stored: iterable of SAL documents
+    :param window: seconds of clock difference to allow
+    :param clean_nick: nick normalization
+    :return: bool
+    """
+    when = parse_timestamp(doc["@timestamp"])
+    words = doc["message"].split()[1:]
+    nick = clean_nick(doc["nick"])
+    for sal in stored:
+        message = sal.get("message", "").split()
+        skip = len(words) - len(message)
+        if (
+            not message
+            or not 0 <= skip <= 2
+            or words[skip:] != message
+            or sal.get("channel") != doc["channel"]
+            or abs(parse_timestamp(sal["@timestamp"]) - when) > window
+        ):
+            continue
+        relayed = [w for w in words[:skip] if w != sal.get("project")]
+        if not relayed:
+            if clean_nick(sal.get("nick", "")) == nick:
+                return True
+        elif (
+            len(relayed) == 1
+            and "@" in relayed[0]
+            and sal.get("nick", "").endswith(relayed[0])
+        ):
+            return True
+    return False
@@ -16,39 +16,229 @@
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import elasticsearch
+import irc.client
 import re
 import time
 
+from . import serializer
+
 RE_STYLE = re.compile(r"[\x02\x0F\x16\x1D\x1F]|\x03(\d{,2}(,\d{,2})?)?")
 
 
+def make_doc(message, timestamp, source, channel, server):
+    """Make an Elasticsearch document for an IRC channel message.
+
+    >>> make_doc("\x02hi", 0, "nick!user@host", "#chan", "irc.invalid")
+    ... # doctest: +NORMALIZE_WHITESPACE
+    {'message': 'hi', '@timestamp': '1970-01-01T00:00:00Z', 'type': 'irc',
+    'user': 'nick!user@host', 'channel': '#chan', 'nick': 'nick',
+    'server': 'irc.invalid', 'host': 'host'}
+
+    :param message: message text
+    :param timestamp: seconds since the epoch
+    :param source: irc.client.NickMask (or nick!user@host string)
+    :param channel: channel name
+    :param server: server name
+    """
+    source = irc.client.NickMask(source)
+    return {
+        "message": RE_STYLE.sub("", message),
+        "@timestamp": time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp)
+        ),
+        "type": "irc",
+        "user": source,
+        "channel": channel,
+        "nick": source.nick,
+        "server": server,
+        "host": source.host,
+    }
+
+
 class Client(object):
     """Elasticsearch client"""
 
     def __init__(self, servers, options, logger):
-        self.es = elasticsearch.Elasticsearch(servers, **options)
+        self.servers = servers
+        self.options = options
         self.logger = logger
+        self._es = None
+        self._elasticsearch = None
+        self._version = None
+        self._pit = None
+        # Consecutive failed writes
+        self.failures = 0
+
+    @property
+    def elasticsearch(self):
+        """The elasticsearch module, imported on first use.
+
+        It is kept here so that the write path does not look it up again
+        for every document.
+        """
+        if self._elasticsearch is None:
+            # Imported here to keep it off the startup path
+            import elasticsearch
+
+            self._elasticsearch = elasticsearch
+        return self._elasticsearch
+
+    @property
+    def es(self):
+        """elasticsearch.Elasticsearch client, made on first use."""
+        if self._es is None:
+            self._es = self.elasticsearch.Elasticsearch(
+                self.servers,
+                serializer=serializer.elasticsearch_serializer(),
+                **self.options,
+            )
+        return self._es
 
     def event_to_doc(self, conn, event):
         """Make an Elasticsearch document from an IRC event."""
-        return {
-            "message": RE_STYLE.sub("", event.arguments[0]),
-            "@timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            "type": "irc",
-            "user": event.source,
-            "channel": event.target,
-            "nick": event.source.nick,
-            "server": conn.get_server_name(),
-            "host": event.source.host,
-        }
+        return make_doc(
+            event.arguments[0],
+            time.time(),
+            event.source,
+            event.target,
+            conn.get_server_name(),
+        )
 
     def index(self, index, body):
-        """Store a document in Elasticsearch."""
+        """Store a document in Elasticsearch.
+
+        :param index: index name
+        :param body: document dict or JSON bytes
+        """
+        if not isinstance(body, bytes):
+            body = serializer.dumps(body)
+        client = self.es
         try:
-            return self.es.index(index=index, body=body)
-        except elasticsearch.ConnectionError as e:
+            ret = client.index(index=index, body=body)
+        except self.elasticsearch.ConnectionError as e:
+            self.failures += 1
             self.logger.exception(
                 "Failed to log to elasticsearch: %s", e.error
             )
             return {}
+        self.failures = 0
+        return ret
+
+    def scan(self, index, query=None, **kwargs):
+        """Iterate over all documents in an index matching a query."""
+        import elasticsearch.helpers
+
+        return elasticsearch.helpers.scan(
+            self.es, index=index, query=query, **kwargs
+        )
+
+    def bulk(self, actions, chunk_size=500, max_chunk_bytes=100 * 1024**2):
+        """Perform a list of bulk actions.
+
+        Actions are the same dicts that elasticsearch.helpers.bulk takes.
+        They are written straight to NDJSON bytes and sent 'chunk_size' at
+        a time.
+
+        :param actions: iterable of actions
+        :param chunk_size: most actions per request
+        :param max_chunk_bytes: most bytes per request
+        :return: tuple of (number of successful actions, list of errors)
+        :raises elasticsearch.ConnectionError: if Elasticsearch can not be
+            reached; requests sent before the failure may have been stored
+        """
+        client = self.es
+        ok = 0
+        errors = []
+        try:
+            for body, docs in serializer.bulk_chunks(
+                actions, chunk_size, max_chunk_bytes
+            ):
+                resp = client.bulk(body=body)
+                for doc, item in zip(docs, resp["items"]):
+                    op, result = item.popitem()
+                    if 200 <= result.get("status", 500) < 300:
+                        ok += 1
+                        continue
+                    if doc is not None:
+                        result["data"] = doc
+                    errors.append({op: result})
+        except self.elasticsearch.ConnectionError:
+            self.failures += 1
+            raise
+        self.failures = 0
+        return ok, errors
+
+    def server_version(self):
+        """Get the (major, minor) version of the server.
+
+        The answer is cached.
+        """
+        if self._version is None:
+            number = self.es.info()["version"]["number"]
+            self._version = tuple(int(p) for p in number.split(".")[:2])
+        return self._version
+
+    def point_in_time(self):
+        """Check if point in time searches with a _shard_doc sort work.
+
+        They need Elasticsearch 7.12 or later, on the server and in the
+        client library. The answer is cached.
+        """
+        if self._pit is None:
+            try:
+                server = self.server_version()
+            except Exception:
+                self.logger.exception("Failed to get elasticsearch version")
+                return False
+            self._pit = server >= (7, 12) and hasattr(
+                self.es, "open_point_in_time"
+            )
+        return self._pit
+
+    def search_after(self, index, query, sort, size=1000, keep_alive="2m"):
+        """Iterate over all documents matching a query in sort order.
+
+        Results are paged with search_after inside a point in time so that
+        deep result sets can be read with constant memory and without
+        hitting the index.max_result_window limit. Older servers are read
+        with a sorted scroll instead.
+
+        :param index: index name or pattern
+        :param query: query dsl dict
+        :param sort: list of sort clauses; a _shard_doc tiebreaker is added
+        :param size: number of hits to fetch per request
+        :param keep_alive: how long to keep the point in time between pages
+        """
+        if not self.point_in_time():
+            yield from self.scan(
+                index,
+                {"query": query, "sort": list(sort)},
+                size=size,
+                scroll=keep_alive,
+                preserve_order=True,
+            )
+            return
+
+        pit = self.es.open_point_in_time(index=index, keep_alive=keep_alive)
+        body = {
+            "size": size,
+            "query": query,
+            "sort": list(sort) + [{"_shard_doc": "asc"}],
+            "pit": {"id": pit["id"], "keep_alive": keep_alive},
+            "track_total_hits": False,
+        }
+        try:
+            while True:
+                resp = self.es.search(body=body)
+                hits = resp["hits"]["hits"]
+                if not hits:
+                    break
+                for hit in hits:
+                    yield hit
+                body["search_after"] = hits[-1]["sort"]
+                body["pit"]["id"] = resp.get("pit_id", body["pit"]["id"])
+        finally:
+            try:
+                self.es.close_point_in_time(body={"id": body["pit"]["id"]})
+            except self.elasticsearch.ElasticsearchException:
+                self.logger.warning("Failed to close point in time")
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Export SAL messages from Elasticsearch"""
+
+import csv
+import datetime
+import json
+
+from .sal import Logger
+
+CSV_FIELDS = ("@timestamp", "project", "nick", "message")
+
+
+def sal_query(project, start=None, end=None):
+    """Build a query for the SAL messages of a project in a time range.
+
+    :param project: project name
+    :param start: inclusive start date/time understood by Elasticsearch
+    :param end: exclusive end date/time understood by Elasticsearch
+    """
+    filters = [{"term": {"project": project}}]
+    if start or end:
+        when = {}
+        if start:
+            when["gte"] = start
+        if end:
+            when["lt"] = end
+        filters.append({"range": {"@timestamp": when}})
+    return {"bool": {"filter": filters}}
+
+
+def parse_timestamp(ts):
+    """Parse an @timestamp value from a SAL document."""
+    return datetime.datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ")
+
+
+def write_jsonl(docs, out):
+    for doc in docs:
+        out.write(json.dumps(doc, sort_keys=True))
+        out.write("\n")
+
+
+def write_csv(docs, out):
+    writer = csv.DictWriter(
+        out, fieldnames=CSV_FIELDS, extrasaction="ignore", restval=""
+    )
+    writer.writeheader()
+    for doc in docs:
+        writer.writerow(doc)
+
+
+def write_wikitext(docs, out, leader="=="):
+    """Write docs in the same layout that the bot uses on wiki pages.
+
+    Docs are expected to be sorted newest first.
+    """
+    section = None
+    for doc in docs:
+        when = parse_timestamp(doc["@timestamp"])
+        day = when.strftime("%Y-%m-%d")
+        if day != section:
+            if section is not None:
+                out.write("\n")
+            out.write("%s %s %s\n" % (leader, day, leader))
+            section = day
+        out.write(Logger.wiki_entry(when, doc["nick"], doc["message"]))
+        out.write("\n")
+
+
+WRITERS = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+    "wikitext": write_wikitext,
+}
+
+
+def export(es, out, project, start=None, end=None, fmt="jsonl", size=1000):
+    """Stream SAL documents for a project to a file.
+
+    :param es: stashbot.es.Client
+    :param out: file-like object to write to
+    :param project: project name
+    :param start: inclusive start date/time
+    :param end: exclusive end date/time
+    :param fmt: output format; one of WRITERS
+    :param size: number of documents to fetch per request
+    """
+    # Wiki pages list the newest messages first
+    order = "desc" if fmt == "wikitext" else "asc"
+    hits = es.search_after(
+        "sal",
+        sal_query(project, start, end),
+        [{"@timestamp": order}],
+        size=size,
+    )
+    WRITERS[fmt]((hit["_source"] for hit in hits), out)
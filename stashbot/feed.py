@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Live feed of recent SAL messages"""
+
+import collections
+import json
+import queue
+import threading
+
+# Fields of a SAL document that are published. The feed is served to
+# anyone, so hostmasks and other details are left out.
+PUBLIC_FIELDS = ("id", "@timestamp", "project", "nick", "message")
+
+
+class Feed(object):
+    """Recent SAL messages for each project.
+
+    The newest messages of each project are kept in a ring buffer.
+    Subscribers get each new message pushed to their queue as soon as it is
+    published. A subscriber that falls too far behind misses messages
+    rather than slowing down the bot. If set, on_publish is called with
+    each published message, e.g. to pass it on to another process.
+    """
+
+    def __init__(self, size=100, backlog=100):
+        self.size = size
+        self.backlog = backlog
+        self.lock = threading.Lock()
+        self.recent = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.size)
+        )
+        self.subscribers = collections.defaultdict(set)
+        self.on_publish = None
+
+    def publish(self, doc):
+        """Add a SAL message to the feed.
+
+        Only the PUBLIC_FIELDS of the document are kept.
+        """
+        doc = {k: doc[k] for k in PUBLIC_FIELDS if k in doc}
+        project = doc["project"]
+        with self.lock:
+            self.recent[project].append(doc)
+            subscribers = list(self.subscribers.get(project, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(doc)
+            except queue.Full:
+                pass
+        if self.on_publish is not None:
+            self.on_publish(doc)
+
+    def latest(self, project, n=None):
+        """Get up to n of the newest messages for a project, oldest first."""
+        with self.lock:
+            if project not in self.recent:
+                return []
+            docs = list(self.recent[project])
+        if n is not None:
+            docs = docs[-n:] if n > 0 else []
+        return docs
+
+    def subscribe(self, project):
+        """Subscribe to new messages for a project.
+
+        :return: queue.Queue that will receive new messages
+        """
+        q = queue.Queue(maxsize=self.backlog)
+        with self.lock:
+            self.subscribers[project].add(q)
+        return q
+
+    def unsubscribe(self, project, q):
+        with self.lock:
+            self.subscribers[project].discard(q)
+            if not self.subscribers[project]:
+                del self.subscribers[project]
+
+    def handle_latest(self, request, query, project, *args):
+        """HTTP handler for /sal/<project> and /sal/<project>/stream."""
+        if args == ("stream",):
+            return self.handle_stream(request, query, project)
+        if args:
+            return 404, {"error": "Not found"}
+        return 200, self.latest(project, _int(query.get("n"), self.size))
+
+    def handle_stream(self, request, query, project, keepalive=15):
+        """Stream new messages for a project as Server-Sent Events.
+
+        The 'n' query parameter replays that many recent messages first.
+        """
+        q = self.subscribe(project)
+        try:
+            request.send_response(200)
+            request.send_header("Content-Type", "text/event-stream")
+            request.send_header("Cache-Control", "no-cache")
+            request.send_header("Access-Control-Allow-Origin", "*")
+            request.end_headers()
+            request.close_connection = True
+            for doc in self.latest(project, _int(query.get("n"), 0)):
+                request.wfile.write(sse_event(doc))
+            request.wfile.flush()
+            while True:
+                try:
+                    doc = q.get(timeout=keepalive)
+                except queue.Empty:
+                    request.wfile.write(b": keepalive\n\n")
+                else:
+                    request.wfile.write(sse_event(doc))
+                request.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.unsubscribe(project, q)
+
+
+def sse_event(doc):
+    """Format a SAL message as a Server-Sent Event.
+
+    >>> sse_event({"id": "abc", "message": "hi"})
+    b'id: abc\\nevent: sal\\ndata: {"id": "abc", "message": "hi"}\\n\\n'
+    """
+    lines = []
+    if "id" in doc:
+        lines.append("id: %s" % doc["id"])
+    lines.append("event: sal")
+    lines.append("data: %s" % json.dumps(doc))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
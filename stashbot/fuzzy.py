@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Fast edit distance search for suggesting project names"""
+
+import collections
+
+
+def _pattern(word):
+    """Precompute the character bit masks used by _distance()."""
+    peq = {}
+    bit = 1
+    for c in word:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
+    return peq, len(word)
+
+
+def _distance(pattern, other, limit=None):
+    """Levenshtein distance using Myers' bit-parallel algorithm.
+
+    The columns of the dynamic programming matrix for a word are kept as
+    bit vectors, so each character of other costs a handful of integer
+    operations instead of a loop over the word.
+
+    :param limit: stop early and return limit + 1 once the distance is
+        known to be larger than limit
+    """
+    peq, m = pattern
+    if not m:
+        score = len(other)
+        return score if limit is None else min(score, limit + 1)
+    full = (1 << m) - 1
+    top = 1 << (m - 1)
+    pv = full
+    mv = 0
+    score = m
+    # Each remaining character can lower the score by at most one
+    remaining = len(other)
+    for c in other:
+        remaining -= 1
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        if limit is not None and score - remaining > limit:
+            return limit + 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score if limit is None else min(score, limit + 1)
+
+
+def distance(a, b):
+    """Levenshtein edit distance between two strings.
+
+    >>> distance("kitten", "sitting")
+    3
+    >>> distance("", "abc")
+    3
+    """
+    return _distance(_pattern(a), b)
+
+
+def _segments(length, parts):
+    """Split a length into nearly equal (start, end) segments.
+
+    >>> _segments(10, 4)
+    [(0, 3), (3, 6), (6, 8), (8, 10)]
+    """
+    base, extra = divmod(length, parts)
+    segments = []
+    start = 0
+    for part in range(parts):
+        end = start + base + (1 if part < extra else 0)
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+class NameIndex(object):
+    """Find the names closest to a word by edit distance.
+
+    Each name is split into max_distance + 2 segments. A word that is at
+    most max_distance edits away from a name leaves at least two of the
+    name's segments untouched, and each of those appears in the word
+    shifted by at most max_distance characters. A search looks up the
+    word's substrings at those places in a hash of segments and only
+    computes the edit distance for names that matched at least two
+    segments. Names too short to split are always compared.
+
+    Names with a namespace (e.g. "tools.") use the namespace as their first
+    segment. Otherwise thousands of tool accounts would share two segments
+    with any word starting with "tools.".
+
+    >>> index = NameIndex(["tools", "toolsbeta", "deployment-prep", "ci"])
+    >>> index.search("tols")
+    ['tools']
+    >>> index.search("deploymnet-prep")
+    ['deployment-prep']
+    >>> index.search("toolbeta", k=1)
+    ['toolsbeta']
+    """
+
+    def __init__(self, names=(), max_distance=2):
+        self.max_distance = max_distance
+        self.parts = max_distance + 2
+        self.names = set()
+        self.short = []
+        self.postings = collections.defaultdict(list)
+        # length: set of namespace lengths used by names of that length
+        self.layouts = collections.defaultdict(set)
+        self._segment_cache = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _segments(self, length, namespace):
+        key = (length, namespace)
+        segments = self._segment_cache.get(key)
+        if segments is None:
+            if namespace:
+                segments = [(0, namespace)] + [
+                    (start + namespace, end + namespace)
+                    for start, end in _segments(
+                        length - namespace, self.parts - 1
+                    )
+                ]
+            else:
+                segments = _segments(length, self.parts)
+            self._segment_cache[key] = segments
+        return segments
+
+    def add(self, name):
+        """Add a name to the index."""
+        if name in self.names:
+            return
+        self.names.add(name)
+        length = len(name)
+        if length < self.parts:
+            self.short.append(name)
+            return
+        namespace = name.find(".") + 1
+        if length - namespace < self.parts - 1:
+            namespace = 0
+        self.layouts[length].add(namespace)
+        for part, (start, end) in enumerate(self._segments(length, namespace)):
+            self.postings[(length, namespace, part, name[start:end])].append(
+                name
+            )
+
+    def search(self, word, k=3, max_distance=None):
+        """Find the closest names.
+
+        :param word: word to look for
+        :param k: most names to return
+        :param max_distance: largest edit distance to consider; at most
+            the index's max_distance
+        :return: list of names, closest first
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        n = len(word)
+        need = self.parts - max_distance
+        candidates = [
+            name for name in self.short if abs(len(name) - n) <= max_distance
+        ]
+        for length in range(n - max_distance, n + max_distance + 1):
+            # Insertions and deletions before a segment move it by shift;
+            # the ones after it make up the rest of the length difference.
+            # Both count towards the distance.
+            shifts = [
+                shift
+                for shift in range(-max_distance, max_distance + 1)
+                if abs(shift) + abs(n - length - shift) <= max_distance
+            ]
+            for namespace in self.layouts.get(length, ()):
+                segments = self._segments(length, namespace)
+                keys = []
+                hits = []
+                for part, (start, end) in enumerate(segments):
+                    part_keys = set()
+                    for shift in shifts:
+                        lo = start + shift
+                        hi = end + shift
+                        if lo >= 0 and hi <= n:
+                            part_keys.add(word[lo:hi])
+                    keys.append(part_keys)
+                    hits.append(
+                        [
+                            self.postings[(length, namespace, part, key)]
+                            for key in part_keys
+                            if (length, namespace, part, key) in self.postings
+                        ]
+                    )
+                # A match is listed under at least one segment other than
+                # the need - 1 segments with the most names (e.g. the
+                # namespace). Those are checked for each candidate instead.
+                order = sorted(
+                    range(self.parts), key=lambda p: sum(map(len, hits[p]))
+                )
+                cut = self.parts - need + 1
+                matched = {}
+                for part in order[:cut]:
+                    bit = 1 << part
+                    for names in hits[part]:
+                        for name in names:
+                            matched[name] = matched.get(name, 0) | bit
+                for name, bits in matched.items():
+                    count = bin(bits).count("1")
+                    for part in order[cut:]:
+                        start, end = segments[part]
+                        if name[start:end] in keys[part]:
+                            count += 1
+                    if count >= need:
+                        candidates.append(name)
+
+        pattern = _pattern(word)
+        found = []
+        for name in candidates:
+            d = _distance(pattern, name, max_distance)
+            if d <= max_distance:
+                found.append((d, name))
+        return [name for d, name in sorted(found)[:k]]
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""LDAP group membership for acls"""
+
+import threading
+import time
+
+from . import acls
+from . import ldap
+
+EMPTY = frozenset()
+
+
+def referenced(config):
+    """Find the group names used by 'group:<cn>' entries in acls.
+
+    :param config: bot configuration
+    :return: set of group cn values
+    """
+    acl_confs = [config.get("profiling", {}).get("acl", {})]
+    for conf in config.get("sal", {}).get("channels", {}).values():
+        acl_confs.append(conf.get("acl", {}))
+    found = set()
+    for acl in acl_confs:
+        for key in ("allow", "deny"):
+            for mask in acl.get(key, []):
+                if mask.startswith(acls.GROUP_PREFIX):
+                    found.add(mask.split(":", 1)[1])
+    return found
+
+
+def cloak_prefixes(config):
+    """Get the trusted cloak prefixes from the 'ldap' config section."""
+    return tuple(config.get("cloaks", acls.TRUSTED_CLOAKS))
+
+
+class Membership(object):
+    """Cached membership of LDAP groups.
+
+    The members of each group are loaded from LDAP by a background thread
+    every 'refresh' seconds. Each member is known by both its uid and cn,
+    normalized so that they compare equal to the last part of an IRC
+    cloak. Only cloaks starting with one of the 'cloaks' prefixes (default
+    'wikimedia/') are matched. A failed reload keeps the previous members
+    of the group.
+
+    Lookups only read the current dict of frozensets, so checking a
+    message source never waits on LDAP.
+    """
+
+    def __init__(self, config, logger, names=(), refresh=300):
+        self.logger = logger
+        self.base = config["base"]
+        self.groups_base = config.get(
+            "groups_base", "ou=groups,%s" % self.base
+        )
+        self.people_base = config.get(
+            "people_base", "ou=people,%s" % self.base
+        )
+        self.names = set(names)
+        self.cloaks = cloak_prefixes(config)
+        self.refresh = refresh
+        self.ldap = ldap.Client(config["uri"], logger)
+        self.loaded = None
+        self._members = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __contains__(self, cn):
+        return cn in self._members
+
+    def get(self, cn):
+        """Get the normalized member names of a group.
+
+        :param cn: group name
+        :return: frozenset
+        """
+        return self._members.get(cn, EMPTY)
+
+    def set_names(self, names):
+        """Change the groups to load.
+
+        Groups that were not loaded before are loaded right away.
+        """
+        names = set(names)
+        added = names - self.names
+        self.names = names
+        if added:
+            self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="ldap-groups", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.reload()
+            except Exception:
+                self.logger.exception("Error loading LDAP groups")
+            self._wake.wait(self.refresh)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+
+    def reload(self):
+        """Load the members of all groups from LDAP."""
+        if not self.names and not self._members:
+            return
+        members = {
+            cn: m for cn, m in self._members.items() if cn in self.names
+        }
+        for cn in sorted(self.names):
+            uids = self._get_member_uids(cn)
+            if uids is None:
+                continue
+            members[cn] = self._get_names(uids)
+        # Replace the dict rather than changing it so that readers on other
+        # threads always see a complete set of groups.
+        self._members = members
+        self.loaded = time.time()
+        self.logger.info(
+            "Loaded %d LDAP groups with %d members",
+            len(members),
+            sum(len(m) for m in members.values()),
+        )
+
+    def _get_member_uids(self, cn):
+        """Get the uids of the members of a group.
+
+        :return: list of uids or None if the group could not be loaded
+        """
+        import ldap3.utils.conv
+        import ldap3.utils.dn
+
+        try:
+            res = self.ldap.search(
+                self.groups_base,
+                "(&(objectclass=groupofnames)(cn=%s))"
+                % ldap3.utils.conv.escape_filter_chars(cn),
+                attributes=["member"],
+            )
+        except Exception:
+            self.logger.exception("Exception getting LDAP group %s", cn)
+            return None
+        if not res:
+            self.logger.error("LDAP group %s not found", cn)
+            return None
+        uids = []
+        for dn in res[0]["attributes"].get("member", []):
+            rdn = ldap3.utils.dn.parse_dn(dn)[0]
+            if rdn[0].lower() == "uid":
+                uids.append(rdn[1])
+        return uids
+
+    def _get_names(self, uids, batch=100):
+        """Get the normalized uid and cn of each account.
+
+        :param uids: list of uids
+        :return: frozenset
+        """
+        import ldap3.utils.conv
+
+        names = set(acls.normalize(uid) for uid in uids)
+        for lo in range(0, len(uids), batch):
+            hi = lo + batch
+            query = "(|%s)" % "".join(
+                "(uid=%s)" % ldap3.utils.conv.escape_filter_chars(uid)
+                for uid in uids[lo:hi]
+            )
+            try:
+                res = self.ldap.search(
+                    self.people_base, query, attributes=["cn"]
+                )
+            except Exception:
+                self.logger.exception("Exception getting LDAP accounts")
+                continue
+            for person in res or []:
+                for cn in person["attributes"].get("cn", []):
+                    names.add(acls.normalize(cn))
+        return frozenset(names)
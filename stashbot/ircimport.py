@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Import historical IRC logs into the irc-* indices"""
+
+import calendar
+import concurrent.futures
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from . import es
+from . import policy
+
+RE_FILE_DATE = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})\.log$")
+RE_ZNC_MSG = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\] <([^>\s]+)> (.*)$")
+RE_ZNC_JOIN = re.compile(r"^\[[\d:]{8}\] \*\*\* Joins: (\S+) \(([^)]+)\)")
+RE_WEECHAT = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})\t([^\t]*)\t(.*)$"
+)
+RE_WEECHAT_JOIN = re.compile(r"^(\S+) \(([^)]+)\) has joined ")
+WEECHAT_PREFIXES = "~&@%+"
+SUFFIXES = (".log", ".weechatlog")
+
+
+def parse_znc(lines, day):
+    """Parse channel messages from a ZNC log file.
+
+    ZNC logs hold a single day and only record the time of day, so the date
+    comes from the file name. The user@host of a nick is remembered from
+    its last join line.
+
+    >>> list(parse_znc([
+    ...     "[03:04:00] *** Joins: nick (user@host)",
+    ...     "[03:04:05] <nick> hello",
+    ...     "[03:04:06] * nick waves",
+    ... ], (2026, 1, 2)))
+    [(1767323045, 'nick!user@host', 'hello')]
+
+    :param lines: iterable of lines
+    :param day: (year, month, day) tuple
+    :return: generator of (timestamp, source, message) tuples
+    """
+    base = calendar.timegm(tuple(day) + (0, 0, 0))
+    masks = {}
+    for line in lines:
+        line = line.rstrip("\r\n")
+        m = RE_ZNC_MSG.match(line)
+        if m:
+            hh, mm, ss, nick, message = m.groups()
+            yield (
+                base + int(hh) * 3600 + int(mm) * 60 + int(ss),
+                masks.get(nick, nick),
+                message,
+            )
+            continue
+        m = RE_ZNC_JOIN.match(line)
+        if m:
+            masks[m.group(1)] = "%s!%s" % m.groups()
+
+
+def parse_weechat(lines, day=None):
+    """Parse channel messages from a weechat log file.
+
+    >>> list(parse_weechat([
+    ...     "2026-01-02 03:04:00\\t-->\\tnick (user@host) has joined #chan",
+    ...     "2026-01-02 03:04:05\\t@nick\\thello",
+    ...     "2026-01-02 03:04:06\\t *\\tnick waves",
+    ... ]))
+    [(1767323045, 'nick!user@host', 'hello')]
+
+    :param lines: iterable of lines
+    :param day: ignored
+    :return: generator of (timestamp, source, message) tuples
+    """
+    masks = {}
+    for line in lines:
+        m = RE_WEECHAT.match(line.rstrip("\r\n"))
+        if not m:
+            continue
+        nick, message = m.group(7), m.group(8)
+        if nick == "-->":
+            join = RE_WEECHAT_JOIN.match(message)
+            if join:
+                masks[join.group(1)] = "%s!%s" % join.groups()
+            continue
+        nick = nick.strip()
+        if nick in ("", "*", "<--", "--", "=!="):
+            # Actions and status messages
+            continue
+        nick = nick.lstrip(WEECHAT_PREFIXES)
+        when = calendar.timegm(tuple(int(g) for g in m.groups()[:6]))
+        yield when, masks.get(nick, nick), message
+
+
+FORMATS = {"znc": parse_znc, "weechat": parse_weechat}
+
+
+def detect_format(path):
+    """Guess the log format from a file name."""
+    if path.endswith(".weechatlog"):
+        return "weechat"
+    return "znc"
+
+
+def channel_for_path(path, fmt):
+    """Guess the channel of a log file from its path.
+
+    >>> channel_for_path("irc.libera.#wikimedia-cloud.weechatlog", "weechat")
+    '#wikimedia-cloud'
+    >>> channel_for_path("znc/libera/#wikimedia-cloud/2026-01-02.log", "znc")
+    '#wikimedia-cloud'
+    >>> channel_for_path("bd808_libera_#wikimedia-cloud_20260102.log", "znc")
+    '#wikimedia-cloud'
+
+    :return: channel name or None for private message logs
+    """
+    name = os.path.basename(path)
+    if fmt == "weechat":
+        name = name[: -len(".weechatlog")]
+        channel = name.split(".", 2)[-1]
+    elif RE_FILE_DATE.fullmatch(name):
+        channel = os.path.basename(os.path.dirname(path))
+    else:
+        channel = name.rsplit("_", 1)[0].split("_", 2)[-1]
+    if channel[:1] not in ("#", "&"):
+        return None
+    return channel.lower()
+
+
+def find_logs(paths):
+    """Expand a list of files and directories to a sorted list of logs."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                found.extend(
+                    os.path.join(root, f)
+                    for f in files
+                    if f.endswith(SUFFIXES)
+                )
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def make_actions(path, fmt, channel, server, index_fmt, index_policy):
+    """Make bulk index actions for the messages in a log file.
+
+    Documents are given ids derived from their content and position in the
+    file, so importing a file again replaces rather than duplicates its
+    messages.
+    """
+    day = None
+    if fmt == "znc":
+        m = RE_FILE_DATE.search(os.path.basename(path))
+        if not m:
+            return
+        day = tuple(int(g) for g in m.groups())
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for lineno, (when, source, message) in enumerate(FORMATS[fmt](f, day)):
+            doc = es.make_doc(message, when, source, channel, server)
+            if not index_policy.should_index(
+                channel, doc["nick"], doc["message"]
+            ):
+                continue
+            key = "\x00".join(
+                (channel, doc["@timestamp"], doc["nick"], str(lineno))
+            )
+            yield {
+                "_index": time.strftime(index_fmt, time.gmtime(when)),
+                "_id": hashlib.sha1(key.encode("utf-8")).hexdigest(),
+                "_source": doc,
+            }
+
+
+def import_file(
+    path,
+    config,
+    fmt=None,
+    channel=None,
+    server=None,
+    dry_run=False,
+    client=None,
+):
+    """Index the channel messages from one log file.
+
+    This runs in a worker process, so it makes its own Elasticsearch client
+    unless one is given.
+
+    :return: dict of counts for the file; 'failed' is set if Elasticsearch
+        could not be reached
+    """
+    fmt = fmt or detect_format(path)
+    channel = channel or channel_for_path(path, fmt)
+    result = {"path": path, "actions": 0, "indexed": 0, "errors": 0}
+    if channel is None:
+        result["skipped"] = True
+        return result
+    es_conf = config["elasticsearch"]
+    actions = make_actions(
+        path,
+        fmt,
+        channel,
+        server or config["irc"]["server"],
+        es_conf["index"],
+        policy.IndexPolicy(es_conf, policy.clean_nick),
+    )
+    if dry_run:
+        result["indexed"] = result["actions"] = sum(1 for _ in actions)
+        return result
+    if client is None:
+        client = es.Client(
+            es_conf["servers"], es_conf["options"], logging.getLogger()
+        )
+
+    def counted():
+        for action in actions:
+            result["actions"] += 1
+            yield action
+
+    try:
+        ok, errors = client.bulk(counted(), chunk_size=2000)
+    except Exception as e:
+        result["failed"] = str(e)
+        return result
+    result["indexed"] = ok
+    result["errors"] = len(errors)
+    return result
+
+
+def load_checkpoint(path):
+    """Read the record of completed files."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, done):
+    """Atomically save the record of completed files."""
+    tmp = "%s.tmp" % path
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(done, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _file_id(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def import_logs(
+    paths,
+    config,
+    logger,
+    checkpoint=None,
+    workers=4,
+    fmt=None,
+    channel=None,
+    server=None,
+    dry_run=False,
+    client=None,
+):
+    """Import IRC log files into Elasticsearch.
+
+    Files are imported in parallel by a pool of worker processes. Each file
+    that has every message indexed without errors is recorded in the
+    checkpoint file
+    so an interrupted import can be restarted without repeating work.
+    Files that have changed since they were recorded are imported again.
+
+    :param paths: list of log files and directories of log files
+    :param config: bot configuration
+    :param logger: Logger
+    :param checkpoint: path of the checkpoint file
+    :param workers: number of worker processes; 1 imports in this process
+    :param fmt: log format; guessed from each file name if None
+    :param channel: channel for all files; guessed from the path if None
+    :param server: server name for documents (default: irc.server)
+    :param dry_run: count messages without indexing them
+    :param client: es.Client to use when workers is 1
+    :return: dict of total counts
+    """
+    done = load_checkpoint(checkpoint)
+    todo = []
+    for path in find_logs(paths):
+        if done.get(path) == _file_id(path):
+            continue
+        todo.append(path)
+    logger.info("%d files to import", len(todo))
+
+    work = functools.partial(
+        import_file,
+        config=config,
+        fmt=fmt,
+        channel=channel,
+        server=server,
+        dry_run=dry_run,
+    )
+    totals = {
+        "files": 0,
+        "indexed": 0,
+        "errors": 0,
+        "skipped": 0,
+        "failed": 0,
+    }
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(work, todo)
+    else:
+        pool = None
+        results = (work(path, client=client) for path in todo)
+    try:
+        for result in results:
+            path = result["path"]
+            totals["files"] += 1
+            totals["indexed"] += result["indexed"]
+            totals["errors"] += result["errors"]
+            if result.get("skipped"):
+                totals["skipped"] += 1
+                logger.info("Skipped %s; not a channel log", path)
+            elif "failed" in result:
+                totals["failed"] += 1
+                logger.error("Failed to import %s: %s", path, result["failed"])
+            elif result["errors"]:
+                logger.warning(
+                    "%d errors importing %s", result["errors"], path
+                )
+            else:
+                logger.info(
+                    "Imported %d messages from %s", result["indexed"], path
+                )
+            complete = (
+                "failed" not in result
+                and not result["errors"]
+                and result["indexed"] == result["actions"]
+            )
+            if checkpoint and not dry_run and complete:
+                done[path] = _file_id(path)
+                save_checkpoint(checkpoint, done)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return totals
@@ -16,9 +16,6 @@
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import ldap3
-import ldap3.core.exceptions
-
 
 class Client(object):
     """LDAP client"""
@@ -29,6 +26,9 @@ class Client(object):
         self.conn = None
 
     def _connect(self):
+        # Imported here to keep it off the startup path
+        import ldap3
+
         return ldap3.Connection(
             self._uri,
             auto_bind=ldap3.AUTO_BIND_NO_TLS,
@@ -52,6 +52,8 @@ class Client(object):
         single retry, pass `retriable=False` as a named argument to the
         initial call.
         """
+        import ldap3.core.exceptions
+
         if "retriable" in kwargs:
             retriable = kwargs["retriable"]
             del kwargs["retriable"]
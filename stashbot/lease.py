@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Leader election for running a standby bot"""
+
+import fcntl
+import os
+import socket
+import time
+
+LEASE_ID = "leader"
+
+
+def default_holder():
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+class FileLease(object):
+    """Leadership held as an exclusive lock on a shared file.
+
+    The kernel drops the lock when the holding process dies, so a standby
+    can take over on its next attempt. Both instances must see the same
+    file on a filesystem with working flock() support.
+    """
+
+    def __init__(self, path, logger, holder=None):
+        self.path = os.path.expanduser(path)
+        self.logger = logger
+        self.holder = holder or default_holder()
+        self._fh = None
+
+    def acquire(self):
+        """Acquire or keep the lease.
+
+        :return: True if we hold the lease
+        """
+        if self._fh is not None:
+            return True
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write("%s\n" % self.holder)
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self):
+        """Give up the lease."""
+        if self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+
+class ElasticsearchLease(object):
+    """Leadership held as an Elasticsearch document with an expiry time.
+
+    The lease document is created with op_type=create and renewed with
+    optimistic concurrency control (if_seq_no/if_primary_term), so only
+    one instance can win a race. An instance that can't reach
+    Elasticsearch keeps the lease until its own expiry time has passed,
+    which is also the soonest that another instance could take it over.
+    The ttl must be much larger than the clock skew between hosts.
+    """
+
+    def __init__(
+        self, es, logger, index="stashbot-lease", ttl=15, holder=None
+    ):
+        self.es = es
+        self.logger = logger
+        self.index = index
+        self.ttl = ttl
+        self.holder = holder or default_holder()
+        self._expires = 0
+        self._version = None
+
+    def acquire(self, now=None):
+        """Acquire or renew the lease.
+
+        :param now: current time; for testing
+        :return: True if we hold the lease
+        """
+        import elasticsearch
+
+        if now is None:
+            now = time.time()
+        body = {"holder": self.holder, "expires": now + self.ttl}
+        try:
+            try:
+                doc = self.es.get(index=self.index, id=LEASE_ID)
+            except elasticsearch.NotFoundError:
+                ret = self.es.create(
+                    index=self.index, id=LEASE_ID, body=body, refresh=True
+                )
+            else:
+                src = doc["_source"]
+                if src["holder"] != self.holder and src["expires"] > now:
+                    self._expires = 0
+                    return False
+                ret = self.es.index(
+                    index=self.index,
+                    id=LEASE_ID,
+                    body=body,
+                    if_seq_no=doc["_seq_no"],
+                    if_primary_term=doc["_primary_term"],
+                    refresh=True,
+                )
+        except elasticsearch.ConflictError:
+            # Somebody else won the race
+            self._expires = 0
+            return False
+        except elasticsearch.ElasticsearchException:
+            self.logger.exception("Failed to renew lease")
+            return self._expires > now
+        self._expires = body["expires"]
+        self._version = (ret["_seq_no"], ret["_primary_term"])
+        return True
+
+    def release(self):
+        """Give up the lease by marking it as expired."""
+        import elasticsearch
+
+        if self._version is None:
+            return
+        seq_no, primary_term = self._version
+        self._version = None
+        self._expires = 0
+        try:
+            self.es.index(
+                index=self.index,
+                id=LEASE_ID,
+                body={"holder": self.holder, "expires": 0},
+                if_seq_no=seq_no,
+                if_primary_term=primary_term,
+                refresh=True,
+            )
+        except elasticsearch.ElasticsearchException:
+            self.logger.exception("Failed to release lease")
+
+
+def make_lease(config, es, logger):
+    """Make a lease from the 'ha' config section.
+
+    :param config: dict of settings
+    :param es: elasticsearch.Elasticsearch
+    :param logger: Logger
+    """
+    kind = config.get("lease", "elasticsearch")
+    if kind == "file":
+        return FileLease(config["path"], logger, config.get("holder"))
+    if kind == "elasticsearch":
+        return ElasticsearchLease(
+            es,
+            logger,
+            index=config.get("index", "stashbot-lease"),
+            ttl=config.get("ttl", 15),
+            holder=config.get("holder"),
+        )
+    raise ValueError("Unknown lease type %r" % kind)
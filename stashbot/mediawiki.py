@@ -16,7 +16,6 @@
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import mwclient
 
 try:
     from urlparse import urlparse
@@ -53,6 +52,9 @@ class Client(object):
         host = parts.netloc
         if parts.scheme != "https":
             host = (parts.scheme, parts.netloc)
+        # Imported here so that channels without a wiki never load it
+        import mwclient
+
         force_login = consumer_token is not None
         return mwclient.Site(
             host,
@@ -71,6 +73,11 @@ class Client(object):
             page = next(page.links())
         return page
 
+    def get_revision_text(self, revision):
+        """Get the wikitext of a revision."""
+        revs = self.site.revisions([revision], prop="content")
+        return revs[0]["*"] if revs else ""
+
     def get_url_for_revision(self, revision):
         result = self.site.api(
             "query",
@@ -16,8 +16,10 @@
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
-import requests
+import collections
+
+from . import serializer
+from . import tracing
 
 
 class Client(object):
@@ -29,12 +31,14 @@ class Client(object):
         self.session = {"token": key}
 
     def post(self, path, data):
+        import requests
+
         data["__conduit__"] = self.session
         r = requests.post(
             "%s/api/%s" % (self.url, path),
-            data={"params": json.dumps(data), "output": "json"},
+            data={"params": serializer.dumps(data), "output": "json"},
         )
-        resp = r.json()
+        resp = serializer.loads(r.content)
         if resp["error_code"] is not None:
             raise Exception(resp["error_info"])
         return resp["result"]
@@ -76,3 +80,47 @@ class Client(object):
                 "transactions": [{"type": "comment", "value": comment}],
             },
         )
+
+
+class CommentQueue(object):
+    """Coalesce comments for the same task into a single edit.
+
+    Comments are held until flush() is called. All comments queued for a task
+    since the last flush are then posted as one multi-line comment, costing
+    a single phid.lookup and maniphest.edit per task no matter how many
+    comments were queued.
+    """
+
+    def __init__(self, client, logger):
+        self.client = client
+        self.logger = logger
+        self.pending = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, task, comment):
+        """Queue a comment for a task.
+
+        :param task: Task number (e.g. T12345)
+        :param comment: Comment to add to task
+        :return: True if the queue was empty before this comment was added
+        """
+        was_empty = not self.pending
+        comments = self.pending.setdefault(task, [])
+        if comment not in comments:
+            comments.append(comment)
+        return was_empty
+
+    def flush(self, trace=tracing.NULL):
+        """Post all queued comments.
+
+        :param trace: trace to record a span per task in
+        """
+        pending, self.pending = self.pending, collections.OrderedDict()
+        for task, comments in pending.items():
+            try:
+                with trace.span("phab.comment", task=task):
+                    self.client.comment(task, "\n".join(comments))
+            except Exception:
+                self.logger.exception("Failed to add note to %s", task)
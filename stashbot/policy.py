@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Decide which irc messages are stored in Elasticsearch"""
+
+import collections
+import random
+
+FULL = "full"
+SAMPLED = "sampled"
+SAL = "sal"
+OFF = "off"
+MODES = (OFF, SAL, SAMPLED, FULL)
+
+
+def clean_nick(nick):
+    """Remove common status indicators and normlize to lower case.
+
+    >>> clean_nick("bd808|away")
+    'bd808'
+    >>> clean_nick("Bd808__")
+    'bd808'
+    """
+    return nick.split("|", 1)[0].rstrip("`_").lower()
+
+
+class IndexPolicy(object):
+    """Per-channel and per-nick indexing policy.
+
+    The policy is read from the 'policy' key of the elasticsearch config
+    section::
+
+        policy:
+          default: full
+          sample_rate: 0.1
+          channels:
+            '#noisy-feed': sampled
+          nicks:
+            gerrit-wm: off
+            logmsgbot: sal
+
+    Modes are:
+    - full: store every message
+    - sampled: store a random sample_rate fraction of messages
+    - sal: only store !log messages
+    - off: store nothing
+
+    YAML reads unquoted off as false, so booleans are accepted as off and
+    full. A nick rule takes precedence over a channel rule. Rules are compiled
+    into one set per mode so each message costs a few set lookups.
+    """
+
+    def __init__(self, config, clean_nick=str.lower):
+        conf = config.get("policy", {})
+        self.default = _mode(conf.get("default", FULL))
+        self.sample_rate = float(conf.get("sample_rate", 0.1))
+        self.clean_nick = clean_nick
+        self.channels = self._compile(conf.get("channels", {}))
+        self.nicks = self._compile(
+            {clean_nick(k): v for k, v in conf.get("nicks", {}).items()}
+        )
+        self.dropped = collections.Counter()
+
+    def _compile(self, rules):
+        by_mode = collections.defaultdict(set)
+        for name, mode in rules.items():
+            mode = _mode(mode)
+            if mode not in MODES:
+                raise ValueError(
+                    "Unknown index policy %r for %s" % (mode, name)
+                )
+            by_mode[mode].add(name)
+        return [
+            (mode, frozenset(by_mode[mode]))
+            for mode in MODES
+            if mode in by_mode
+        ]
+
+    def mode(self, channel, nick):
+        """Get the indexing mode for a message."""
+        nick = self.clean_nick(nick)
+        for mode, names in self.nicks:
+            if nick in names:
+                return mode
+        for mode, names in self.channels:
+            if channel in names:
+                return mode
+        return self.default
+
+    def should_index(self, channel, nick, message):
+        """Check if a message should be stored.
+
+        Dropped messages are counted in self.dropped by (channel, mode).
+        """
+        mode = self.mode(channel, nick)
+        if mode == FULL:
+            return True
+        if mode == SAMPLED and random.random() < self.sample_rate:
+            return True
+        if mode == SAL and message.startswith("!log "):
+            return True
+        self.dropped[(channel, mode)] += 1
+        return False
+
+    def stats(self):
+        """Get dropped message counts as a dict."""
+        return {
+            "%s %s" % (channel, mode): count
+            for (channel, mode), count in self.dropped.items()
+        }
+
+
+def _mode(value):
+    if value is False:
+        return OFF
+    if value is True:
+        return FULL
+    return value
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""On demand CPU profiles and heap snapshots"""
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+MAX_SECONDS = 600
+
+
+class Profiler(object):
+    """Collect profiling data from a running bot.
+
+    cpu() profiles the reactor thread with cProfile for a number of seconds.
+    It must be called from the reactor thread. heap() takes a tracemalloc
+    snapshot and compares it with the previous one. The first call only
+    starts tracing. Signal handlers use request_cpu() and request_heap()
+    instead, and check_requests() does the work on the next reactor tick.
+
+    Results are written to 'directory' and a top N summary is logged.
+    """
+
+    def __init__(self, reactor, logger, directory, top=25):
+        self.reactor = reactor
+        self.logger = logger
+        self.directory = os.path.expanduser(directory)
+        self.top = top
+        self._profile = None
+        self._snapshot = None
+        self.cpu_requested = False
+        self.heap_requested = False
+
+    def _path(self, kind, ext):
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        return os.path.join(
+            self.directory,
+            "%s-%s.%03d-%d.%s"
+            % (
+                kind,
+                time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)),
+                int(now * 1000) % 1000,
+                os.getpid(),
+                ext,
+            ),
+        )
+
+    def request_cpu(self):
+        """Ask for a CPU profile on the next tick.
+
+        Safe to call from a signal handler.
+        """
+        self.cpu_requested = True
+
+    def request_heap(self):
+        """Ask for a heap snapshot on the next tick.
+
+        Safe to call from a signal handler.
+        """
+        self.heap_requested = True
+
+    def check_requests(self):
+        """Start the profiles asked for since the last call."""
+        if self.cpu_requested:
+            self.cpu_requested = False
+            self.cpu()
+        if self.heap_requested:
+            self.heap_requested = False
+            self.heap()
+
+    def cpu(self, seconds=30):
+        """Start a CPU profile.
+
+        :return: False if a profile is already running
+        """
+        if self._profile is not None:
+            return False
+        seconds = max(1, min(int(seconds), MAX_SECONDS))
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self.reactor.scheduler.execute_after(seconds, self._finish_cpu)
+        self.logger.warning("Started %ds CPU profile", seconds)
+        return True
+
+    def _finish_cpu(self):
+        profile, self._profile = self._profile, None
+        profile.disable()
+        path = self._path("cpu", "pstats")
+        profile.dump_stats(path)
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        self.logger.warning(
+            "Wrote CPU profile to %s\n%s", path, out.getvalue()
+        )
+
+    def heap(self):
+        """Take a heap snapshot.
+
+        :return: path the snapshot was written to or None
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.logger.warning(
+                "Started tracing memory allocations; "
+                "take another snapshot to see them"
+            )
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        path = self._path("heap", "tracemalloc")
+        snapshot.dump(path)
+        if self._snapshot is None:
+            stats = snapshot.statistics("lineno")
+            title = "Top allocations"
+        else:
+            stats = snapshot.compare_to(self._snapshot, "lineno")
+            title = "Top allocation changes since last snapshot"
+        self._snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        self.logger.warning(
+            "Wrote heap snapshot to %s; traced %d bytes (peak %d)\n%s:\n%s",
+            path,
+            current,
+            peak,
+            title,
+            "\n".join(str(s) for s in stats[: self.top]),
+        )
+        return path
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import heapq
+import itertools
+import time
+
+
+class Bucket(object):
+    __slots__ = ("tokens", "stamp", "full_at", "warned")
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.stamp = now
+        self.full_at = now
+        self.warned = False
+
+
+class Limiter(object):
+    """Token bucket rate limiter with one bucket per key.
+
+    A bucket that has refilled completely behaves the same as a missing
+    bucket, so buckets are dropped as soon as they are full again. A heap
+    ordered by the time each bucket will be full finds them without looking
+    at the others. The least recently used buckets are also dropped when
+    there are more than maxlen of them. Memory use is bounded no matter how
+    many keys are seen.
+    """
+
+    def __init__(self, maxlen=4096):
+        self.maxlen = maxlen
+        self.buckets = collections.OrderedDict()
+        # (full_at, seq, key); entries for changed buckets are skipped
+        self._expiry = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def allow(self, key, rate, burst, now=None):
+        """Take a token from a key's bucket.
+
+        :param key: hashable key
+        :param rate: tokens added per second
+        :param burst: bucket size
+        :param now: current monotonic time; for testing
+        :return: True if a token was available
+        """
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = Bucket(burst, now)
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.maxlen:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket.tokens = min(
+                float(burst), bucket.tokens + (now - bucket.stamp) * rate
+            )
+            bucket.stamp = now
+
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        bucket.warned = False
+        bucket.full_at = now + (burst - bucket.tokens) / rate
+        heapq.heappush(self._expiry, (bucket.full_at, next(self._seq), key))
+        if len(self._expiry) > 4 * self.maxlen:
+            self._compact()
+        return True
+
+    def warn(self, key):
+        """Check if a throttled key should be warned.
+
+        :return: True the first time this is called after a key was denied
+        """
+        bucket = self.buckets.get(key)
+        if bucket is None or bucket.warned:
+            return False
+        bucket.warned = True
+        return True
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            full_at, seq, key = heapq.heappop(self._expiry)
+            bucket = self.buckets.get(key)
+            if bucket is not None and bucket.full_at <= now:
+                del self.buckets[key]
+
+    def _compact(self):
+        # Drop the entries left behind by buckets that have changed since
+        self._expiry = [
+            (bucket.full_at, next(self._seq), key)
+            for key, bucket in self.buckets.items()
+        ]
+        heapq.heapify(self._expiry)
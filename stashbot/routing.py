@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Routing rules for !log messages"""
+
+import collections
+
+# Bots that relay !log messages for others as "!log user@host message".
+# The value is prepended to the relayed user@host to make the logged nick.
+# Relays with an empty prefix are trusted, and are not replied to so that
+# robots don't talk to each other.
+DEFAULT_RELAYS = {
+    "logmsgbot": "",
+    "logmsgbot_cloud": "",
+    # wm-bot can be easily spoofed, so we add a "wmbot~" prefix
+    "wm-bot": "wmbot~",
+    "wm-bot2": "wmbot~",
+}
+
+_CLOUD_RULES = {
+    # Expect "!log <project> <message>"
+    "project_from_message": True,
+    "duplicate": [
+        {
+            # The releng folks would like to see these in their unified SAL
+            "projects": ["deployment-prep", "contintcloud"],
+            "channel": "#wikimedia-releng",
+        },
+    ],
+    "deprecated": {
+        "tools.paws": "paws",
+        "tools.paws-public": "paws",
+        "tools.quarry": "quarry",
+    },
+}
+
+# Rules for the channels that used to be special cased in sal.Logger.log.
+# Rules in a channel's config replace these.
+DEFAULT_RULES = {
+    "#wikimedia-cloud": _CLOUD_RULES,
+    "#wikimedia-cloud-feed": _CLOUD_RULES,
+    "#wikimedia-operations": {
+        "duplicate": [
+            {"contains": "#releng", "channel": "#wikimedia-releng"},
+        ],
+    },
+}
+RULE_KEYS = ("project_from_message", "duplicate", "deprecated")
+
+Route = collections.namedtuple(
+    "Route",
+    [
+        # Channel whose config is used (after following use_config)
+        "channel",
+        # SAL config for the channel
+        "conf",
+        # Read the project from the start of the message
+        "project_from_message",
+        # dict of project to channels to duplicate the message to
+        "duplicate_projects",
+        # tuple of (substring, channel) to duplicate matching messages to
+        "duplicate_contains",
+        # dict of deprecated project to replacement
+        "deprecated",
+    ],
+)
+
+
+class Router(object):
+    """Compiled routing table for !log messages.
+
+    Each channel in the sal config is resolved to a Route when the config
+    is loaded, following 'use_config' and merging in DEFAULT_RULES. Routing
+    a message is then a dict lookup.
+
+    Channel configs can set these rules::
+
+        project_from_message: true
+        duplicate:
+          - projects: [deployment-prep]
+            channel: '#wikimedia-releng'
+          - contains: '#releng'
+            channel: '#wikimedia-releng'
+        deprecated:
+          tools.paws: paws
+
+    The 'relays' key of the sal section adds to DEFAULT_RELAYS.
+    """
+
+    def __init__(self, sal_config):
+        channels = sal_config.get("channels", {})
+        self.relays = dict(DEFAULT_RELAYS, **sal_config.get("relays", {}))
+        self.routes = {}
+        for name, conf in channels.items():
+            target = name
+            if "use_config" in conf:
+                target = conf["use_config"]
+                conf = channels.get(target, {})
+            if "project" not in conf:
+                continue
+            rules = dict(DEFAULT_RULES.get(target, {}))
+            rules.update((k, conf[k]) for k in RULE_KEYS if k in conf)
+            self.routes[name] = self._compile(target, conf, rules)
+
+    @staticmethod
+    def _compile(channel, conf, rules):
+        by_project = collections.defaultdict(list)
+        contains = []
+        for rule in rules.get("duplicate", []):
+            for project in rule.get("projects", []):
+                by_project[project].append(rule["channel"])
+            if "contains" in rule:
+                contains.append((rule["contains"], rule["channel"]))
+        return Route(
+            channel=channel,
+            conf=conf,
+            project_from_message=bool(rules.get("project_from_message")),
+            duplicate_projects=dict(by_project),
+            duplicate_contains=tuple(contains),
+            deprecated=dict(rules.get("deprecated", {})),
+        )
+
+    def route(self, channel):
+        """Get the Route for a channel, or None if !log is not expected."""
+        return self.routes.get(channel)
+
+    def relay_prefix(self, nick):
+        """Get the nick prefix for a relay bot, or None if not a relay."""
+        return self.relays.get(nick)
+
+    def duplicates(self, route, project, message):
+        """List the channels that a message should be duplicated to."""
+        targets = list(route.duplicate_projects.get(project, ()))
+        targets.extend(
+            channel
+            for needle, channel in route.duplicate_contains
+            if needle in message
+        )
+        return targets
@@ -20,54 +20,87 @@ import datetime
 import re
 import time
 
-import mastodon
-
 from . import acls
+from . import dedupe
+from . import feed
+from . import fuzzy
+from . import groups
 from . import ldap
 from . import mediawiki
+from . import routing
+from . import tracing
+from .phab import CommentQueue
 
 
 RE_PHAB = re.compile(r"\b(T\d+)\b")
 RE_CURLY_OPEN = re.compile(r"(?<!{)({)(?!{)")
 RE_CURLY_CLOSE = re.compile(r"(?<!})(})(?!})")
+ARCHIVE_LINK_PREFIX = "''Older entries: "
+ARCHIVE_LINK = ARCHIVE_LINK_PREFIX + "[[%(title)s|%(label)s]]''"
 
 
 class Logger(object):
     """Handle server admin logs"""
 
-    def __init__(self, irc, phab, es, config, logger):
+    def __init__(self, irc, phab, es, config, logger, tracer=None):
         self.irc = irc
         self.phab = phab
         self.es = es
         self.config = config
         self.logger = logger
+        self.tracer = tracer or tracing.NullTracer()
 
         self.ldap = ldap.Client(self.config["ldap"]["uri"], self.logger)
+        self.groups = groups.Membership(
+            self.config["ldap"],
+            self.logger,
+            names=groups.referenced(self.config),
+            refresh=self.config["ldap"].get("group_refresh", 300),
+        )
         self._cached_wikis = {}
         self._cached_mastodon = {}
         self._cached_projects = None
-
-    def log(self, conn, event, doc, respond_to_channel=True):
+        self._project_index = fuzzy.NameIndex()
+        self._phab_comments = CommentQueue(self.phab, self.logger)
+        self._recent = dedupe.Window()
+        self.router = routing.Router(self.config["sal"])
+        self.feed = feed.Feed(self.config["sal"].get("feed_size", 100))
+
+    def configure(self, snapshot):
+        """Switch to a new config.Snapshot."""
+        self.config = snapshot.raw
+        self.router = snapshot.router
+        self.groups.set_names(snapshot.acl_groups)
+        self.groups.cloaks = groups.cloak_prefixes(self.config["ldap"])
+
+    def log(
+        self,
+        conn,
+        event,
+        doc,
+        respond_to_channel=True,
+        trace=tracing.NULL,
+        do_phab=None,
+    ):
         """Process a !log message
 
-        The respond_to_channel parameter is not passed by the
-        main caller in bot.py, but rather is for internal use
-        by _log_duplicate().
+        The respond_to_channel parameter is for internal use by
+        _log_duplicate() and for messages replayed after a failover. Time
+        spent in each step is recorded as a span of trace.
+
+        :param do_phab: comment on mentioned tasks (default:
+            respond_to_channel)
         """
         bang = dict(doc)
-        channel = bang["channel"]
-        is_from_logmsgbot = bang["nick"] in {"logmsgbot", "logmsgbot_cloud"}
-        is_from_wmbot = bang["nick"] in {"wm-bot", "wm-bot2"}
-
-        channel_conf = self._get_sal_config(channel)
-
-        if "use_config" in channel_conf:
-            channel = channel_conf["use_config"]
-            channel_conf = self._get_sal_config(channel)
+        relay = self.router.relay_prefix(bang["nick"])
+        # Reduce noise in channels by not making robots
+        # respond to each other.
+        is_from_robot = relay == ""
 
-        if "project" not in channel_conf:
+        route = self.router.route(bang["channel"])
+        if route is None:
             self.logger.warning(
-                "!log message on unexpected channel %s", channel
+                "!log message on unexpected channel %s", bang["channel"]
             )
             if respond_to_channel:
                 self.irc.respond(
@@ -76,8 +109,12 @@ class Logger(object):
                     "%s: Not expecting to hear !log here" % bang["nick"],
                 )
             return
+        channel = route.channel
+        channel_conf = route.conf
 
-        if not self._check_sal_acl(channel, event.source):
+        with trace.span("acl"):
+            allowed = self._check_sal_acl(channel, event.source)
+        if not allowed:
             self.logger.warning(
                 "Ignoring !log from %s in %s", event.source, channel
             )
@@ -106,19 +143,18 @@ class Logger(object):
                 )
             return
 
-        # - Strip 'user@host' portion
+        # - Strip 'user@host' portion from relayed messages
         parts = bang["message"].split(None, 1)
-        if len(parts) > 1 and re.fullmatch(r"[^@]+@.+", parts[0]):
-            if is_from_logmsgbot:
-                # we trust messages coming from logmsgbot
-                bang["nick"], bang["message"] = parts
-            if is_from_wmbot:
-                # wm-bot can be easily spoofed, so we add a "wmbot~" prefix
-                bang["nick"] = "wmbot~%s" % parts[0]
-                bang["message"] = parts[1]
+        if (
+            relay is not None
+            and len(parts) > 1
+            and re.fullmatch(r"[^@]+@.+", parts[0])
+        ):
+            bang["nick"] = relay + parts[0]
+            bang["message"] = parts[1]
 
         # - Strip 'project' portion
-        if channel in ["#wikimedia-cloud-feed", "#wikimedia-cloud"]:
+        if route.project_from_message:
             parts = bang["message"].split(None, 1)
             if len(parts) < 2:
                 if respond_to_channel:
@@ -134,7 +170,9 @@ class Logger(object):
                 return
 
             bang["project"], bang["message"] = parts
-            if bang["project"] not in self._get_projects():
+            with trace.span("ldap.projects"):
+                projects = self._get_projects()
+            if bang["project"] not in projects:
                 self.logger.warning('Invalid project "%s"', bang["project"])
                 if respond_to_channel:
                     self.irc.respond(
@@ -143,69 +181,89 @@ class Logger(object):
                         '%s: Unknown project "%s"'
                         % (bang["nick"], bang["project"]),
                     )
-                    tool = "tools.%s" % bang["project"]
-                    if tool in self._get_projects():
+                    suggestions = self._suggest_projects(
+                        bang["project"], projects
+                    )
+                    if suggestions:
                         self.irc.respond(
                             conn,
                             event,
-                            '%s: Did you mean to say "%s" instead?'
-                            % (bang["nick"], tool),
+                            "%s: Did you mean to say %s instead?"
+                            % (
+                                bang["nick"],
+                                " or ".join('"%s"' % s for s in suggestions),
+                            ),
                         )
                 return
 
-            if bang["project"] in ["deployment-prep", "contintcloud"]:
-                # We got a message that the releng folks would like to see in
-                # their unified SAL too. Munge the message and call ourself
-                # again, but don't say anything on irc about it.
-                self._log_duplicate(
+        if bang["project"] in route.deprecated:
+            if respond_to_channel:
+                self.irc.respond(
                     conn,
                     event,
-                    bang,
-                    channel="#wikimedia-releng",
-                    message="!log %s" % bang["message"],
-                )
-
-            if bang["project"] in ["tools.paws", "tools.paws-public"]:
-                if respond_to_channel:
-                    self.irc.respond(
-                        conn,
-                        event,
-                        (
-                            '%s: SAL for "%s" is deprecated. '
-                            'Use "!log paws" instead.'
-                        )
-                        % (bang["nick"], bang["project"]),
+                    (
+                        '%s: SAL for "%s" is deprecated. '
+                        'Use "!log %s" instead.'
                     )
-                return
+                    % (
+                        bang["nick"],
+                        bang["project"],
+                        route.deprecated[bang["project"]],
+                    ),
+                )
+            return
 
-            if bang["project"] in ["tools.quarry"]:
-                if respond_to_channel:
+        # - Skip repeats of a recent message
+        dedupe_key = None
+        if respond_to_channel:
+            dedupe_key, ttl = self._dedupe_key(channel_conf, bang)
+            if dedupe_key is not None and self._recent.seen_recently(
+                dedupe_key
+            ):
+                self.logger.info(
+                    "Ignoring duplicate !log from %s in %s",
+                    bang["nick"],
+                    channel,
+                )
+                if not is_from_robot:
                     self.irc.respond(
                         conn,
                         event,
-                        (
-                            '%s: SAL for "%s" is deprecated. '
-                            'Use "!log quarry" instead.'
-                        )
-                        % (bang["nick"], bang["project"]),
+                        "%s: Ignoring duplicate of a recent !log message"
+                        % bang["nick"],
                     )
                 return
 
-        elif channel == "#wikimedia-operations":
-            if "#releng" in bang["message"]:
+        for target in self.router.duplicates(
+            route, bang["project"], bang["message"]
+        ):
+            # Munge the message and call ourself again, but don't say
+            # anything on irc about it.
+            with trace.span("duplicate", channel=target):
                 self._log_duplicate(
-                    conn, event, bang, channel="#wikimedia-releng"
+                    conn,
+                    event,
+                    bang,
+                    trace=trace,
+                    channel=target,
+                    message="!log %s" % bang["message"],
                 )
 
-        self._store_in_es(bang, do_phab=respond_to_channel)
+        with trace.span("store", channel=channel):
+            if do_phab is None:
+                do_phab = respond_to_channel
+            stored = self._store_in_es(bang, do_phab=do_phab, trace=trace)
+        if stored and dedupe_key is not None:
+            # Only stored messages count, so that a retry after a failure
+            # is not ignored
+            self._recent.add(dedupe_key, ttl)
 
         if "wiki" in channel_conf:
             try:
-                url = self._write_to_wiki(bang, channel_conf)
+                with trace.span("wiki", wiki=channel_conf["wiki"]):
+                    url = self._write_to_wiki(bang, channel_conf, trace)
 
-                # Reduce noise in channels by not making robots
-                # respond to each other.
-                if respond_to_channel and not is_from_logmsgbot:
+                if respond_to_channel and not is_from_robot:
                     self.irc.respond(
                         conn, event, "Logged the message at %s" % url
                     )
@@ -224,11 +282,12 @@ class Logger(object):
 
         if "mastodon" in channel_conf:
             try:
-                self._toot(bang, channel_conf)
+                with trace.span("toot"):
+                    self._toot(bang, channel_conf)
             except Exception:
                 self.logger.exception("Error writing to Mastodon")
 
-    def _log_duplicate(self, conn, event, doc, **kwargs):
+    def _log_duplicate(self, conn, event, doc, trace=tracing.NULL, **kwargs):
         if not kwargs:
             self.logger.warning(
                 "Cowardly refusing to re-log an unmodified message"
@@ -236,7 +295,28 @@ class Logger(object):
             return
         new_doc = dict(doc)
         new_doc.update(kwargs)
-        self.log(conn, event, new_doc, respond_to_channel=False)
+        self.log(conn, event, new_doc, respond_to_channel=False, trace=trace)
+
+    def _dedupe_key(self, channel_conf, bang):
+        """Get the key and window used to find repeats of a message.
+
+        The window is set by the 'dedupe_window' setting of the channel or
+        of the sal section (default 60 seconds). A window of 0 disables the
+        check.
+
+        :return: tuple of (key or None if disabled, window in seconds)
+        """
+        ttl = channel_conf.get(
+            "dedupe_window", self.config["sal"].get("dedupe_window", 60)
+        )
+        if not ttl:
+            return None, 0
+        key = dedupe.make_key(
+            bang["project"],
+            self.irc._clean_nick(bang["nick"]),
+            bang["message"],
+        )
+        return key, ttl
 
     def _get_sal_config(self, channel):
         """Get SAL configuration for given channel."""
@@ -251,12 +331,32 @@ class Logger(object):
         conf = self._get_sal_config(channel)
         if "acl" not in conf:
             return True
-        if channel not in conf["acl"]:
-            return True
-        return acls.check(conf["acl"], source)
+        return acls.check(conf["acl"], source, self.groups)
+
+    def _suggest_projects(self, name, projects):
+        """Find valid project names that are close to an unknown one.
+
+        The tool account for the name is always suggested first if it
+        exists. Up to 'suggestions' (default 3) names within
+        'suggest_distance' (default 2) edits follow.
+        """
+        conf = self.config["sal"]
+        count = conf.get("suggestions", 3)
+        found = []
+        tool = "tools.%s" % name
+        if tool in projects:
+            found.append(tool)
+        for match in self._project_index.search(
+            name.lower(),
+            k=count,
+            max_distance=conf.get("suggest_distance", 2),
+        ):
+            if match not in found:
+                found.append(match)
+        return found[:count]
 
     def _get_projects(self):
-        """Get a list of valid Labs projects"""
+        """Get the set of valid Labs projects"""
         if self._cached_projects and self._cached_projects[0] < time.time():
             # Clear expired cache
             self._cached_projects = None
@@ -268,7 +368,10 @@ class Logger(object):
             if projects and servicegroups:
                 self._cached_projects = (
                     time.time() + 300,
-                    projects + servicegroups,
+                    frozenset(projects + servicegroups),
+                )
+                self._project_index = fuzzy.NameIndex(
+                    sorted(self._cached_projects[1])
                 )
                 self.logger.info(
                     "Caching project list until %d", self._cached_projects[0]
@@ -277,7 +380,7 @@ class Logger(object):
                 # One or both lists empty probably means LDAP failures
                 # Don't cache the result.
                 self.logger.warning("Returning partial project list")
-                return projects + servicegroups
+                return frozenset(projects + servicegroups)
 
         return self._cached_projects[1]
 
@@ -296,25 +399,45 @@ class Logger(object):
             self.logger.exception("Exception getting LDAP data for %s", dn)
         return []
 
-    def _store_in_es(self, bang, do_phab=True):
-        """Save a !log message to elasticsearch."""
-        ret = self.es.index(index="sal", body=bang)
-        if (
-            do_phab
-            and "phab" in self.config["sal"]
-            and "result" in ret
-            and ret["result"] == "created"
-        ):
+    def _store_in_es(self, bang, do_phab=True, trace=tracing.NULL):
+        """Save a !log message to elasticsearch.
+
+        :return: True if the message was stored
+        """
+        with trace.span("es.index"):
+            ret = self.es.index(index="sal", body=bang)
+        if "result" not in ret or ret["result"] != "created":
+            return False
+        self.feed.publish(dict(bang, id=ret["_id"]))
+        if do_phab and "phab" in self.config["sal"]:
             m = RE_PHAB.findall(bang["message"])
             msg = self.config["sal"]["phab"] % dict(
                 {"href": self.config["sal"]["view_url"] % ret["_id"]}, **bang
             )
             # T243843: De-duplicate task ids
-            for task in set(m):
-                try:
-                    self.phab.comment(task, msg)
-                except Exception:
-                    self.logger.exception("Failed to add note to phab task")
+            tasks = sorted(set(m))
+            if tasks:
+                # Comments are posted later by flush(), under its own trace
+                trace.annotate(phab_tasks=",".join(tasks))
+            for task in tasks:
+                if self._phab_comments.add(task, msg):
+                    # Collect other mentions for a while so that a burst of
+                    # !log messages becomes one comment per task.
+                    self.irc.reactor.scheduler.execute_after(
+                        self.config["sal"].get("phab_delay", 5),
+                        self.flush,
+                    )
+        return True
+
+    def flush(self):
+        """Send any queued Phabricator comments."""
+        if not len(self._phab_comments):
+            return
+        trace = self.tracer.start("phab.flush")
+        try:
+            self._phab_comments.flush(trace)
+        finally:
+            trace.finish()
 
     @staticmethod
     def safe_arg(s):
@@ -330,7 +453,35 @@ class Logger(object):
 
         return s
 
-    def _write_to_wiki(self, bang, channel_conf):
+    @staticmethod
+    def unsafe_arg(s):
+        """Reverse the escaping done by safe_arg().
+
+        >>> Logger.unsafe_arg(Logger.safe_arg("a|{b}"))
+        'a|{b}'
+        """
+        s = s.replace("{{!}}", "|")
+        s = s.replace("<nowiki>{</nowiki>", "{")
+        s = s.replace("<nowiki>}</nowiki>", "}")
+        return s
+
+    @staticmethod
+    def wiki_entry(when, nick, message, template="SAL entry"):
+        """Format a !log message as a wikitext list item.
+
+        >>> Logger.wiki_entry(
+        ...     datetime.datetime(2026, 1, 2, 3, 4), "nick", "a|b")
+        '* {{SAL entry|1=03:04 nick: a{{!}}b}}'
+        """
+        return "* {{%s|1=%02d:%02d %s: %s}}" % (
+            template,
+            when.hour,
+            when.minute,
+            nick,
+            Logger.safe_arg(message),
+        )
+
+    def _write_to_wiki(self, bang, channel_conf, trace=tracing.NULL):
         """Write a !log message to a wiki page."""
         now = datetime.datetime.utcnow()
         leader = channel_conf.get("leader", "==")
@@ -338,18 +489,15 @@ class Logger(object):
             "%(leader)s %(date_format)s %(leader)s"
             % {"leader": leader, "date_format": "%Y-%m-%d"}
         )
-        logline = "* {{safesubst:SAL entry|1=%02d:%02d %s: %s}}" % (
-            now.hour,
-            now.minute,
-            bang["nick"],
-            Logger.safe_arg(bang["message"]),
+        logline = Logger.wiki_entry(
+            now, bang["nick"], bang["message"], "safesubst:SAL entry"
         )
         summary = "%(nick)s: %(message)s" % bang
 
         site = self._get_mediawiki_client(channel_conf["wiki"])
-        page = site.get_page(channel_conf["page"] % bang)
-
-        text = page.text()
+        with trace.span("get_page"):
+            page = site.get_page(channel_conf["page"] % bang)
+            text = page.text()
         lines = text.split("\n")
         first_header = 0
 
@@ -370,8 +518,166 @@ class Logger(object):
             if not re.search(r"\[\[Category:%s\]\]" % cat, text):
                 lines.append("<noinclude>[[Category:%s]]</noinclude>" % cat)
 
-        resp = page.save("\n".join(lines), summary=summary, bot=True)
-        return site.get_url_for_revision(resp["newrevid"])
+        if "archive_size" in channel_conf:
+            with trace.span("archive"):
+                lines = self._archive_wiki_sections(
+                    site, page.name, lines, channel_conf
+                )
+
+        with trace.span("page.save"):
+            resp = page.save("\n".join(lines), summary=summary, bot=True)
+        with trace.span("get_url_for_revision"):
+            return site.get_url_for_revision(resp["newrevid"])
+
+    def _archive_wiki_sections(self, site, title, lines, channel_conf):
+        """Move old month sections of a SAL page to yearly archive pages.
+
+        Nothing is done until the page is larger than the channel's
+        'archive_size' setting (in bytes). The archived entries are saved
+        before the live page is shortened so a failure part way through can
+        only duplicate entries, never lose them.
+
+        :return: list of lines to keep on the live page
+        """
+        leader = channel_conf.get("leader", "==")
+        keep, archived = Logger.split_archive(
+            lines, leader, channel_conf["archive_size"]
+        )
+        if not archived:
+            return lines
+
+        for year, old_lines in archived.items():
+            archive_title = channel_conf.get(
+                "archive_page", "%(page)s/Archive %(year)s"
+            ) % {"page": title, "year": year}
+            archive = site.get_page(archive_title)
+            archive_lines = archive.text().split("\n")
+            pos = Logger._first_section(archive_lines, leader)
+            if pos is None:
+                pos = len(archive_lines)
+            archive_lines[pos:pos] = old_lines + [""]
+            if "category" in channel_conf:
+                cat = channel_conf["category"]
+                link = "<noinclude>[[Category:%s]]</noinclude>" % cat
+                if link not in archive_lines:
+                    archive_lines.append(link)
+            archive.save(
+                "\n".join(archive_lines).strip() + "\n",
+                summary="Archiving %d lines from [[%s]]"
+                % (len(old_lines), title),
+                bot=True,
+            )
+            self.logger.info("Archived old SAL entries to %s", archive_title)
+
+            link = ARCHIVE_LINK % {
+                "title": archive_title,
+                "label": archive_title.rsplit("/", 1)[-1],
+            }
+            if link not in keep:
+                pos = Logger._trailer_start(keep, leader)
+                while pos < len(keep) and not keep[pos].strip():
+                    pos += 1
+                keep.insert(pos, link)
+        return keep
+
+    @staticmethod
+    def _section_re(leader):
+        return re.compile(
+            r"^%(l)s (\d{4})-(\d{2})-\d{2} %(l)s$" % {"l": re.escape(leader)}
+        )
+
+    @staticmethod
+    def _first_section(lines, leader):
+        """Find the index of the first dated section header in lines."""
+        header = Logger._section_re(leader)
+        for pos, line in enumerate(lines):
+            if header.match(line):
+                return pos
+        return None
+
+    @staticmethod
+    def _trailer_start(lines, leader):
+        """Find the start of the non-entry lines at the end of a page.
+
+        Blank lines, ``<noinclude>`` markup and archive links are kept at the
+        bottom of the live page rather than being treated as part of the
+        oldest section.
+        """
+        header = Logger._section_re(leader)
+        pos = len(lines)
+        while pos > 0:
+            line = lines[pos - 1]
+            if header.match(line):
+                break
+            if line.strip() and not (
+                line.startswith("<noinclude>")
+                or line.startswith(ARCHIVE_LINK_PREFIX)
+            ):
+                break
+            pos -= 1
+        return pos
+
+    @staticmethod
+    def split_archive(lines, leader, max_size):
+        """Split the oldest month sections off of a SAL page.
+
+        Whole months are removed, oldest first, until the page is no larger
+        than max_size bytes. The newest month is always kept.
+
+        >>> page = ["== 2025-02-01 ==", "* b", "== 2025-01-31 ==", "* a"]
+        >>> keep, old = Logger.split_archive(page, "==", 1)
+        >>> keep
+        ['== 2025-02-01 ==', '* b', '']
+        >>> old
+        {'2025': ['== 2025-01-31 ==', '* a']}
+
+        :param lines: list of page lines, newest section first
+        :param leader: section header leader (e.g. '==')
+        :param max_size: target page size in bytes
+        :return: tuple of (lines to keep, dict of year to archived lines)
+        """
+        header = Logger._section_re(leader)
+        trailer = Logger._trailer_start(lines, leader)
+        body, tail = lines[:trailer], lines[trailer:]
+
+        # (position, 'YYYY-MM') for each dated section header
+        sections = []
+        for pos, line in enumerate(body):
+            m = header.match(line)
+            if m:
+                sections.append((pos, "%s-%s" % m.groups()))
+
+        size = len("\n".join(lines).encode("utf-8"))
+        archived = []
+        end = len(body)
+        while size > max_size and sections:
+            month = sections[-1][1]
+            if month == sections[0][1]:
+                # Never archive the current month
+                break
+            start = end
+            while sections and sections[-1][1] == month:
+                start = sections.pop()[0]
+            chunk = body[start:end]
+            while chunk and not chunk[-1].strip():
+                chunk.pop()
+            archived[0:0] = [(month[:4], chunk)]
+            size -= len("\n".join(body[start:end]).encode("utf-8")) + 1
+            end = start
+
+        if not archived:
+            return lines, {}
+
+        by_year = {}
+        for year, chunk in archived:
+            by_year.setdefault(year, []).extend(chunk)
+
+        keep = body[:end]
+        while keep and not keep[-1].strip():
+            keep.pop()
+        while tail and not tail[0].strip():
+            tail.pop(0)
+        return keep + [""] + tail, by_year
 
     def _toot(self, bang, channel_conf):
         """Post a toot to Mastodon"""
@@ -395,6 +701,9 @@ class Logger(object):
     def _get_mastodon_client(self, name):
         """Get a mastodon client."""
         if name not in self._cached_mastodon:
+            # Imported here so that channels without Mastodon never load it
+            import mastodon
+
             conf = self.config["mastodon"][name]
             self._cached_mastodon[name] = mastodon.Mastodon(
                 access_token=conf["access_token"],
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""JSON encoding for Elasticsearch, Phabricator and worker messages
+
+orjson or msgspec is used when installed, otherwise the stdlib json module.
+All of them produce compact UTF-8 JSON bytes.
+"""
+
+import datetime
+import functools
+import json
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Bulk action keys that go in the action line rather than the document.
+# Some of them lose their leading underscore, as in elasticsearch.helpers.
+META = {
+    "_id": "_id",
+    "_index": "_index",
+    "_type": "_type",
+    "_if_seq_no": "if_seq_no",
+    "_if_primary_term": "if_primary_term",
+    "_parent": "parent",
+    "_pipeline": "pipeline",
+    "_retry_on_conflict": "retry_on_conflict",
+    "_routing": "routing",
+    "_version": "version",
+    "_version_type": "version_type",
+    "_require_alias": "require_alias",
+}
+
+
+def _default(obj):
+    if isinstance(obj, str):
+        # str subclasses such as irc.client.NickMask
+        return str(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(
+        "Unable to serialize %r (type: %s)" % (obj, type(obj).__name__)
+    )
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        return _encoder.encode(obj)
+
+    def loads(data):
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+else:
+    BACKEND = "json"
+    _encoder = json.JSONEncoder(
+        default=_default, ensure_ascii=False, separators=(",", ":")
+    )
+
+    def dumps(obj):
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+dumps.__doc__ = """Encode an object as compact JSON.
+
+    >>> dumps({"nick": "bd808", "message": "héllo"})
+    b'{"nick":"bd808","message":"h\\xc3\\xa9llo"}'
+
+    :return: UTF-8 bytes
+    """
+
+
+@functools.lru_cache(maxsize=64)
+def _action_line(op, index):
+    return dumps({op: {"_index": index}}) + b"\n"
+
+
+def expand_action(action):
+    """Split a bulk action into its action line and document.
+
+    Actions use the same dicts as elasticsearch.helpers.bulk.
+
+    >>> expand_action({"_index": "sal", "_id": "1", "_source": {"a": 1}})
+    ('index', {'_index': 'sal', '_id': '1'}, {'a': 1})
+    >>> expand_action({"_op_type": "delete", "_index": "sal", "_id": "1"})
+    ('delete', {'_index': 'sal', '_id': '1'}, None)
+
+    :return: tuple of (operation, metadata dict, document or None)
+    """
+    op = action.get("_op_type", "index")
+    meta = {}
+    body = {}
+    for key, value in action.items():
+        if key == "_op_type":
+            continue
+        if key in META:
+            meta[META[key]] = value
+        else:
+            body[key] = value
+    if op == "delete":
+        return op, meta, None
+    return op, meta, body.get("_source", body)
+
+
+def bulk_lines(op, meta, doc):
+    """Encode one bulk action as NDJSON.
+
+    Action lines that only name an index are encoded once and reused, so
+    a stream of documents for the same index only pays for the documents.
+
+    >>> bulk_lines("index", {"_index": "irc"}, {"a": 1})
+    b'{"index":{"_index":"irc"}}\\n{"a":1}\\n'
+
+    :return: bytes ending with a newline
+    """
+    if len(meta) == 1 and "_index" in meta:
+        head = _action_line(op, meta["_index"])
+    else:
+        head = dumps({op: meta}) + b"\n"
+    if doc is None:
+        return head
+    return head + dumps(doc) + b"\n"
+
+
+def bulk_chunks(actions, chunk_size=500, max_chunk_bytes=100 * 1024 * 1024):
+    """Encode bulk actions as NDJSON request bodies.
+
+    >>> [body for body, docs in bulk_chunks(
+    ...     [{"_index": "a", "_source": {"n": n}} for n in range(3)],
+    ...     chunk_size=2,
+    ... )]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [b'{"index":{"_index":"a"}}\\n{"n":0}\\n{"index":{"_index":"a"}}\\n{"n":1}\\n',
+    b'{"index":{"_index":"a"}}\\n{"n":2}\\n']
+
+    :param actions: iterable of elasticsearch.helpers.bulk style actions
+    :param chunk_size: most actions per body
+    :param max_chunk_bytes: most bytes per body, unless a single action is
+        larger than that
+    :return: generator of (body bytes, list of documents) tuples
+    """
+    lines = []
+    docs = []
+    size = 0
+    for action in actions:
+        op, meta, doc = expand_action(action)
+        data = bulk_lines(op, meta, doc)
+        if lines and (
+            len(lines) == chunk_size or size + len(data) > max_chunk_bytes
+        ):
+            yield b"".join(lines), docs
+            lines, docs, size = [], [], 0
+        lines.append(data)
+        docs.append(doc)
+        size += len(data)
+    if lines:
+        yield b"".join(lines), docs
+
+
+def elasticsearch_serializer():
+    """Make an elasticsearch.serializer.Serializer that uses this module.
+
+    Bodies that are already str or bytes are sent as they are.
+    """
+    import elasticsearch.exceptions
+    import elasticsearch.serializer
+
+    class Serializer(elasticsearch.serializer.JSONSerializer):
+        def dumps(self, data):
+            if isinstance(data, (str, bytes)):
+                return data
+            try:
+                return dumps(data)
+            except (ValueError, TypeError) as e:
+                raise elasticsearch.exceptions.SerializationError(data, e)
+
+        def loads(self, s):
+            try:
+                return loads(s)
+            except (ValueError, TypeError) as e:
+                raise elasticsearch.exceptions.SerializationError(s, e)
+
+    return Serializer()
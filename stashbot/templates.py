@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Manage Elasticsearch index templates"""
+
+import difflib
+import glob
+import json
+import os.path
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "extra")
+SUFFIX = "-template.json"
+
+# Composable index templates were added in Elasticsearch 7.8
+MIN_VERSION = (7, 8)
+
+
+def load(directory=TEMPLATE_DIR):
+    """Load index templates from a directory.
+
+    :return: dict of template name to template body
+    """
+    templates = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*" + SUFFIX))):
+        name = os.path.basename(path)[: -len(SUFFIX)]
+        with open(path, "r") as f:
+            templates[name] = json.load(f)
+    return templates
+
+
+def _stringify(value):
+    """Convert setting values to the strings that Elasticsearch returns."""
+    if isinstance(value, dict):
+        return {k: _stringify(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_stringify(v) for v in value]
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def normalize(body):
+    """Normalize a template body for comparison.
+
+    Elasticsearch returns all index settings as strings, so ours are
+    converted the same way before diffing.
+    """
+    body = json.loads(json.dumps(body))
+    settings = body.get("template", {}).get("settings")
+    if settings is not None:
+        body["template"]["settings"] = _stringify(settings)
+    return body
+
+
+def prune(installed, body):
+    """Drop what Elasticsearch added to an installed template.
+
+    The installed template has defaults such as 'composed_of' that our
+    files leave out. Only the keys that are in body are kept, so that those
+    defaults are not reported as changes.
+
+    >>> prune({"composed_of": [], "priority": 99}, {"priority": 100})
+    {'priority': 99}
+    """
+    if isinstance(installed, dict) and isinstance(body, dict):
+        return {
+            k: prune(v, body[k]) for k, v in installed.items() if k in body
+        }
+    if (
+        isinstance(installed, list)
+        and isinstance(body, list)
+        and len(installed) == len(body)
+    ):
+        return [prune(i, b) for i, b in zip(installed, body)]
+    return installed
+
+
+def _dump(body):
+    return json.dumps(normalize(body), indent=2, sort_keys=True).split("\n")
+
+
+def get(es, name):
+    """Get the installed version of a template, or None."""
+    import elasticsearch
+
+    try:
+        resp = es.es.indices.get_index_template(name=name)
+    except elasticsearch.NotFoundError:
+        return None
+    for tpl in resp.get("index_templates", []):
+        if tpl["name"] == name:
+            return tpl["index_template"]
+    return None
+
+
+def diff(es, name, body):
+    """Diff a template against the installed version.
+
+    :return: list of unified diff lines; empty if there are no changes
+    """
+    current = get(es, name)
+    if current is not None:
+        current = prune(normalize(current), normalize(body))
+    return list(
+        difflib.unified_diff(
+            _dump(current) if current is not None else [],
+            _dump(body),
+            fromfile="installed/%s" % name,
+            tofile="extra/%s%s" % (name, SUFFIX),
+            lineterm="",
+        )
+    )
+
+
+def install(es, templates, dry_run=False, out=None):
+    """Install templates that differ from the installed versions.
+
+    :param es: stashbot.es.Client
+    :param templates: dict of template name to template body
+    :param dry_run: only show the changes
+    :param out: file-like object to write diffs to
+    :return: list of changed template names
+    :raises RuntimeError: if the server is older than MIN_VERSION
+    """
+    version = es.server_version()
+    if version < MIN_VERSION:
+        raise RuntimeError(
+            "Index templates need Elasticsearch %s or later; the server is %s"
+            % (
+                ".".join(map(str, MIN_VERSION)),
+                ".".join(map(str, version)),
+            )
+        )
+    changed = []
+    for name, body in templates.items():
+        lines = diff(es, name, body)
+        if not lines:
+            continue
+        changed.append(name)
+        if out is not None:
+            out.write("\n".join(lines) + "\n")
+        if not dry_run:
+            es.es.indices.put_index_template(name=name, body=body)
+            es.logger.info("Installed index template %s", name)
+    return changed
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import gzip
+import logging
+import os
+
+from . import archive
+
+
+def make_doc(ts, message):
+    return {
+        "@timestamp": ts,
+        "channel": "#test",
+        "message": message,
+        "nick": "nick",
+    }
+
+
+def test_round_trip(tmp_path):
+    writer = archive.Writer(
+        str(tmp_path), logging.getLogger(__name__), block_size=2
+    )
+    writer.append(make_doc("2026-01-01T23:59:58Z", "a"))
+    writer.append(make_doc("2026-01-01T23:59:59Z", "b"))
+    writer.append(make_doc("2026-01-02T00:00:01Z", "c"))
+    writer.append(make_doc("2026-01-02T00:00:02Z", "d"))
+    writer.append(make_doc("2026-01-02T00:00:03Z", "e"))
+    assert len(writer) == 1
+    writer.flush()
+    assert len(writer) == 0
+
+    reader = archive.Reader(str(tmp_path))
+    assert reader.days() == ["2026-01-01", "2026-01-02"]
+    assert [d["message"] for d in reader.read()] == list("abcde")
+    start = archive.parse_time("2026-01-01T23:59:59Z")
+    end = archive.parse_time("2026-01-02T00:00:03Z")
+    assert [d["message"] for d in reader.read(start, end)] == list("bcd")
+    assert [d["message"] for d in reader.read(end)] == ["e"]
+
+    # Segments are ordinary multi-member gzip files
+    with gzip.open(str(tmp_path / "2026-01-02.jsonl.gz"), "rt") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_skips_blocks(tmp_path):
+    writer = archive.Writer(
+        str(tmp_path), logging.getLogger(__name__), block_size=1
+    )
+    for sec in range(5):
+        writer.append(make_doc("2026-01-01T00:00:0%dZ" % sec, str(sec)))
+    # Corrupt the first block; it must not be read for a later range
+    path = str(tmp_path / "2026-01-01.jsonl.gz")
+    with open(path, "r+b") as f:
+        f.write(b"\x00" * 10)
+    start = archive.parse_time("2026-01-01T00:00:03Z")
+    reader = archive.Reader(str(tmp_path))
+    assert [d["message"] for d in reader.read(start)] == ["3", "4"]
+
+
+def test_partial_block_ignored(tmp_path):
+    writer = archive.Writer(str(tmp_path), logging.getLogger(__name__))
+    writer.append(make_doc("2026-01-01T00:00:00Z", "a"))
+    writer.flush()
+    # A block written without its index line, e.g. during a crash
+    with open(str(tmp_path / "2026-01-01.jsonl.gz"), "ab") as f:
+        f.write(gzip.compress(b"junk")[:5])
+    writer.append(make_doc("2026-01-01T00:00:01Z", "b"))
+    writer.flush()
+    reader = archive.Reader(str(tmp_path))
+    assert [d["message"] for d in reader.read()] == ["a", "b"]
+    assert os.path.exists(str(tmp_path / "2026-01-01.idx"))
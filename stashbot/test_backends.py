@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2015 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import irc.client
+
+from . import backends
+
+
+def test_network_reactors():
+    shared = backends.SharedReactor()
+    one = shared.network()
+    two = shared.network()
+    conn_one = one.server()
+    conn_two = two.server()
+    assert shared.connections == [conn_one, conn_two]
+    assert one.scheduler is two.scheduler is shared.scheduler
+    assert conn_two.reactor is two
+
+    seen = []
+    one.add_global_handler("pubmsg", lambda c, e: seen.append(("one", c)))
+    two.add_global_handler("pubmsg", lambda c, e: seen.append(("two", c)))
+    event = irc.client.Event("pubmsg", "nick!user@host", "#chan", ["hi"])
+    two._handle_event(conn_two, event)
+    assert seen == [("two", conn_two)]
+
+
+def test_network_configs_single():
+    config = {"irc": {"server": "irc.libera.chat"}, "sal": {}}
+    confs = backends.network_configs(config)
+    assert confs == [dict(config, name="irc.libera.chat")]
+
+
+def test_network_configs_override():
+    config = {
+        "irc": {"server": "irc.libera.chat", "nick": "stashbot"},
+        "ha": {"lease": "file", "path": "/tmp/lease"},
+        "networks": [
+            {"name": "libera"},
+            {
+                "name": "oftc",
+                "irc": {"server": "irc.oftc.net", "channels": ["#x"]},
+                "ha": {"path": "/tmp/lease-oftc"},
+            },
+        ],
+    }
+    libera, oftc = backends.network_configs(config)
+    assert "networks" not in libera
+    assert libera["irc"] == config["irc"]
+    assert oftc["irc"] == {
+        "server": "irc.oftc.net",
+        "nick": "stashbot",
+        "channels": ["#x"],
+    }
+    assert oftc["ha"] == {"lease": "file", "path": "/tmp/lease-oftc"}
+    assert config["irc"]["server"] == "irc.libera.chat"
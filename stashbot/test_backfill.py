@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import datetime
+
+import pytest
+
+from . import backfill
+from . import sal
+
+PAGE = """Intro text
+== 2026-01-02 ==
+* {{SAL entry|1=10:11 b: second <nowiki>{</nowiki>x<nowiki>}</nowiki>}}
+* 09:00 a: plain
+* not an entry
+
+== 2026-01-01 ==
+* {{safesubst:SAL entry|1=23:59 wmbot~x@y: {{done}}}}
+
+''Older entries: [[Foo/SAL/Archive 2025|Archive 2025]]''
+<noinclude>[[Category:SAL]]</noinclude>"""
+
+
+def test_parse_wiki_page():
+    entries = list(backfill.parse_wiki_page(PAGE.split("\n")))
+    assert entries == [
+        {
+            "@timestamp": "2026-01-02T10:11:00Z",
+            "nick": "b",
+            "message": "second {x}",
+        },
+        {
+            "@timestamp": "2026-01-02T09:00:00Z",
+            "nick": "a",
+            "message": "plain",
+        },
+        {
+            "@timestamp": "2026-01-01T23:59:00Z",
+            "nick": "wmbot~x@y",
+            "message": "{{done}}",
+        },
+    ]
+
+
+def test_find_archives():
+    assert backfill.find_archives(PAGE) == ["Foo/SAL/Archive 2025"]
+
+
+@pytest.mark.parametrize(
+    "message",
+    ["plain", "a|b", "k8s-{etcd,master}", "{{done}} T123 | {x"],
+)
+def test_round_trip(message):
+    line = sal.Logger.wiki_entry(datetime.datetime(2026, 1, 2), "n", message)
+    entries = list(backfill.parse_wiki_page(["== 2026-01-02 ==", line]))
+    assert entries[0]["message"] == message
+
+
+def test_missing_entries():
+    entries = [
+        {"@timestamp": "2026-01-02T10:11:00Z", "nick": "a", "message": "x"},
+        {"@timestamp": "2026-01-02T10:12:00Z", "nick": "a", "message": "x"},
+        {"@timestamp": "2026-01-02T10:20:00Z", "nick": "b", "message": "y"},
+        {"@timestamp": "2026-01-02T10:30:00Z", "nick": "c", "message": "z"},
+    ]
+    existing = [
+        # Logged to ES a few seconds before the wiki, across a minute
+        {"@timestamp": "2026-01-02T10:10:59Z", "nick": "a", "message": "x"},
+        {"@timestamp": "2026-01-02T10:20:01Z", "nick": "b", "message": "y"},
+    ]
+    missing = list(backfill.missing_entries(entries, existing))
+    assert [e["@timestamp"] for e in missing] == [
+        "2026-01-02T10:12:00Z",
+        "2026-01-02T10:30:00Z",
+    ]
+
+
+def test_parse_wiki_page_headings():
+    lines = [
+        "==2026-01-02==",
+        "* 01:00 a: spaced heading",
+        "=== Deploys ===",
+        "* 02:00 a: under a subsection",
+        "== Notes about 2026-01-01 ==",
+        "* 03:00 a: not a day",
+        "== 2026-01-01 ==",
+        "* 04:00 a: day again",
+    ]
+    entries = list(backfill.parse_wiki_page(lines))
+    assert [e["message"] for e in entries] == [
+        "spaced heading",
+        "under a subsection",
+        "day again",
+    ]
+
+
+class FakePage(object):
+    def __init__(self, revisions):
+        self.revs = revisions
+        self.exists = True
+        self.revision = max(revisions)
+
+    def revisions(self, start=None, end=None, prop=None):
+        self.args = (start, end)
+        return [{"revid": r} for r in sorted(self.revs, reverse=True)]
+
+
+class FakeSite(object):
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = []
+
+    def get_page(self, title):
+        return FakePage(self.pages[title])
+
+    def get_revision_text(self, revid):
+        self.fetched.append(revid)
+        for revs in self.pages.values():
+            if revid in revs:
+                return revs[revid]
+        raise KeyError(revid)
+
+
+class FakeES(object):
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+        self.actions = []
+
+    def search_after(self, index, query, sort):
+        self.queries.append(query)
+        for doc in self.docs:
+            yield {"_source": doc}
+
+    def bulk(self, actions):
+        self.actions.extend(actions)
+        return len(self.actions), []
+
+
+SITE = {
+    "Foo/SAL": {
+        # The current revision lost an entry that the older one had
+        2: "== 2026-01-02 ==\n* 10:00 a: kept\n"
+        "''Older entries: [[Foo/SAL/Archive 2025|Archive 2025]]''",
+        1: "== 2026-01-02 ==\n* 10:00 a: kept\n* 09:00 b: removed\n",
+    },
+    "Foo/SAL/Archive 2025": {
+        3: "== 2025-12-31 ==\n* 23:00 c: archived\n* 23:00 c: archived\n",
+    },
+}
+
+
+def test_find_missing_current_revision():
+    site = FakeSite(SITE)
+    es = FakeES(
+        [
+            {
+                "@timestamp": "2026-01-02T10:00:03Z",
+                "nick": "a",
+                "message": "kept",
+            }
+        ]
+    )
+    missing = list(backfill.find_missing(es, site, ["Foo/SAL"], "foo"))
+    assert site.fetched == [2, 3]
+    assert [(e["nick"], e["message"]) for e in missing] == [
+        ("c", "archived"),
+        ("c", "archived"),
+    ]
+    # One query per day
+    assert len(es.queries) == 2
+
+
+def test_backfill_reads_revisions():
+    site = FakeSite(SITE)
+    es = FakeES([])
+    ok, errors = backfill.backfill(
+        es,
+        site,
+        ["Foo/SAL"],
+        "#foo",
+        "foo",
+        start="2026-01-01T00:00:00Z",
+        end="2026-02-01T00:00:00Z",
+    )
+    assert sorted(site.fetched) == [1, 2, 3]
+    assert ok == 4
+    assert sorted(a["_source"]["message"] for a in es.actions) == [
+        "archived",
+        "archived",
+        "kept",
+        "removed",
+    ]
+    assert es.actions[0]["_source"]["channel"] == "#foo"
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+import threading
+import time
+
+import elasticsearch
+
+from . import bash
+from . import serializer
+
+
+class FakeES(object):
+    def __init__(self, docs):
+        self.docs = docs
+        self.actions = []
+        self.down = False
+
+    def scan(self, index, **kwargs):
+        for quip_id, doc in self.docs.items():
+            yield {"_id": quip_id, "_source": doc}
+
+    def bulk(self, actions):
+        if self.down:
+            raise elasticsearch.ConnectionError("N/A", "down", None)
+        self.actions.extend(actions)
+        return len(actions), []
+
+
+def make_quips():
+    es = FakeES(
+        {
+            "a": {"message": "hello", "up_votes": 1, "down_votes": 0},
+            "b": {"message": "world", "up_votes": 5, "down_votes": 1},
+        }
+    )
+    quips = bash.Quips(es, logging.getLogger(__name__), secret="s3cret")
+    quips.refresh()
+    return es, quips
+
+
+def test_refresh():
+    es, quips = make_quips()
+    assert len(quips) == 2
+    assert "a" in quips
+    assert quips.top() == ("b", quips.get("b"))
+    assert quips.random()[0] in ("a", "b")
+
+
+def test_votes_are_batched():
+    es, quips = make_quips()
+    for n in range(5):
+        quips.vote("a", "host%d" % n)
+    quips.vote("a", "host5", up=False)
+    assert quips.get("a")["score"] == 5
+    assert quips.top()[0] == "a"
+    assert quips.vote("missing", "host0") is None
+    assert es.actions == []
+
+    # Unflushed votes survive a refresh
+    quips.refresh()
+    assert quips.get("a")["score"] == 5
+
+    quips.flush()
+    assert len(es.actions) == 1
+    assert es.actions[0]["_id"] == "a"
+    assert es.actions[0]["script"]["params"] == {
+        "up": 5,
+        "down": 1,
+        "voters": [quips.voter_key("host%d" % n) for n in range(6)],
+    }
+    quips.flush()
+    assert len(es.actions) == 1
+
+
+def test_voter_hosts_are_not_stored():
+    es, quips = make_quips()
+    quips.vote("a", "wikimedia/BD808")
+    quips.vote("a", "192.0.2.1", up=False)
+    quips.flush()
+    body = serializer.dumps(es.actions).lower()
+    assert b"bd808" not in body
+    assert b"192.0.2.1" not in body
+    assert quips.voter_key("wikimedia/BD808") == quips.voter_key(
+        "wikimedia/bd808"
+    )
+    other = bash.Quips(es, logging.getLogger(__name__), secret="other")
+    assert other.voter_key("192.0.2.1") != quips.voter_key("192.0.2.1")
+
+
+def test_votes_retry_after_connection_error():
+    es, quips = make_quips()
+    quips.vote("a", "host0")
+    es.down = True
+    quips.flush()
+    assert es.actions == []
+    es.down = False
+    quips.flush()
+    assert es.actions[0]["script"]["params"]["up"] == 1
+
+
+def test_one_vote_per_voter():
+    es, quips = make_quips()
+    assert quips.vote("a", "wikimedia/bd808")["score"] == 2
+    assert quips.vote("a", "wikimedia/bd808") is False
+    assert quips.vote("a", "wikimedia/bd808", up=False) is False
+    assert quips.get("a")["score"] == 2
+
+    # Voters are remembered in the index
+    es.docs["b"]["voters"] = [quips.voter_key("wikimedia/bd808")]
+    quips.refresh()
+    assert quips.vote("b", "wikimedia/bd808") is False
+
+
+def test_refresh_async_keeps_new_quips():
+    es, quips = make_quips()
+    scanning = threading.Event()
+    release = threading.Event()
+    scan = es.scan
+
+    def slow_scan(index, **kwargs):
+        scanning.set()
+        release.wait(5)
+        return scan(index, **kwargs)
+
+    es.scan = slow_scan
+    quips.refresh_async()
+    assert scanning.wait(5)
+    # The reactor is not blocked while the index is scanned
+    quips.add("c", {"message": "new"})
+    release.set()
+    for _ in range(100):
+        if not quips._loading:
+            break
+        time.sleep(0.01)
+    assert sorted(quips.quips) == ["a", "b", "c"]
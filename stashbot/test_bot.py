@@ -15,9 +15,48 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
+import copy
+import logging
+import subprocess
+import sys
+
+import irc.client
 import pytest
 
+from . import backends
 from . import bot
+from .test_config import CONFIG
+
+
+class FakeConnection(object):
+    def __init__(self, nick="stashbot"):
+        self.nick = nick
+        self.sent = []
+
+    def get_nickname(self):
+        return self.nick
+
+    def get_server_name(self):
+        return "irc.invalid"
+
+    def privmsg(self, target, text):
+        self.sent.append((target, text))
+
+
+def make_bot(**sections):
+    config = copy.deepcopy(CONFIG)
+    config.update(sections)
+    shared = backends.Backends(config, logging.getLogger())
+    return bot.Stashbot(shared.config, logging.getLogger(), shared)
+
+
+def make_event(text, source="nick!user@wikimedia/nick", target="#a"):
+    return irc.client.Event(
+        "pubmsg" if target.startswith("#") else "privmsg",
+        irc.client.NickMask(source),
+        target,
+        [text],
+    )
 
 
 @pytest.mark.parametrize(
@@ -36,3 +75,120 @@ from . import bot
 def test_RE_PHAB_NOURL(text, expect):
     match = bot.RE_PHAB_NOURL.search(text) is not None
     assert expect == match, "{} != {}".format(expect, match)
+
+
+def test_lazy_backend_imports():
+    # Backend libraries are only imported when a client is first used, and
+    # maintenance commands only when they are run
+    code = (
+        "import sys, stashbot.cli; "
+        "print(' '.join(m for m in %r if m in sys.modules))"
+        % (
+            (
+                "elasticsearch",
+                "ldap3",
+                "mastodon",
+                "mwclient",
+                "requests",
+                "stashbot.archive",
+                "stashbot.backfill",
+                "stashbot.export",
+                "stashbot.ircimport",
+                "stashbot.mediawiki",
+                "stashbot.templates",
+                "stashbot.worker",
+            ),
+        )
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert out.split() == []
+
+
+def test_bash_votes_need_acl():
+    stashbot = make_bot(
+        bash={
+            "view_url": "https://bash.invalid/%s",
+            "vote_acl": {"allow": ["*!*@wikimedia/*"]},
+            "vote_secret": "s3cret",
+        }
+    )
+    stashbot.quips.add("q1", {"message": "hi"})
+    conn = FakeConnection()
+
+    def vote(text, **kwargs):
+        event = make_event(text, **kwargs)
+        stashbot.do_bash(conn, event, {"message": text})
+        return conn.sent.pop()[1]
+
+    assert vote("!bash up q1") == "nick: Quip q1 now has a score of 1"
+    assert vote("!bash up q1") == "nick: You have already voted for quip q1"
+    # Changing nick does not give another vote
+    assert "already voted" in vote(
+        "!bash down q1", source="other!user@wikimedia/nick"
+    )
+    assert "can not vote" in vote("!bash up q1", source="anon!user@192.0.2.1")
+    assert "can not vote" in vote(
+        "!bash up q1", source="other!user@wikimedia/other", target="stashbot"
+    )
+    assert stashbot.quips.get("q1")["score"] == 1
+
+
+def test_bash_votes_off_by_default():
+    stashbot = make_bot()
+    stashbot.quips.add("q1", {"message": "hi"})
+    conn = FakeConnection()
+    event = make_event("!bash up q1")
+    stashbot.do_bash(conn, event, {"message": "!bash up q1"})
+    assert conn.sent == [("#a", "nick: You can not vote for quips here.")]
+    assert stashbot.quips.get("q1")["score"] == 0
+
+
+def test_throttle_is_shared_by_channels():
+    stashbot = make_bot(
+        throttle={"rate": 0.001, "burst": 2, "channels": {"#b": {"burst": 2}}}
+    )
+    conn = FakeConnection()
+    allowed = [
+        stashbot.check_throttle(conn, make_event("!log x", target=target))
+        for target in ("#a", "#b", "#a", "#b")
+    ]
+    assert allowed == [True, True, False, False]
+    assert conn.sent == [
+        ("#a", "nick: Slow down! Ignoring commands from you for a bit.")
+    ]
+
+
+def test_replay_after_failover(tmp_path):
+    stashbot = make_bot(ha={"lease": "file", "path": str(tmp_path / "l")})
+    stashbot.leader = False
+    conn = FakeConnection()
+    for text, target in [
+        ("!log rebooted db1", "#a"),
+        ("!log restarted", "#a"),
+        ("!log not a sal channel", "#other"),
+        ("hello", "#a"),
+    ]:
+        stashbot.on_pubmsg(conn, make_event(text, target=target))
+    assert len(stashbot.standby_buffer) == 2
+
+    stored = stashbot.standby_buffer[0][2]
+    stashbot.es.search_after = lambda *args: [
+        {"_source": dict(stored, message="rebooted db1", nick="Nick|away")},
+        # A short message that only ends the same way is not a match
+        {"_source": dict(stored, message="db1 restarted")},
+    ]
+    logged = []
+    stashbot.sal.log = lambda conn, event, doc, **kwargs: logged.append(
+        (doc["message"], kwargs["respond_to_channel"], kwargs["do_phab"])
+    )
+    stashbot.leader = True
+    stashbot.do_replay()
+    stashbot.workload.run()
+    assert logged == [("!log restarted", False, True)]
+    assert not stashbot.standby_buffer
+    assert conn.sent == []
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2015 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import copy
+import logging
+
+import pytest
+import yaml
+
+from . import backends
+from . import bot
+from . import config
+
+CONFIG = {
+    "irc": {
+        "server": "irc.invalid",
+        "port": 6697,
+        "nick": "stashbot",
+        "realname": "Stashbot",
+        "password": "secret",
+        "channels": ["#a"],
+    },
+    "elasticsearch": {
+        "servers": ["http://localhost:9200"],
+        "options": {},
+        "index": "irc-%Y.%m",
+    },
+    "ldap": {"uri": "ldap://ldap.invalid", "base": "dc=invalid"},
+    "phab": {
+        "url": "https://phab.invalid",
+        "user": "stashbot",
+        "key": "key",
+        "delay": {"__default__": 300, "#a": 10},
+    },
+    "bash": {"view_url": "https://bash.invalid/%s"},
+    "sal": {
+        "view_url": "https://sal.invalid/%s",
+        "channels": {
+            "#a": {
+                "project": "a",
+                "acl": {"allow": ["group:admins"], "default": "deny"},
+            },
+            "#b": {"use_config": "#a"},
+        },
+    },
+    "throttle": {
+        "rate": 0.5,
+        "burst": 3,
+        "channels": {"#a": {"burst": 10}},
+        "exempt": ["relay!*@*"],
+    },
+}
+
+
+def test_snapshot():
+    snap = config.snapshot(CONFIG)
+    assert snap.router.route("#b").conf["project"] == "a"
+    assert snap.get_phab_delay("#a") == 10
+    assert snap.get_phab_delay("#other") == 300
+    assert snap.throttle.default == (0.5, 3)
+    assert snap.throttle.channels["#a"] == (0.1, 10)
+    assert snap.throttle.exempt == ("relay!*@*",)
+    assert snap.acl_groups == {"admins"}
+    with pytest.raises(AttributeError):
+        snap.raw = {}
+    with pytest.raises(TypeError):
+        snap.phab_delay["#a"] = 0
+
+
+@pytest.mark.parametrize(
+    "path,value,message",
+    [
+        [("irc",), None, "Missing 'irc' section"],
+        [("phab", "delay"), {}, "phab.delay.__default__"],
+        [("sal", "channels", "#b", "use_config"), "#c", "unknown channel"],
+        [("networks",), [{"name": "x"}, {"name": "x"}], "unique 'name'"],
+        [("throttle", "rate"), 0, "'throttle.rate' must be more"],
+        [
+            ("throttle", "channels", "#a", "rate"),
+            -1,
+            "'throttle.channels.#a.rate' must be more",
+        ],
+        [("throttle", "burst"), 0, "'throttle.burst' must be at least"],
+        [("bash", "vote_acl"), {"allow": ["*!*@*"]}, "bash.vote_secret"],
+    ],
+)
+def test_validate(path, value, message):
+    conf = copy.deepcopy(CONFIG)
+    target = conf
+    for key in path[:-1]:
+        target = target[key]
+    if value is None:
+        del target[path[-1]]
+    else:
+        target[path[-1]] = value
+    with pytest.raises(ValueError, match=message):
+        config.snapshot(conf)
+
+
+def test_restart_required():
+    old = config.snapshot(CONFIG)
+    conf = copy.deepcopy(CONFIG)
+    conf["irc"]["nick"] = "newbot"
+    conf["irc"]["channels"].append("#c")
+    assert config.snapshot(conf).restart_required(old) == ["irc.nick"]
+
+
+def test_reload(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(CONFIG))
+    shared = backends.Backends(
+        copy.deepcopy(CONFIG), logging.getLogger(), path=str(path)
+    )
+    stashbot = bot.Stashbot(shared.config, logging.getLogger(), shared)
+    old = shared.snapshot
+
+    conf = copy.deepcopy(CONFIG)
+    conf["sal"]["channels"]["#c"] = {"project": "c"}
+    conf["irc"]["channels"].append("#c")
+    conf["throttle"]["rate"] = 1
+    path.write_text(yaml.safe_dump(conf))
+    shared.request_reload()
+    shared.check_reload()
+    assert shared.snapshot is not old
+    assert shared.sal.router.route("#c").conf["project"] == "c"
+    assert shared.snapshot.throttle.default == (1.0, 3)
+    assert stashbot.config["irc"]["channels"] == ["#a", "#c"]
+    assert stashbot._channels == ["#a", "#c"]
+    assert stashbot.index_policy is shared.index_policy
+
+    # A broken file leaves the running configuration alone
+    good = shared.snapshot
+    path.write_text("irc: [")
+    assert not shared.reload()
+    path.write_text(yaml.safe_dump(dict(conf, phab={})))
+    assert not shared.reload()
+    assert shared.snapshot is good
+
+
+def test_load_overrides(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(CONFIG))
+    http = config.parse_listen("0.0.0.0:8080")
+    conf = config.load(str(path), {"http": http})
+    assert conf["http"] == {"host": "0.0.0.0", "port": 8080}
+    assert conf["irc"] == CONFIG["irc"]
+    with pytest.raises(ValueError):
+        config.parse_listen("8080")
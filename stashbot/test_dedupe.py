@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+from . import dedupe
+from . import policy
+
+
+def test_window():
+    w = dedupe.Window()
+    key = dedupe.make_key("proj", "nick", "msg")
+    assert not w.check(key, 10, now=0)
+    assert w.check(key, 10, now=5)
+    # Repeats do not extend the window
+    assert w.check(key, 10, now=9)
+    assert not w.check(key, 10, now=10)
+    assert not w.check(dedupe.make_key("proj", "nick", "other"), 10, now=10)
+
+
+def test_window_is_bounded():
+    w = dedupe.Window(maxlen=3)
+    for i in range(10):
+        assert not w.check(i, 100, now=i)
+    assert len(w) == 3
+    assert w.check(9, 100, now=10)
+    assert not w.check(0, 100, now=10)
+
+
+def test_already_logged():
+    stored = [
+        {
+            "channel": "#test",
+            "nick": "bd808",
+            "project": "tools",
+            "message": "rebooted db1",
+            "@timestamp": "2026-01-02T03:04:05Z",
+        }
+    ]
+    doc = {
+        "channel": "#test",
+        "nick": "BD808|away",
+        "message": "!log tools rebooted  db1",
+        "@timestamp": "2026-01-02T03:04:07Z",
+    }
+    clean = policy.clean_nick
+    assert dedupe.already_logged(doc, stored, clean_nick=clean)
+    assert dedupe.already_logged(
+        dict(doc, message="!log rebooted db1"), stored, clean_nick=clean
+    )
+    assert not dedupe.already_logged(doc, stored)
+    assert not dedupe.already_logged(dict(doc, channel="#other"), stored)
+    assert not dedupe.already_logged(dict(doc, message="!log other"), stored)
+    assert not dedupe.already_logged(
+        dict(doc, **{"@timestamp": "2026-01-02T03:06:07Z"}), stored
+    )
+    # Only whole messages from the same nick match
+    assert not dedupe.already_logged(
+        dict(doc, nick="bd808", message="!log tools db1 restarted"),
+        [dict(stored[0], message="restarted")],
+    )
+    assert not dedupe.already_logged(
+        dict(doc, nick="someone"), stored, clean_nick=clean
+    )
+
+
+def test_already_logged_relayed():
+    stored = [
+        {
+            "channel": "#test",
+            "nick": "jdoe@cumin1001",
+            "project": "tools",
+            "message": "rebooted db1",
+            "@timestamp": "2026-01-02T03:04:05Z",
+        }
+    ]
+    doc = {
+        "channel": "#test",
+        "nick": "logmsgbot",
+        "message": "!log jdoe@cumin1001 tools rebooted db1",
+        "@timestamp": "2026-01-02T03:04:05Z",
+    }
+    assert dedupe.already_logged(doc, stored)
+    assert not dedupe.already_logged(
+        dict(doc, message="!log alice@cumin1001 tools rebooted db1"), stored
+    )
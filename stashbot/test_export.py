@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import io
+import logging
+
+from . import es
+from . import export
+
+DOCS = [
+    {
+        "@timestamp": "2026-01-02T10:11:12Z",
+        "project": "tools",
+        "nick": "b",
+        "message": "second {x}",
+    },
+    {
+        "@timestamp": "2026-01-02T09:00:00Z",
+        "project": "tools",
+        "nick": "a",
+        "message": "first",
+    },
+    {
+        "@timestamp": "2026-01-01T23:59:00Z",
+        "project": "tools",
+        "nick": "a",
+        "message": "zeroth",
+    },
+]
+
+
+class FakeES(object):
+    def search_after(self, index, query, sort, size=1000):
+        self.args = (index, query, sort, size)
+        for doc in DOCS:
+            yield {"_source": doc}
+
+
+def test_sal_query():
+    assert export.sal_query("tools") == {
+        "bool": {"filter": [{"term": {"project": "tools"}}]}
+    }
+    q = export.sal_query("tools", start="2026-01-01")
+    assert q["bool"]["filter"][1] == {
+        "range": {"@timestamp": {"gte": "2026-01-01"}}
+    }
+
+
+def test_export_wikitext():
+    out = io.StringIO()
+    es = FakeES()
+    export.export(es, out, "tools", fmt="wikitext")
+    assert es.args[2] == [{"@timestamp": "desc"}]
+    assert out.getvalue() == (
+        "== 2026-01-02 ==\n"
+        "* {{SAL entry|1=10:11 b: second <nowiki>{</nowiki>x"
+        "<nowiki>}</nowiki>}}\n"
+        "* {{SAL entry|1=09:00 a: first}}\n"
+        "\n"
+        "== 2026-01-01 ==\n"
+        "* {{SAL entry|1=23:59 a: zeroth}}\n"
+    )
+
+
+def test_export_csv():
+    out = io.StringIO()
+    export.export(FakeES(), out, "tools", fmt="csv")
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "@timestamp,project,nick,message"
+    assert lines[1] == "2026-01-02T10:11:12Z,tools,b,second {x}"
+    assert len(lines) == 4
+
+
+class FakeServer(object):
+    def __init__(self, version):
+        self.version = version
+        self.searches = []
+        self.closed = []
+
+    def info(self):
+        return {"version": {"number": self.version}}
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit"}
+
+    def search(self, body):
+        self.searches.append(body)
+        hits = []
+        if "search_after" not in body:
+            hits = [{"_source": DOCS[0], "sort": [1, 7]}]
+        return {"hits": {"hits": hits}, "pit_id": "pit2"}
+
+    def close_point_in_time(self, body):
+        self.closed.append(body["id"])
+
+
+def make_client(version):
+    client = es.Client([], {}, logging.getLogger(__name__))
+    client._es = FakeServer(version)
+    return client
+
+
+def test_search_after_point_in_time():
+    client = make_client("7.17.3")
+    sort = [{"@timestamp": "asc"}]
+    hits = list(client.search_after("sal", {"match_all": {}}, sort))
+    assert hits == [{"_source": DOCS[0], "sort": [1, 7]}]
+    first, second = client.es.searches
+    assert first["sort"] == sort + [{"_shard_doc": "asc"}]
+    assert second["search_after"] == [1, 7]
+    assert client.es.closed == ["pit2"]
+
+
+def test_search_after_scroll_fallback():
+    client = make_client("7.10.2")
+    scans = []
+
+    def scan(index, query=None, **kwargs):
+        scans.append((index, query, kwargs))
+        return iter([{"_source": DOCS[1]}])
+
+    client.scan = scan
+    sort = [{"@timestamp": "asc"}]
+    hits = list(client.search_after("sal", {"match_all": {}}, sort, size=5))
+    assert hits == [{"_source": DOCS[1]}]
+    assert scans == [
+        (
+            "sal",
+            {"query": {"match_all": {}}, "sort": sort},
+            {"size": 5, "scroll": "2m", "preserve_order": True},
+        )
+    ]
+    assert client.es.searches == []
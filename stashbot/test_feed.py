@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from . import feed
+from . import webserver
+
+
+def test_ring_buffer():
+    f = feed.Feed(size=3)
+    for i in range(5):
+        f.publish({"project": "a", "id": str(i)})
+    f.publish({"project": "b", "id": "b"})
+    assert [d["id"] for d in f.latest("a")] == ["2", "3", "4"]
+    assert [d["id"] for d in f.latest("a", 1)] == ["4"]
+    assert f.latest("a", 0) == []
+    assert f.latest("missing") == []
+
+
+def test_publish_public_fields():
+    f = feed.Feed()
+    f.publish(
+        {
+            "id": "1",
+            "@timestamp": "2026-01-02T03:04:05Z",
+            "project": "a",
+            "nick": "nick",
+            "message": "hi",
+            "user": "nick!~user@192.0.2.1",
+            "host": "192.0.2.1",
+            "channel": "#a",
+        }
+    )
+    assert f.latest("a") == [
+        {
+            "id": "1",
+            "@timestamp": "2026-01-02T03:04:05Z",
+            "project": "a",
+            "nick": "nick",
+            "message": "hi",
+        }
+    ]
+
+
+def test_subscribe():
+    f = feed.Feed()
+    q = f.subscribe("a")
+    f.publish({"project": "b", "id": "1"})
+    f.publish({"project": "a", "id": "2"})
+    assert q.get_nowait()["id"] == "2"
+    assert q.empty()
+    f.unsubscribe("a", q)
+    assert f.subscribers == {}
+
+
+@pytest.fixture
+def server():
+    f = feed.Feed()
+    web = webserver.Server("127.0.0.1", 0, logging.getLogger(__name__))
+    web.route("/sal/", f.handle_latest)
+    web.start()
+    yield f, "http://127.0.0.1:%d" % web.port
+    web.stop()
+
+
+def test_http_latest(server):
+    f, url = server
+    f.publish({"project": "a", "id": "1"})
+    f.publish({"project": "a", "id": "2"})
+    with urllib.request.urlopen(url + "/sal/a?n=1") as resp:
+        assert json.load(resp) == [{"project": "a", "id": "2"}]
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(url + "/nope")
+
+
+def test_http_stream(server):
+    f, url = server
+    f.publish({"project": "a", "id": "1"})
+    with urllib.request.urlopen(url + "/sal/a/stream?n=1") as resp:
+        assert resp.headers["Content-Type"] == "text/event-stream"
+        assert resp.readline() == b"id: 1\n"
+        f.publish({"project": "a", "id": "2"})
+        lines = [resp.readline() for _ in range(5)]
+        assert lines[3] == b"id: 2\n"
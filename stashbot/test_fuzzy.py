@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import random
+
+from . import fuzzy
+
+
+def slow_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(
+                min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            )
+        prev = cur
+    return prev[-1]
+
+
+def random_word(rng, alphabet="ab.c", size=10):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, size)))
+
+
+def test_distance():
+    rng = random.Random(808)
+    for _ in range(2000):
+        a = random_word(rng)
+        b = random_word(rng)
+        assert fuzzy.distance(a, b) == slow_distance(a, b)
+        assert fuzzy._distance(fuzzy._pattern(a), b, 1) == min(
+            2, slow_distance(a, b)
+        )
+
+
+def test_search_matches_linear_scan():
+    rng = random.Random(808)
+    names = {random_word(rng, "abcd.", 12) for _ in range(500)}
+    names.update("tools.%s" % random_word(rng, "abcd", 8) for _ in range(500))
+    index = fuzzy.NameIndex(names)
+    assert len(index) == len(names)
+    for _ in range(100):
+        word = random_word(rng, "abcd.", 14)
+        distances = sorted((slow_distance(word, name), name) for name in names)
+        for max_distance in (1, 2):
+            want = [(d, name) for d, name in distances if d <= max_distance]
+            assert index.search(
+                word, k=len(names), max_distance=max_distance
+            ) == [name for d, name in want]
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2015 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+import irc.client
+
+from . import acls
+from . import groups
+from . import test_sal
+
+BASE = "dc=invalid"
+
+
+class FakeLDAP(object):
+    def __init__(self, groups, people):
+        self.groups = groups
+        self.people = people
+        self.searches = 0
+
+    def search(self, base, query, attributes):
+        self.searches += 1
+        if base == "ou=groups,%s" % BASE:
+            cn = query.split("(cn=")[1].rstrip(")")
+            if cn not in self.groups:
+                return []
+            return [
+                {
+                    "attributes": {
+                        "member": [
+                            "uid=%s,ou=people,%s" % (uid, BASE)
+                            for uid in self.groups[cn]
+                        ]
+                    }
+                }
+            ]
+        return [
+            {"attributes": {"cn": [self.people[uid]]}}
+            for uid in self.people
+            if "(uid=%s)" % uid in query
+        ]
+
+
+def make_membership(names=("admins",)):
+    members = groups.Membership(
+        {"uri": "ldap://ldap.invalid", "base": BASE},
+        logging.getLogger(),
+        names=names,
+    )
+    members.ldap = FakeLDAP(
+        {"admins": ["bd808", "jdoe"]},
+        {"bd808": "BryanDavis", "jdoe": "Jane Doe"},
+    )
+    return members
+
+
+def test_referenced():
+    config = {
+        "profiling": {"acl": {"allow": ["group:roots"]}},
+        "sal": {
+            "channels": {
+                "#a": {"acl": {"allow": ["group:admins", "*!*@host"]}},
+                "#b": {"acl": {"deny": ["group:banned"]}},
+                "#c": {},
+            }
+        },
+    }
+    assert groups.referenced(config) == {"roots", "admins", "banned"}
+
+
+def test_reload():
+    members = make_membership(names=("admins", "missing"))
+    members.reload()
+    assert members.get("admins") == {
+        "bd808",
+        "jdoe",
+        "bryandavis",
+        "jane-doe",
+    }
+    assert "missing" not in members
+    assert members.get("missing") == groups.EMPTY
+    assert members.loaded is not None
+
+
+def test_reload_failure_keeps_members():
+    members = make_membership()
+    members.reload()
+    members.ldap = None
+    members.reload()
+    assert "bd808" in members.get("admins")
+
+
+def test_acl_group():
+    members = make_membership()
+    members.reload()
+    searches = members.ldap.searches
+    config = {"default": "deny", "allow": ["*!*@test/allowed", "group:admins"]}
+    for source, expect in [
+        ["bd808!~bd808@wikimedia/bd808", True],
+        ["jane!~jane@wikimedia/Jane-Doe", True],
+        ["Bryan!~b@wikimedia/BryanDavis", True],
+        # Anyone can register a Libera account with an LDAP member's name
+        ["bd808!~bd808@user/bd808", False],
+        ["jane!~jane@user/Jane-Doe", False],
+        ["nick!user@test/allowed", True],
+        ["evil!bd808@bd808.example.net", False],
+        ["other!~other@wikimedia/other", False],
+    ]:
+        source = irc.client.NickMask(source)
+        assert expect == acls.check(config, source, members), source
+    # Checks only use the cached membership
+    assert members.ldap.searches == searches
+    source = irc.client.NickMask("bd808!~bd808@wikimedia/bd808")
+    assert not acls.check(config, source)
+
+
+def test_acl_group_cloaks():
+    members = make_membership()
+    members.reload()
+    members.cloaks = ("wikimedia/", "example/staff/")
+    config = {"default": "deny", "allow": ["group:admins"]}
+    for source, expect in [
+        ["bd808!~bd808@example/staff/bd808", True],
+        ["bd808!~bd808@example/bd808", False],
+        ["bd808!~bd808@user/bd808", False],
+    ]:
+        source = irc.client.NickMask(source)
+        assert expect == acls.check(config, source, members), source
+
+
+def test_sal_group_acl():
+    logger, irc_, es = test_sal.make_logger(
+        channels={
+            "#test": {
+                "project": "test",
+                "acl": {"default": "deny", "allow": ["group:admins"]},
+            }
+        }
+    )
+    assert logger.groups.names == {"admins"}
+    members = make_membership()
+    members.reload()
+    logger.groups = members
+    allowed = irc.client.NickMask("bd808!~bd808@wikimedia/bd808")
+    denied = irc.client.NickMask("nick!user@host")
+    assert logger._check_sal_acl("#test", allowed)
+    assert not logger._check_sal_acl("#test", denied)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+import elasticsearch
+
+from . import ircimport
+
+CONFIG = {
+    "irc": {"server": "irc.invalid"},
+    "elasticsearch": {
+        "index": "irc-%Y.%m.%d",
+        "policy": {"nicks": {"gerrit-wm": "off"}},
+    },
+}
+
+
+class FakeES(object):
+    def __init__(self):
+        self.actions = []
+        self.down = False
+
+    def bulk(self, actions, **kwargs):
+        if self.down:
+            next(iter(actions))
+            raise elasticsearch.ConnectionError("N/A", "down", None)
+        actions = list(actions)
+        self.actions.extend(actions)
+        return len(actions), []
+
+
+def write_logs(tmp_path):
+    chan = tmp_path / "libera" / "#test"
+    chan.mkdir(parents=True)
+    (chan / "2026-01-01.log").write_text(
+        "[23:59:59] <nick> \x02late\x02\n[23:59:59] <nick> late\n"
+    )
+    (chan / "2026-01-02.log").write_text(
+        "[00:00:01] <gerrit-wm> noise\n[00:00:02] <nick> early\n"
+    )
+    (tmp_path / "irc.libera.nickserv.weechatlog").write_text(
+        "2026-01-02 00:00:00\tNickServ\tsecret\n"
+    )
+    (tmp_path / "irc.libera.#other.weechatlog").write_text(
+        "2026-01-02 00:00:00\t+nick\thi\n"
+    )
+    (tmp_path / "notes.txt").write_text("not a log\n")
+
+
+def test_import_logs(tmp_path):
+    write_logs(tmp_path)
+    client = FakeES()
+    checkpoint = str(tmp_path / "checkpoint.json")
+    log = logging.getLogger(__name__)
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        log,
+        checkpoint=checkpoint,
+        workers=1,
+        client=client,
+    )
+    assert totals == {
+        "files": 4,
+        "indexed": 4,
+        "errors": 0,
+        "skipped": 1,
+        "failed": 0,
+    }
+    docs = [(a["_index"], a["_source"]) for a in client.actions]
+    assert [(i, d["channel"], d["message"]) for i, d in docs] == [
+        ("irc-2026.01.02", "#other", "hi"),
+        ("irc-2026.01.01", "#test", "late"),
+        ("irc-2026.01.01", "#test", "late"),
+        ("irc-2026.01.02", "#test", "early"),
+    ]
+    assert docs[3][1]["server"] == "irc.invalid"
+    assert docs[3][1]["@timestamp"] == "2026-01-02T00:00:02Z"
+    assert len({a["_id"] for a in client.actions}) == 4
+
+    # Nothing left to do
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        log,
+        checkpoint=checkpoint,
+        workers=1,
+        client=client,
+    )
+    assert totals["files"] == 0
+
+    (tmp_path / "irc.libera.#other.weechatlog").write_text(
+        "2026-01-02 00:00:00\t+nick\thi\n2026-01-02 00:00:01\tnick\tbye\n"
+    )
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        log,
+        checkpoint=checkpoint,
+        workers=1,
+        client=client,
+    )
+    assert totals["files"] == 1
+    assert totals["indexed"] == 2
+    # Reimported lines keep their ids
+    assert client.actions[-2]["_id"] == client.actions[0]["_id"]
+
+
+def test_unreachable_files_are_not_checkpointed(tmp_path):
+    write_logs(tmp_path)
+    client = FakeES()
+    client.down = True
+    checkpoint = str(tmp_path / "checkpoint.json")
+    log = logging.getLogger(__name__)
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        log,
+        checkpoint=checkpoint,
+        workers=1,
+        client=client,
+    )
+    assert totals["failed"] == 3
+    assert totals["indexed"] == 0
+    # Only the file that is not a channel log is done
+    assert [
+        p.rsplit("/", 1)[1] for p in ircimport.load_checkpoint(checkpoint)
+    ] == ["irc.libera.nickserv.weechatlog"]
+
+    client.down = False
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        log,
+        checkpoint=checkpoint,
+        workers=1,
+        client=client,
+    )
+    assert totals["indexed"] == 4
+
+
+def test_dry_run(tmp_path):
+    write_logs(tmp_path)
+    totals = ircimport.import_logs(
+        [str(tmp_path)],
+        CONFIG,
+        logging.getLogger(__name__),
+        checkpoint=str(tmp_path / "checkpoint.json"),
+        workers=2,
+        dry_run=True,
+    )
+    assert totals["indexed"] == 4
+    assert not (tmp_path / "checkpoint.json").exists()
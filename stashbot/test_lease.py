@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+import elasticsearch
+
+from . import lease
+
+
+class FakeES(object):
+    """Just enough of a document store to exercise concurrency control."""
+
+    def __init__(self):
+        self.doc = None
+        self.seq_no = 0
+
+    def _store(self, body):
+        self.seq_no += 1
+        self.doc = dict(body)
+        return {"_seq_no": self.seq_no, "_primary_term": 1}
+
+    def get(self, index, id):
+        if self.doc is None:
+            raise elasticsearch.NotFoundError(404, "not_found", {})
+        return {
+            "_source": self.doc,
+            "_seq_no": self.seq_no,
+            "_primary_term": 1,
+        }
+
+    def create(self, index, id, body, refresh):
+        if self.doc is not None:
+            raise elasticsearch.ConflictError(409, "conflict", {})
+        return self._store(body)
+
+    def index(self, index, id, body, if_seq_no, if_primary_term, refresh):
+        if if_seq_no != self.seq_no:
+            raise elasticsearch.ConflictError(409, "conflict", {})
+        return self._store(body)
+
+
+def make_es_lease(es, holder):
+    return lease.ElasticsearchLease(
+        es, logging.getLogger(__name__), ttl=10, holder=holder
+    )
+
+
+def test_file_lease(tmp_path):
+    path = str(tmp_path / "lock")
+    log = logging.getLogger(__name__)
+    a = lease.FileLease(path, log, "a")
+    b = lease.FileLease(path, log, "b")
+    assert a.acquire()
+    assert a.acquire()
+    assert not b.acquire()
+    a.release()
+    assert b.acquire()
+    assert not a.acquire()
+    with open(path) as f:
+        assert f.read() == "b\n"
+    b.release()
+
+
+def test_es_lease():
+    es = FakeES()
+    a = make_es_lease(es, "a")
+    b = make_es_lease(es, "b")
+    assert a.acquire(now=100)
+    assert not b.acquire(now=105)
+    assert a.acquire(now=108)
+    assert es.doc == {"holder": "a", "expires": 118}
+    # a stops renewing
+    assert not b.acquire(now=117)
+    assert b.acquire(now=119)
+    assert not a.acquire(now=120)
+    b.release()
+    assert es.doc["expires"] == 0
+    assert a.acquire(now=121)
+
+
+def test_es_lease_race():
+    es = FakeES()
+    a = make_es_lease(es, "a")
+    b = make_es_lease(es, "b")
+    assert a.acquire(now=100)
+    real_get = es.get
+
+    def stale_get(index, id):
+        # b reads the expired lease, then a renews before b writes
+        doc = real_get(index, id)
+        es.get = real_get
+        a.acquire(now=111)
+        return doc
+
+    es.get = stale_get
+    assert not b.acquire(now=111)
+    assert es.doc["holder"] == "a"
+
+
+def test_es_lease_unreachable():
+    es = FakeES()
+    a = make_es_lease(es, "a")
+    assert a.acquire(now=100)
+
+    def broken(index, id):
+        raise elasticsearch.ConnectionError("N/A", "down", None)
+
+    es.get = broken
+    assert a.acquire(now=105)
+    assert not a.acquire(now=111)
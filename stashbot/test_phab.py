@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+from . import phab
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.comments = []
+
+    def comment(self, task, comment):
+        self.comments.append((task, comment))
+
+
+def test_comment_queue_coalesces():
+    client = FakeClient()
+    queue = phab.CommentQueue(client, logging.getLogger(__name__))
+    assert queue.add("T1", "one")
+    assert not queue.add("T2", "two")
+    assert not queue.add("T1", "three")
+    assert not queue.add("T1", "one")
+    assert len(queue) == 2
+    queue.flush()
+    assert client.comments == [("T1", "one\nthree"), ("T2", "two")]
+    assert len(queue) == 0
+    queue.flush()
+    assert len(client.comments) == 2
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import pytest
+import yaml
+
+from . import policy
+
+CONFIG = yaml.safe_load("""
+policy:
+  sample_rate: 0
+  channels:
+    '#feed': sampled
+    '#sal-only': sal
+    '#quiet': off
+  nicks:
+    Gerrit-WM: off
+    logmsgbot: full
+""")
+
+
+@pytest.mark.parametrize(
+    "channel,nick,message,expect",
+    [
+        ["#chat", "someone", "hello", True],
+        ["#chat", "gerrit-wm", "a patch", False],
+        ["#feed", "someone", "hello", False],
+        ["#sal-only", "someone", "hello", False],
+        ["#sal-only", "someone", "!log did a thing", True],
+        ["#quiet", "someone", "!log did a thing", False],
+        ["#quiet", "logmsgbot", "!log did a thing", True],
+    ],
+)
+def test_should_index(channel, nick, message, expect):
+    p = policy.IndexPolicy(CONFIG)
+    assert p.should_index(channel, nick, message) == expect
+
+
+def test_dropped_counts():
+    p = policy.IndexPolicy(dict(CONFIG, policy={"default": "off"}))
+    for _ in range(3):
+        p.should_index("#chat", "someone", "hello")
+    assert p.stats() == {"#chat off": 3}
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        policy.IndexPolicy({"policy": {"channels": {"#chat": "some"}}})
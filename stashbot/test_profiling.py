@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+import os
+import time
+import tracemalloc
+
+from . import profiling
+
+
+class FakeScheduler(object):
+    def __init__(self):
+        self.pending = []
+
+    def execute_after(self, delay, func):
+        self.pending.append((delay, func))
+
+
+class FakeReactor(object):
+    def __init__(self):
+        self.scheduler = FakeScheduler()
+
+
+def make_profiler(tmp_path):
+    return profiling.Profiler(
+        FakeReactor(), logging.getLogger(__name__), str(tmp_path), top=5
+    )
+
+
+def test_cpu(tmp_path):
+    prof = make_profiler(tmp_path)
+    assert prof.cpu(5000)
+    assert not prof.cpu(5)
+    delay, func = prof.reactor.scheduler.pending[0]
+    assert delay == profiling.MAX_SECONDS
+    sum(range(1000))
+    func()
+    time.sleep(0.01)
+    assert prof.cpu(1)
+    prof.reactor.scheduler.pending[1][1]()
+    files = os.listdir(str(tmp_path))
+    assert len(files) == 2
+    assert all(f.startswith("cpu-") for f in files)
+
+
+def test_heap(tmp_path):
+    prof = make_profiler(tmp_path)
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        if not was_tracing:
+            assert prof.heap() is None
+        first = prof.heap()
+        junk = ["x" * 100 for _ in range(100)]
+        second = prof.heap()
+        assert os.path.exists(first)
+        assert os.path.exists(second)
+        assert prof._snapshot is not None
+        del junk
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def test_requests_wait_for_tick(tmp_path):
+    prof = make_profiler(tmp_path)
+    prof.request_cpu()
+    assert prof._profile is None
+    prof.check_requests()
+    assert prof._profile is not None
+    assert not prof.cpu_requested
+    prof.reactor.scheduler.pending[0][1]()
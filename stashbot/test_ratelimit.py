@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+from . import ratelimit
+
+
+def test_limiter_burst_and_refill():
+    lim = ratelimit.Limiter()
+    assert all(lim.allow("a", 1, 3, now=0) for _ in range(3))
+    assert not lim.allow("a", 1, 3, now=0)
+    assert lim.warn("a")
+    assert not lim.warn("a")
+    assert lim.allow("b", 1, 3, now=0)
+    assert lim.allow("a", 1, 3, now=1)
+    assert not lim.allow("a", 1, 3, now=1)
+
+
+def test_limiter_forgets_full_buckets():
+    lim = ratelimit.Limiter(maxlen=2)
+    lim.allow("a", 1, 2, now=0)
+    lim.allow("b", 1, 2, now=0)
+    lim.allow("c", 1, 2, now=0)
+    assert len(lim) == 2
+    lim.allow("d", 1, 2, now=10)
+    assert list(lim.buckets) == ["d"]
+
+
+def test_limiter_expires_behind_unfilled_bucket():
+    lim = ratelimit.Limiter()
+    # "slow" is least recently used but takes the longest to refill
+    lim.allow("slow", 0.01, 2, now=0)
+    for key in ("a", "b", "c"):
+        lim.allow(key, 1, 2, now=0)
+    lim.allow("d", 1, 2, now=5)
+    assert list(lim.buckets) == ["slow", "d"]
+    lim.allow("e", 1, 2, now=200)
+    assert list(lim.buckets) == ["e"]
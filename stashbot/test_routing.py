@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+
+import pytest
+
+from . import fuzzy
+from . import routing
+
+from .test_sal import make_event
+from .test_sal import make_logger
+
+CHANNELS = {
+    "#wikimedia-cloud": {"project": "admin"},
+    "#wikimedia-cloud-feed": {"use_config": "#wikimedia-cloud"},
+    "#wikimedia-operations": {"project": "production"},
+    "#wikimedia-releng": {"project": "releng"},
+    "#test": {"project": "test"},
+    "#alias": {"use_config": "#test"},
+    "#acl": {"project": "acl", "acl": {"#acl": True, "default": "deny"}},
+}
+PROJECTS = [
+    "deployment-prep",
+    "contintcloud",
+    "tools",
+    "tools.paws",
+    "tools.quarry",
+    "tools.foo",
+]
+
+# (channel, source, message, [(project, channel, nick, message)], responses)
+CORPUS = [
+    ["#test", "a!u@h", "!log hello", [("test", "#test", "a", "hello")], 0],
+    ["#alias", "a!u@h", "!log hi", [("test", "#alias", "a", "hi")], 0],
+    ["#nowhere", "a!u@h", "!log hi", [], ["Not expecting"]],
+    ["#test", "a!u@h", "!log   ", [], ["Message missing"]],
+    ["#acl", "a!u@h", "!log hi", [], ["ACLs in this channel"]],
+    [
+        "#test",
+        "logmsgbot!u@h",
+        "!log bd808@deploy1002 Synchronized foo",
+        [("test", "#test", "bd808@deploy1002", "Synchronized foo")],
+        0,
+    ],
+    [
+        "#test",
+        "logmsgbot_cloud!u@h",
+        "!log not-a-user-at-host thing",
+        [("test", "#test", "logmsgbot_cloud", "not-a-user-at-host thing")],
+        0,
+    ],
+    [
+        "#test",
+        "wm-bot2!u@h",
+        "!log someone@host did it",
+        [("test", "#test", "wmbot~someone@host", "did it")],
+        0,
+    ],
+    [
+        "#test",
+        "mallory!u@h",
+        "!log someone@host did it",
+        [("test", "#test", "mallory", "someone@host did it")],
+        0,
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log tools restarted",
+        [("tools", "#wikimedia-cloud", "a", "restarted")],
+        0,
+    ],
+    [
+        "#wikimedia-cloud-feed",
+        "a!u@h",
+        "!log tools restarted",
+        [("tools", "#wikimedia-cloud-feed", "a", "restarted")],
+        0,
+    ],
+    ["#wikimedia-cloud", "a!u@h", "!log tools", [], ["Missing project"]],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log nope restarted",
+        [],
+        ['Unknown project "nope"'],
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log foo restarted",
+        [],
+        ['Unknown project "foo"', 'Did you mean to say "tools.foo"'],
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log deploymnet-prep restarted",
+        [],
+        [
+            'Unknown project "deploymnet-prep"',
+            'Did you mean to say "deployment-prep" instead',
+        ],
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log tool restarted",
+        [],
+        ['Unknown project "tool"', 'Did you mean to say "tools" instead'],
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log deployment-prep rebooted",
+        [
+            ("releng", "#wikimedia-releng", "a", "rebooted"),
+            ("deployment-prep", "#wikimedia-cloud", "a", "rebooted"),
+        ],
+        0,
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log contintcloud rebooted",
+        [
+            ("releng", "#wikimedia-releng", "a", "rebooted"),
+            ("contintcloud", "#wikimedia-cloud", "a", "rebooted"),
+        ],
+        0,
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log tools.paws rebooted",
+        [],
+        ['Use "!log paws" instead'],
+    ],
+    [
+        "#wikimedia-cloud",
+        "a!u@h",
+        "!log tools.quarry rebooted",
+        [],
+        ['Use "!log quarry" instead'],
+    ],
+    [
+        "#wikimedia-operations",
+        "a!u@h",
+        "!log updated jenkins #releng",
+        [
+            ("releng", "#wikimedia-releng", "a", "updated jenkins #releng"),
+            (
+                "production",
+                "#wikimedia-operations",
+                "a",
+                "updated jenkins #releng",
+            ),
+        ],
+        0,
+    ],
+    [
+        "#wikimedia-operations",
+        "a!u@h",
+        "!log updated jenkins",
+        [("production", "#wikimedia-operations", "a", "updated jenkins")],
+        0,
+    ],
+    [
+        "#test",
+        "a!u@h",
+        "!log tools.paws rebooted",
+        [("test", "#test", "a", "tools.paws rebooted")],
+        0,
+    ],
+]
+
+
+@pytest.mark.parametrize("channel,source,message,docs,responses", CORPUS)
+def test_log_routing(channel, source, message, docs, responses):
+    logger, irc, es = make_logger(channels=CHANNELS)
+    logger._cached_projects = (time.time() + 300, frozenset(PROJECTS))
+    logger._project_index = fuzzy.NameIndex(PROJECTS)
+    event, doc = make_event(message, channel=channel, source=source)
+    logger.log(None, event, doc)
+    got = [
+        (d["project"], d["channel"], d["nick"], d["message"])
+        for i, d in es.docs
+    ]
+    assert got == docs
+    assert all(i == "sal" for i, d in es.docs)
+    if responses:
+        assert len(irc.responses) == len(responses)
+        for want, got in zip(responses, irc.responses):
+            assert want in got
+    else:
+        assert irc.responses == []
+
+
+def test_router_rules_from_config():
+    router = routing.Router(
+        {
+            "relays": {"relaybot": "relay~"},
+            "channels": {
+                "#wikimedia-cloud": {
+                    "project": "admin",
+                    "deprecated": {"old": "new"},
+                },
+                "#feed": {"use_config": "#wikimedia-cloud"},
+                "#plain": {"project": "plain"},
+                "#broken": {"use_config": "#missing"},
+            },
+        }
+    )
+    assert router.route("#broken") is None
+    assert router.route("#nowhere") is None
+    route = router.route("#feed")
+    assert route.channel == "#wikimedia-cloud"
+    assert route.project_from_message
+    # Config rules replace the defaults of the same kind
+    assert route.deprecated == {"old": "new"}
+    assert router.duplicates(route, "contintcloud", "x") == [
+        "#wikimedia-releng"
+    ]
+    assert not router.route("#plain").project_from_message
+    assert router.relay_prefix("relaybot") == "relay~"
+    assert router.relay_prefix("logmsgbot") == ""
+    assert router.relay_prefix("someone") is None
@@ -15,9 +15,14 @@
 #
 # You should have received a copy of the GNU General Public License along with
 # this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+import irc.client
 import pytest
 
+from . import bot
 from . import sal
+from . import tracing
 
 
 @pytest.mark.parametrize(
@@ -36,3 +41,173 @@ from . import sal
 def test_safe_arg(source, expect):
     clean = sal.Logger.safe_arg(source)
     assert expect == clean, "{} != {}".format(expect, clean)
+
+
+PAGE = [
+    "Intro",
+    "== 2025-03-02 ==",
+    "* 10:00 a: march two",
+    "== 2025-03-01 ==",
+    "* 09:00 b: march one",
+    "",
+    "== 2025-02-10 ==",
+    "* 08:00 c: february",
+    "",
+    "== 2024-12-31 ==",
+    "* 07:00 d: december",
+    "",
+    "<noinclude>[[Category:SAL]]</noinclude>",
+]
+
+
+def test_split_archive_under_limit():
+    keep, archived = sal.Logger.split_archive(PAGE, "==", 10000)
+    assert keep == PAGE
+    assert archived == {}
+
+
+def test_split_archive_keeps_current_month():
+    keep, archived = sal.Logger.split_archive(PAGE, "==", 1)
+    assert keep == PAGE[:5] + ["", "<noinclude>[[Category:SAL]]</noinclude>"]
+    assert archived == {
+        "2025": ["== 2025-02-10 ==", "* 08:00 c: february"],
+        "2024": ["== 2024-12-31 ==", "* 07:00 d: december"],
+    }
+
+
+def test_split_archive_oldest_first():
+    size = len("\n".join(PAGE).encode("utf-8"))
+    keep, archived = sal.Logger.split_archive(PAGE, "==", size - 10)
+    assert keep == PAGE[:8] + ["", "<noinclude>[[Category:SAL]]</noinclude>"]
+    assert archived == {"2024": ["== 2024-12-31 ==", "* 07:00 d: december"]}
+
+
+class FakeScheduler(object):
+    def execute_after(self, delay, func):
+        pass
+
+
+class FakeReactor(object):
+    scheduler = FakeScheduler()
+
+
+class FakeBot(object):
+    reactor = FakeReactor()
+    _clean_nick = bot.Stashbot._clean_nick
+
+    def __init__(self):
+        self.responses = []
+
+    def respond(self, conn, event, msg):
+        self.responses.append(msg)
+
+
+class FakeES(object):
+    def __init__(self):
+        self.docs = []
+        self.down = False
+
+    def index(self, index, body):
+        if self.down:
+            return {}
+        self.docs.append((index, body))
+        return {"result": "created", "_id": str(len(self.docs))}
+
+
+def make_logger(**sal_config):
+    config = {
+        "ldap": {"uri": "ldap://ldap.invalid", "base": "dc=invalid"},
+        "sal": dict(
+            {
+                "view_url": "https://sal.invalid/%s",
+                "channels": {"#test": {"project": "test"}},
+            },
+            **sal_config,
+        ),
+    }
+    irc = FakeBot()
+    es = FakeES()
+    return sal.Logger(irc, None, es, config, logging.getLogger()), irc, es
+
+
+def make_event(msg, channel="#test", source="nick!user@host"):
+    source = irc.client.NickMask(source)
+    event = irc.client.Event("pubmsg", source, channel, [msg])
+    doc = {
+        "message": msg,
+        "channel": channel,
+        "nick": source.nick,
+        "user": source,
+        "host": source.host,
+    }
+    return event, doc
+
+
+def test_log_ignores_duplicates():
+    logger, irc, es = make_logger()
+    for nick in ("nick", "Nick|away", "nick"):
+        event, doc = make_event("!log did a thing", source=nick + "!u@h")
+        logger.log(None, event, doc)
+    event, doc = make_event("!log did another thing")
+    logger.log(None, event, doc)
+    assert [d["message"] for i, d in es.docs] == [
+        "did a thing",
+        "did another thing",
+    ]
+    assert len(irc.responses) == 2
+    assert "duplicate" in irc.responses[0]
+
+
+def test_log_retry_after_failed_store():
+    logger, irc, es = make_logger()
+    es.down = True
+    event, doc = make_event("!log did a thing")
+    logger.log(None, event, doc)
+    assert es.docs == []
+    es.down = False
+    event, doc = make_event("!log did a thing")
+    logger.log(None, event, doc)
+    assert [d["message"] for i, d in es.docs] == ["did a thing"]
+    assert not any("duplicate" in r for r in irc.responses)
+
+
+def test_log_retry_after_unknown_project():
+    logger, irc, es = make_logger(
+        channels={"#test": {"project": "x", "project_from_message": True}}
+    )
+    logger._get_projects = lambda: {"tools"}
+    event, doc = make_event("!log tols did a thing")
+    logger.log(None, event, doc)
+    assert 'Unknown project "tols"' in irc.responses[0]
+    event, doc = make_event("!log tools did a thing")
+    logger.log(None, event, doc)
+    assert [(d["project"], d["message"]) for i, d in es.docs] == [
+        ("tools", "did a thing")
+    ]
+
+
+def test_log_dedupe_window_disabled():
+    logger, irc, es = make_logger(dedupe_window=0)
+    for _ in range(2):
+        event, doc = make_event("!log did a thing")
+        logger.log(None, event, doc)
+    assert len(es.docs) == 2
+
+
+def test_log_trace_spans(tmp_path):
+    logger, irc, es = make_logger()
+    tracer = tracing.Tracer(
+        {"file": str(tmp_path / "traces.jsonl")}, logging.getLogger()
+    )
+    trace = tracer.start("!log")
+    event, doc = make_event("!log did a thing")
+    logger.log(None, event, doc, trace=trace)
+    trace.finish()
+    tracer.stop()
+    (recorded,) = tracing.read_traces(str(tmp_path / "traces.jsonl"))
+    assert recorded["trace_id"] == trace.trace_id
+    assert [s["name"] for s in recorded["spans"]] == [
+        "acl",
+        "es.index",
+        "store",
+    ]
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import datetime
+import json
+import logging
+
+import elasticsearch
+import pytest
+
+from . import es
+from . import serializer
+
+
+class FakeES(object):
+    def __init__(self, statuses=None, fail=False):
+        self.statuses = statuses or {}
+        self.fail = fail
+        self.bodies = []
+
+    def index(self, index, body):
+        self.bodies.append(body)
+        return {"result": "created"}
+
+    def bulk(self, body):
+        if self.fail:
+            raise elasticsearch.ConnectionError("N/A", "down", None)
+        self.bodies.append(body)
+        items = []
+        for line in body.splitlines()[::2]:
+            op, meta = json.loads(line).popitem()
+            status = self.statuses.get(meta.get("_id"), 201)
+            items.append({op: {"_id": meta.get("_id"), "status": status}})
+        return {"items": items}
+
+
+def make_client(fake):
+    client = es.Client([], {}, logging.getLogger(__name__))
+    client._es = fake
+    return client
+
+
+def test_dumps_matches_stdlib():
+    doc = es.make_doc(
+        "héllo \x02world", 0, "nick!user@host", "#chan", "irc.invalid"
+    )
+    doc["when"] = datetime.datetime(2026, 1, 2, 3, 4, 5)
+    out = serializer.dumps(doc)
+    assert isinstance(out, bytes)
+    assert json.loads(out) == dict(
+        doc, user="nick!user@host", when="2026-01-02T03:04:05"
+    )
+    assert serializer.loads(out)["message"] == "héllo world"
+
+
+def test_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        serializer.dumps({"obj": object()})
+
+
+def test_bulk_chunks_bytes_limit():
+    actions = [{"_index": "a", "_source": {"n": n}} for n in range(5)]
+    bodies = [b for b, docs in serializer.bulk_chunks(actions, 100, 70)]
+    assert len(bodies) == 3
+    assert b"".join(bodies) == b"".join(
+        serializer.bulk_lines("index", {"_index": "a"}, {"n": n})
+        for n in range(5)
+    )
+
+
+def test_bulk_update_action():
+    op, meta, doc = serializer.expand_action(
+        {
+            "_op_type": "update",
+            "_index": "bash",
+            "_id": "1",
+            "_retry_on_conflict": 3,
+            "script": {"source": "ctx._source.up++"},
+        }
+    )
+    assert op == "update"
+    assert meta == {"_index": "bash", "_id": "1", "retry_on_conflict": 3}
+    assert doc == {"script": {"source": "ctx._source.up++"}}
+
+
+def test_client_bulk():
+    fake = FakeES(statuses={"2": 409})
+    client = make_client(fake)
+    ok, errors = client.bulk(
+        (
+            {"_index": "irc", "_id": str(n), "_source": {"n": n}}
+            for n in range(5)
+        ),
+        chunk_size=2,
+    )
+    assert ok == 4
+    assert errors == [{"index": {"_id": "2", "status": 409, "data": {"n": 2}}}]
+    assert len(fake.bodies) == 3
+    assert all(isinstance(b, bytes) for b in fake.bodies)
+
+
+def test_client_bulk_connection_error():
+    client = make_client(FakeES(fail=True))
+    with pytest.raises(elasticsearch.ConnectionError):
+        client.bulk([{"_index": "irc", "_source": {}}])
+    assert client.failures == 1
+
+
+def test_client_index_sends_bytes():
+    fake = FakeES()
+    client = make_client(fake)
+    client.index("irc", {"message": "hi"})
+    client.index("irc", b'{"message":"raw"}')
+    assert fake.bodies == [b'{"message":"hi"}', b'{"message":"raw"}']
+
+
+def test_elasticsearch_serializer():
+    ser = serializer.elasticsearch_serializer()
+    assert ser.dumps(b"{}") == b"{}"
+    assert ser.dumps({"a": [1]}) == b'{"a":[1]}'
+    assert ser.loads('{"a": [1]}') == {"a": [1]}
+    with pytest.raises(elasticsearch.SerializationError):
+        ser.loads("{")
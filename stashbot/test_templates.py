@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import io
+import json
+import logging
+
+import elasticsearch
+import pytest
+
+from . import templates
+
+
+class FakeIndices(object):
+    def __init__(self):
+        self.installed = {}
+
+    def get_index_template(self, name):
+        if name not in self.installed:
+            raise elasticsearch.NotFoundError(404, "missing", {})
+        return {
+            "index_templates": [
+                {"name": name, "index_template": self.installed[name]}
+            ]
+        }
+
+    def put_index_template(self, name, body):
+        # What GET _index_template returns: settings as strings, and
+        # defaults that the files leave out
+        body = json.loads(json.dumps(body))
+        body["composed_of"] = []
+        index = body["template"]["settings"]["index"]
+        for key, value in list(index.items()):
+            if not isinstance(value, dict):
+                index[key] = str(value)
+        self.installed[name] = body
+
+
+class FakeES(object):
+    def __init__(self, version=(7, 17)):
+        self.es = self
+        self.indices = FakeIndices()
+        self.logger = logging.getLogger(__name__)
+        self.version = version
+
+    def server_version(self):
+        return self.version
+
+
+def test_templates_use_modern_mappings():
+    tpls = templates.load()
+    assert sorted(tpls) == ["bash", "irc", "sal"]
+    for tpl in tpls.values():
+        text = json.dumps(tpl)
+        assert '"type": "string"' not in text
+        assert "not_analyzed" not in text
+        props = tpl["template"]["mappings"]["properties"]
+        assert props["nick"] == {"type": "keyword"}
+        assert props["message"]["norms"] is False
+
+
+def test_install_is_idempotent():
+    es = FakeES()
+    tpls = templates.load()
+    out = io.StringIO()
+    assert templates.install(es, tpls, dry_run=True, out=out) == sorted(tpls)
+    assert "+++ extra/irc-template.json" in out.getvalue()
+    assert es.indices.installed == {}
+
+    assert templates.install(es, tpls) == sorted(tpls)
+    assert templates.install(es, tpls) == []
+
+
+def test_install_reports_real_changes():
+    es = FakeES()
+    tpls = templates.load()
+    templates.install(es, tpls)
+    es.indices.installed["sal"]["priority"] = 1
+    out = io.StringIO()
+    assert templates.install(es, tpls, dry_run=True, out=out) == ["sal"]
+    assert '-  "priority": 1,' in out.getvalue()
+    assert "composed_of" not in out.getvalue()
+
+
+def test_install_needs_composable_templates():
+    es = FakeES(version=(7, 7))
+    with pytest.raises(RuntimeError, match="7.8 or later"):
+        templates.install(es, templates.load())
+    assert es.indices.installed == {}
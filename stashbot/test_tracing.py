@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+import pytest
+
+from . import tracing
+
+
+def make_tracer(tmp_path, **config):
+    config.setdefault("file", str(tmp_path / "traces.jsonl"))
+    return tracing.Tracer(config, logging.getLogger(__name__))
+
+
+def test_nested_spans(tmp_path):
+    tracer = make_tracer(tmp_path)
+    trace = tracer.start("!log", channel="#test")
+    with trace.span("outer"):
+        with trace.span("inner", task="T1"):
+            pass
+        with pytest.raises(ValueError):
+            with trace.span("broken"):
+                raise ValueError("boom")
+    trace.finish()
+    trace.finish()
+    tracer.stop()
+
+    (recorded,) = tracing.read_traces(tracer.path)
+    spans = {s["name"]: s for s in recorded["spans"]}
+    assert recorded["name"] == "!log"
+    assert recorded["attrs"] == {"channel": "#test"}
+    assert spans["outer"]["parent_id"] == recorded["span_id"]
+    assert spans["inner"]["parent_id"] == spans["outer"]["span_id"]
+    assert spans["broken"]["attrs"]["error"] == "ValueError('boom')"
+    assert recorded["duration"] >= spans["outer"]["duration"]
+
+    text = tracing.format_trace(recorded)
+    assert text.splitlines()[0].startswith(trace.trace_id)
+    assert "    " in text and "inner task=T1" in text
+
+
+def test_read_rotated(tmp_path):
+    tracer = make_tracer(tmp_path, max_bytes=200, backups=3)
+    for n in range(6):
+        t = tracer.start("t%d" % n)
+        t.finish()
+    tracer.stop()
+    names = [t["name"] for t in tracing.read_traces(tracer.path)]
+    assert "t5" in names
+    assert len(names) > 1
+    assert len(tracing.slowest(tracing.read_traces(tracer.path), 2)) == 2
+
+
+def test_null_tracer():
+    trace = tracing.make_tracer(None, None).start("!log")
+    assert trace is tracing.NULL
+    with trace.span("anything"):
+        trace.annotate(a=1)
+    trace.finish()
+
+
+def test_otlp_payload(tmp_path):
+    tracer = make_tracer(tmp_path)
+    trace = tracer.start("!log", n=1)
+    with trace.span("child"):
+        pass
+    trace.finish()
+    tracer.stop()
+    payload = tracing.otlp_payload(tracing.read_traces(tracer.path))
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["!log", "child"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[0]["attributes"] == [{"key": "n", "value": {"intValue": "1"}}]
+    assert len(spans[0]["traceId"]) == 32
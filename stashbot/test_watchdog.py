@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+import time
+
+from . import watchdog
+from .test_workload import FakeReactor
+
+
+def test_beat_measures_lag():
+    wd = watchdog.Watchdog(FakeReactor(), logging.getLogger(__name__))
+    wd.last_beat = time.monotonic() - 3.5
+    wd.beat()
+    assert 2.4 < wd.last_lag < 3
+    assert wd.max_lag == wd.last_lag
+    assert len(wd.reactor.scheduler.pending) == 1
+    wd.beat()
+    assert wd.last_lag == 0
+    assert wd.max_lag > 2.4
+
+
+def test_overdue_beat_counts_as_lag():
+    wd = watchdog.Watchdog(FakeReactor(), logging.getLogger(__name__))
+    wd.last_beat = time.monotonic() - 11
+    assert wd.lag() > 9
+
+
+def test_loop_stack():
+    wd = watchdog.Watchdog(FakeReactor(), logging.getLogger(__name__))
+    wd.beat()
+    assert "test_loop_stack" in wd.loop_stack()
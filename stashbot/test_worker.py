@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2015 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+import time
+
+import irc.client
+
+from . import backends
+from . import feed
+from . import worker
+
+
+class FakeConnection(object):
+    def __init__(self, nick):
+        self.nick = nick
+        self.sent = []
+
+    def get_nickname(self):
+        return self.nick
+
+    def is_connected(self):
+        return True
+
+    def privmsg(self, target, text):
+        self.sent.append((target, text))
+
+
+class FakeBot(object):
+    def __init__(self, name):
+        self.name = name
+        self.connection = FakeConnection("stashbot")
+        self.jobs = []
+
+    def run_job(self, klass, conn, event, doc, done=None, **attrs):
+        self.jobs.append((klass, event, doc, attrs))
+        conn.privmsg(event.target, "%s: done" % event.source.nick)
+        if done is not None:
+            done()
+
+
+class FakeES(object):
+    failures = 0
+
+
+class FakeSAL(object):
+    def __init__(self):
+        self.feed = feed.Feed()
+
+
+class FakeBackends(object):
+    def __init__(self, *names):
+        self.reactor = backends.SharedReactor()
+        self.bots = [FakeBot(name) for name in names]
+        self.es = FakeES()
+        self.sal = FakeSAL()
+
+
+def make_event(text="!log hello", target="#chan"):
+    return irc.client.Event(
+        "pubmsg", irc.client.NickMask("nick!user@host"), target, [text]
+    )
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    log = logging.getLogger()
+    front = FakeBackends("libera", "oftc")
+    back = FakeBackends("libera", "oftc")
+    dispatcher = worker.Dispatcher(path, front, log)
+    dispatcher.start()
+    work = worker.Worker(path, back, log, retry=0.01)
+    try:
+        event = irc.client.Event(
+            "pubmsg",
+            irc.client.NickMask("nick!user@host"),
+            "#chan",
+            ["!log hello"],
+        )
+        conn = front.bots[1].connection
+        # Nothing to send to until a worker connects
+        assert not dispatcher.send("sal", "oftc", conn, event, {})
+        work.start()
+        wait_for(lambda: dispatcher.workers)
+
+        doc = {"message": "!log hello", "nick": "nick"}
+        assert dispatcher.send(
+            "sal", "oftc", conn, event, doc, {"replay": True}
+        )
+        wait_for(lambda: not work.jobs.empty())
+        work.run()
+        klass, got, got_doc, attrs = back.bots[1].jobs[0]
+        assert klass == "sal"
+        assert (got.source.nick, got.target) == ("nick", "#chan")
+        assert got_doc == doc
+        assert attrs == {"replay": True}
+        assert back.bots[0].jobs == []
+
+        wait_for(lambda: not dispatcher.replies.empty())
+        dispatcher.deliver()
+        assert conn.sent == [("#chan", "nick: done")]
+        assert front.bots[0].connection.sent == []
+        wait_for(lambda: not dispatcher.pending)
+        assert dispatcher.stats() == {
+            "workers": 1,
+            "sent": 1,
+            "fallbacks": 1,
+            "pending": 0,
+            "requeued": 0,
+        }
+    finally:
+        dispatcher.stop()
+    wait_for(lambda: work.peer.closed)
+    work.stop()
+
+
+def test_worker_dies_mid_job(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    log = logging.getLogger()
+    front = FakeBackends("libera")
+    dispatcher = worker.Dispatcher(path, front, log)
+    dispatcher.start()
+    works = [
+        worker.Worker(path, FakeBackends("libera"), log, retry=0.01)
+        for _ in range(2)
+    ]
+    try:
+        for work in works:
+            work.start()
+            wait_for(lambda: work.peer is not None)
+        wait_for(lambda: len(dispatcher.workers) == 2)
+        conn = front.bots[0].connection
+        assert dispatcher.send("sal", "libera", conn, make_event(), {})
+        wait_for(lambda: any(not w.jobs.empty() for w in works))
+        busy = next(w for w in works if not w.jobs.empty())
+        idle = next(w for w in works if w is not busy)
+        assert len(dispatcher.pending) == 1
+
+        # Killed after receiving the job but before running it
+        busy.stop()
+        wait_for(lambda: len(dispatcher.workers) == 1)
+        dispatcher.deliver()
+        wait_for(lambda: not idle.jobs.empty())
+        idle.run()
+        assert idle.backends.bots[0].jobs[0][0] == "sal"
+        wait_for(lambda: not dispatcher.pending)
+
+        # With no worker left the front end does the job
+        assert dispatcher.send("sal", "libera", conn, make_event(), {})
+        idle.stop()
+        wait_for(lambda: not dispatcher.workers)
+        dispatcher.deliver()
+        assert len(front.bots[0].jobs) == 1
+        assert dispatcher.stats()["requeued"] == 2
+    finally:
+        dispatcher.stop()
+        for work in works:
+            work.stop()
+
+
+def test_worker_feed_and_health(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    log = logging.getLogger()
+    front = FakeBackends("libera")
+    back = FakeBackends("libera")
+    dispatcher = worker.Dispatcher(path, front, log)
+    dispatcher.start()
+    work = worker.Worker(path, back, log, retry=0.01)
+    work.start()
+    try:
+        wait_for(lambda: dispatcher.workers)
+        back.sal.feed.publish(
+            {"id": "1", "project": "tools", "message": "hi", "host": "h"}
+        )
+        wait_for(lambda: front.sal.feed.latest("tools"))
+        assert front.sal.feed.latest("tools") == [
+            {"id": "1", "project": "tools", "message": "hi"}
+        ]
+
+        back.es.failures = 7
+        conn = front.bots[0].connection
+        assert dispatcher.send("irc", "libera", conn, make_event("hi"), {})
+        wait_for(lambda: not work.jobs.empty())
+        work.run()
+        wait_for(lambda: dispatcher.get_es_failures() == 7)
+    finally:
+        dispatcher.stop()
+        work.stop()
+
+
+def test_worker_reconnects_before_running_job(tmp_path):
+    path = str(tmp_path / "worker.sock")
+    log = logging.getLogger()
+    front = FakeBackends("libera")
+    back = FakeBackends("libera")
+    dispatcher = worker.Dispatcher(path, front, log)
+    dispatcher.start()
+    work = worker.Worker(path, back, log, retry=0.01)
+    work.start()
+    try:
+        wait_for(lambda: dispatcher.workers)
+        conn = front.bots[0].connection
+        assert dispatcher.send("sal", "libera", conn, make_event(), {})
+        wait_for(lambda: not work.jobs.empty())
+
+        # The connection drops after the job arrived but before it runs
+        old = work.peer
+        old.close()
+        # Requeued once the old connection is gone and the new one is up
+        wait_for(lambda: not dispatcher.orphans.empty())
+        wait_for(lambda: work.peer is not old and dispatcher.workers)
+        dispatcher.deliver()
+        wait_for(lambda: work.jobs.qsize() == 2)
+
+        # Only the copy from the new connection runs, and it is acked there
+        work.run()
+        assert len(back.bots[0].jobs) == 1
+        wait_for(lambda: not dispatcher.pending)
+        assert dispatcher.stats()["requeued"] == 1
+    finally:
+        dispatcher.stop()
+        work.stop()
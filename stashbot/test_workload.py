@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+import logging
+
+from . import workload
+
+
+class FakeScheduler(object):
+    def __init__(self):
+        self.pending = []
+
+    def execute_after(self, delay, func):
+        self.pending.append(func)
+
+
+class FakeReactor(object):
+    def __init__(self):
+        self.scheduler = FakeScheduler()
+
+
+def make_scheduler(**config):
+    return workload.Scheduler(
+        FakeReactor(), logging.getLogger(__name__), config
+    )
+
+
+def test_priority_order():
+    ran = []
+    sched = make_scheduler()
+    sched.submit(workload.IRC, ran.append, "irc")
+    sched.submit(workload.PHAB, ran.append, "phab")
+    sched.submit(workload.SAL, ran.append, "sal")
+    sched.submit(workload.BASH, ran.append, "bash")
+    assert len(sched.reactor.scheduler.pending) == 1
+    sched.run()
+    assert ran == ["sal", "bash", "phab", "irc"]
+    assert len(sched) == 0
+
+
+def test_shed_irc_then_phab():
+    sched = make_scheduler(
+        irc={"high_water": 2}, phab={"high_water": 4}, sal={"capacity": 5}
+    )
+    for _ in range(2):
+        assert sched.submit(workload.IRC, print)
+    assert not sched.submit(workload.IRC, print)
+    for _ in range(2):
+        assert sched.submit(workload.PHAB, print)
+    assert not sched.submit(workload.PHAB, print)
+    # SAL is not shed under pressure, only when its own queue is full
+    for _ in range(5):
+        assert sched.submit(workload.SAL, print)
+    assert not sched.submit(workload.SAL, print)
+    assert sched.stats() == {
+        "queued": {"sal": 5, "bash": 0, "phab": 2, "irc": 2},
+        "shed": {"irc": 1, "phab": 1, "sal": 1},
+    }
+
+
+def test_errors_do_not_stop_the_queue():
+    ran = []
+    sched = make_scheduler()
+    sched.submit(workload.SAL, lambda: 1 / 0)
+    sched.submit(workload.SAL, ran.append, "ok")
+    sched.run()
+    assert ran == ["ok"]
+
+
+def test_budget_yields_to_reactor():
+    sched = make_scheduler()
+    for _ in range(3):
+        sched.submit(workload.IRC, print)
+    sched.run(budget=0)
+    assert len(sched) == 2
+    assert len(sched.reactor.scheduler.pending) == 2
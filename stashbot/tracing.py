@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Lightweight trace spans for the work done for an IRC event"""
+
+import contextlib
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+
+def _new_id(size):
+    return os.urandom(size).hex()
+
+
+class Span(object):
+    """A timed step of a trace."""
+
+    __slots__ = ("span_id", "parent_id", "name", "start", "duration", "attrs")
+
+    def __init__(self, name, parent_id=None, **attrs):
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attrs": self.attrs,
+        }
+
+
+class Trace(object):
+    """Spans recorded while handling a single IRC event.
+
+    The trace's root span starts when the trace is created, so it includes
+    time spent waiting in the work queue. Spans opened with span() nest
+    under the innermost open span.
+    """
+
+    def __init__(self, tracer, name, **attrs):
+        self.tracer = tracer
+        self.trace_id = _new_id(16)
+        self.root = Span(name, **attrs)
+        self.spans = []
+        self._open = [self.root]
+        self._started = time.monotonic()
+
+    @property
+    def name(self):
+        return self.root.name
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Time the enclosed block as a child span."""
+        span = Span(name, self._open[-1].span_id, **attrs)
+        self._open.append(span)
+        started = time.monotonic()
+        try:
+            yield span
+        except Exception as e:
+            span.attrs["error"] = repr(e)
+            raise
+        finally:
+            span.duration = time.monotonic() - started
+            self._open.pop()
+            self.spans.append(span)
+
+    def annotate(self, **attrs):
+        """Add attributes to the innermost open span."""
+        self._open[-1].attrs.update(attrs)
+
+    def finish(self):
+        """Close the root span and hand the trace to the tracer."""
+        if self.root.duration is None:
+            self.root.duration = time.monotonic() - self._started
+            self.tracer.record(self)
+
+    def to_dict(self):
+        return dict(
+            self.root.to_dict(),
+            trace_id=self.trace_id,
+            spans=[s.to_dict() for s in self.spans],
+        )
+
+
+class NullTrace(object):
+    """A trace that records nothing."""
+
+    trace_id = None
+
+    def span(self, name, **attrs):
+        return contextlib.nullcontext()
+
+    def annotate(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL = NullTrace()
+
+
+class NullTracer(object):
+    """Tracer used when tracing is disabled."""
+
+    def start(self, name, **attrs):
+        return NULL
+
+    def stop(self):
+        pass
+
+
+class Tracer(object):
+    """Record traces to a rotating JSON lines file.
+
+    Each finished trace is written as one line. If 'otlp_url' is set the
+    spans are also sent to an OpenTelemetry collector using the OTLP/HTTP
+    JSON encoding (e.g. http://localhost:4318/v1/traces). Export happens on
+    a background thread; traces are dropped if the collector falls behind.
+    """
+
+    def __init__(self, config, logger):
+        self.logger = logger
+        self.path = os.path.expanduser(
+            config.get("file", "~/stashbot-traces.jsonl")
+        )
+        self.dropped = 0
+        self._log = logging.getLogger("stashbot.tracing.%d" % id(self))
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        self._handler = logging.handlers.RotatingFileHandler(
+            self.path,
+            maxBytes=config.get("max_bytes", 10 * 1024 * 1024),
+            backupCount=config.get("backups", 5),
+            delay=True,
+        )
+        self._log.addHandler(self._handler)
+
+        self.otlp_url = config.get("otlp_url")
+        self.service = config.get("service", "stashbot")
+        self._queue = queue.Queue(config.get("otlp_queue", 1000))
+        self._thread = None
+        if self.otlp_url:
+            self._thread = threading.Thread(
+                target=self._export, name="otlp", daemon=True
+            )
+            self._thread.start()
+
+    def start(self, name, **attrs):
+        """Start a new trace."""
+        return Trace(self, name, **attrs)
+
+    def record(self, trace):
+        """Save a finished trace."""
+        data = trace.to_dict()
+        self._log.info(json.dumps(data, sort_keys=True))
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(data)
+            except queue.Full:
+                self.dropped += 1
+
+    def stop(self):
+        """Stop exporting and close the trace file."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(5)
+            self._thread = None
+        self._handler.close()
+
+    def _export(self):
+        import requests
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch
+            batch = [t for t in batch if t is not None]
+            if batch:
+                try:
+                    requests.post(
+                        self.otlp_url,
+                        json=otlp_payload(batch, self.service),
+                        timeout=5,
+                    ).raise_for_status()
+                except Exception:
+                    self.dropped += len(batch)
+                    self.logger.exception("Failed to export traces")
+            if done:
+                return
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace_id, span):
+    start = int(span["start"] * 1e9)
+    out = {
+        "traceId": trace_id,
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(start + int(span["duration"] * 1e9)),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)}
+            for k, v in sorted(span["attrs"].items())
+        ],
+    }
+    if span["parent_id"]:
+        out["parentSpanId"] = span["parent_id"]
+    if "error" in span["attrs"]:
+        out["status"] = {"code": 2, "message": span["attrs"]["error"]}
+    return out
+
+
+def otlp_payload(traces, service="stashbot"):
+    """Convert recorded traces to an OTLP/HTTP JSON request body."""
+    spans = []
+    for t in traces:
+        spans.append(_otlp_span(t["trace_id"], t))
+        spans.extend(_otlp_span(t["trace_id"], s) for s in t["spans"])
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {
+                            "key": "service.name",
+                            "value": {"stringValue": service},
+                        }
+                    ]
+                },
+                "scopeSpans": [
+                    {"scope": {"name": "stashbot"}, "spans": spans}
+                ],
+            }
+        ]
+    }
+
+
+def make_tracer(config, logger):
+    """Get a Tracer for the 'trace' config section or a NullTracer."""
+    if not config:
+        return NullTracer()
+    return Tracer(config, logger)
+
+
+def read_traces(path):
+    """Read traces from a trace file and its rotated backups."""
+    names = [path] + sorted(glob.glob(glob.escape(path) + ".[0-9]*"))
+    for name in names:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def slowest(traces, count=10, name=None):
+    """Find the slowest traces.
+
+    >>> slowest([{"name": "a", "duration": 1}, {"name": "b", "duration": 2}],
+    ...     count=1)
+    [{'name': 'b', 'duration': 2}]
+    """
+    if name is not None:
+        traces = (t for t in traces if t["name"] == name)
+    return sorted(traces, key=lambda t: t["duration"], reverse=True)[:count]
+
+
+def format_trace(trace):
+    """Format a trace as an indented tree of spans."""
+    children = {}
+    for span in trace["spans"]:
+        children.setdefault(span["parent_id"], []).append(span)
+    lines = []
+
+    def walk(span, depth):
+        attrs = " ".join(
+            "%s=%s" % (k, v) for k, v in sorted(span["attrs"].items())
+        )
+        lines.append(
+            "%s%8.1fms %s %s"
+            % ("  " * depth, span["duration"] * 1000, span["name"], attrs)
+        )
+        for child in sorted(
+            children.get(span["span_id"], []), key=lambda s: s["start"]
+        ):
+            walk(child, depth + 1)
+
+    lines.append(
+        "%s %s"
+        % (
+            trace["trace_id"],
+            time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(trace["start"])),
+        )
+    )
+    walk(trace, 1)
+    return "\n".join(line.rstrip() for line in lines)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Detect a blocked reactor loop"""
+
+import sys
+import threading
+import time
+import traceback
+
+
+class Watchdog(object):
+    """Measure how late the reactor runs a heartbeat.
+
+    A heartbeat is scheduled on the reactor every 'interval' seconds. Any
+    time past the expected run time is lag caused by something blocking
+    the reactor thread. A separate thread checks the heartbeat too, so
+    that a loop that is blocked right now is noticed while it is still
+    blocked. When lag passes 'threshold' seconds the stack of the reactor
+    thread is logged once, showing what it is stuck on.
+    """
+
+    def __init__(self, reactor, logger, interval=1.0, threshold=5.0):
+        self.reactor = reactor
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.loop_thread = None
+        self._dumped = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.last_beat = time.monotonic()
+        self.reactor.scheduler.execute_after(self.interval, self.beat)
+        self._thread = threading.Thread(
+            target=self._watch, name="watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def beat(self):
+        """Heartbeat run by the reactor."""
+        now = time.monotonic()
+        self.loop_thread = threading.get_ident()
+        self.last_lag = max(0.0, now - self.last_beat - self.interval)
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self.last_beat = now
+        if self.last_lag > self.threshold:
+            self.logger.warning(
+                "Reactor loop was blocked for %.1fs", self.last_lag
+            )
+        self._dumped = False
+        # Re-arm rather than using execute_every so that a long block
+        # doesn't cause a burst of catch up heartbeats.
+        self.reactor.scheduler.execute_after(self.interval, self.beat)
+
+    def lag(self):
+        """Get the current reactor lag in seconds.
+
+        This includes time spent waiting on a heartbeat that is overdue.
+        """
+        overdue = time.monotonic() - self.last_beat - self.interval
+        return max(self.last_lag, overdue, 0.0)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self.last_beat - self.interval
+            if overdue > self.threshold and not self._dumped:
+                self._dumped = True
+                self.logger.error(
+                    "Reactor loop blocked for %.1fs at:\n%s",
+                    overdue,
+                    self.loop_stack(),
+                )
+
+    def loop_stack(self):
+        """Get the current stack of the reactor thread as a string."""
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return "(unknown)"
+        return "".join(traceback.format_stack(frame))
+
+    def stats(self):
+        return {
+            "lag": round(self.lag(), 3),
+            "max_lag": round(self.max_lag, 3),
+        }
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Small HTTP server for status and feed endpoints"""
+
+import http.server
+import json
+import threading
+import urllib.parse
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    server_version = "Stashbot"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        handler, args = self.server.app.find(url.path)
+        if handler is None:
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            resp = handler(self, query, *args)
+        except Exception:
+            self.server.app.logger.exception("Error handling %s", self.path)
+            self.send_json(500, {"error": "Internal error"})
+            return
+        if resp is not None:
+            self.send_json(*resp)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.app.logger.debug(
+            "%s - %s", self.address_string(), format % args
+        )
+
+
+class Server(object):
+    """Threaded HTTP server running beside the bot.
+
+    Handlers are registered for a path with route(). A route path ending
+    in '/' also matches any longer path, and the rest of the path is split
+    on '/' and passed to the handler as extra arguments.
+
+    Handlers are called as ``handler(request, query, *args)`` from a
+    server thread and must be thread safe. They either return a tuple of
+    (status, data) to send as JSON or write a response themselves to
+    ``request`` and return None.
+    """
+
+    def __init__(self, host, port, logger):
+        self.logger = logger
+        self.routes = {}
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def route(self, path, handler):
+        self.routes[path] = handler
+
+    def find(self, path):
+        """Find the handler for a path.
+
+        :return: tuple of (handler, list of args) or (None, None)
+        """
+        if path in self.routes:
+            return self.routes[path], []
+        for prefix, handler in self.routes.items():
+            if prefix.endswith("/") and path.startswith(prefix):
+                rest = path.replace(prefix, "", 1).strip("/")
+                if rest:
+                    return handler, rest.split("/")
+        return None, None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="webserver", daemon=True
+        )
+        self.thread.start()
+        self.logger.info("Listening for http requests on port %d", self.port)
+
+    def stop(self):
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.thread = None
+        self.httpd.server_close()
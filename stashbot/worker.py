@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Run bot work in separate worker processes
+
+In split mode the IRC front end only talks to the IRC servers. Jobs that
+need backends (!log, !bash, irc-* indexing and phab echo) are sent to
+worker processes as JSON lines over a Unix socket. Workers send back the
+messages that the bot should say, an ack when each job is done and the SAL
+messages they publish, also as JSON lines.
+
+Job::
+
+    {"id": 1, "class": "sal", "network": "libera", "nick": "stashbot",
+     "event": {"type": "pubmsg", "source": "...", "target": "#chan",
+               "arguments": ["!log ..."], "tags": []},
+     "doc": {...}, "attrs": {}}
+
+Reply::
+
+    {"network": "libera", "target": "#chan", "text": "..."}
+
+Ack, with the worker's count of consecutive failed Elasticsearch writes::
+
+    {"ack": 1, "es_failures": 0}
+
+Feed message::
+
+    {"feed": {"id": "...", "project": "tools", ...}}
+"""
+
+import collections
+import functools
+import itertools
+import os
+import queue
+import socket
+import threading
+import zlib
+
+import irc.client
+
+from . import serializer
+
+STOP = object()
+
+
+def encode_event(event):
+    """Make a JSON safe dict from an irc.client.Event."""
+    return {
+        "type": event.type,
+        "source": event.source,
+        "target": event.target,
+        "arguments": event.arguments,
+        "tags": event.tags,
+    }
+
+
+def decode_event(data):
+    """Make an irc.client.Event from encode_event() output.
+
+    >>> event = decode_event(encode_event(irc.client.Event(
+    ...     "pubmsg", irc.client.NickMask("nick!user@host"), "#chan", ["hi"]
+    ... )))
+    >>> event.source.nick, event.target, event.arguments
+    ('nick', '#chan', ['hi'])
+    """
+    source = data["source"]
+    if source is not None:
+        source = irc.client.NickMask(source)
+    return irc.client.Event(
+        data["type"], source, data["target"], data["arguments"], data["tags"]
+    )
+
+
+def encode(msg):
+    return serializer.dumps(msg) + b"\n"
+
+
+class Peer(object):
+    """One end of a socket carrying JSON lines.
+
+    Sends are queued and written by a thread so that a slow peer never
+    blocks the caller. Received messages are passed to handler(peer, msg)
+    on the reader thread.
+    """
+
+    def __init__(self, sock, handler, logger, size=1000, on_close=None):
+        self.sock = sock
+        self.handler = handler
+        self.logger = logger
+        self.on_close = on_close
+        self.outbox = queue.Queue(size)
+        self.closed = False
+        for target, name in ((self._read, "read"), (self._write, "write")):
+            threading.Thread(
+                target=target, name="peer-%s" % name, daemon=True
+            ).start()
+
+    def send(self, msg):
+        """Queue a message.
+
+        :return: False if the peer is closed or too far behind
+        """
+        if self.closed:
+            return False
+        try:
+            self.outbox.put_nowait(encode(msg))
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.outbox.put(STOP)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def _read(self):
+        try:
+            for line in self.sock.makefile("rb"):
+                try:
+                    msg = serializer.loads(line)
+                except ValueError:
+                    self.logger.error("Ignoring bad message: %r", line)
+                    continue
+                try:
+                    self.handler(self, msg)
+                except Exception:
+                    self.logger.exception("Error handling %r", msg)
+        except OSError:
+            pass
+        self.close()
+
+    def _write(self):
+        while True:
+            data = self.outbox.get()
+            if data is STOP:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.logger.exception("Failed to write to peer")
+                break
+        self.close()
+        self.sock.close()
+
+
+class Dispatcher(object):
+    """Send jobs from the IRC front end to connected workers.
+
+    Jobs for a channel always go to the same worker while the set of
+    workers does not change, so per channel state such as phab echo
+    history stays in one place. Replies are queued by the reader threads
+    and said by deliver() on the reactor thread.
+
+    Each job is kept until its worker acks it. The jobs of a worker that
+    disconnects are sent to another worker, or done by the front end if
+    none is left. A job that was done just before its worker died can be
+    done twice, but is never lost.
+    """
+
+    def __init__(self, path, backends, logger, size=1000):
+        self.path = os.path.expanduser(path)
+        self.backends = backends
+        self.logger = logger
+        self.size = size
+        self.workers = []
+        self.replies = queue.Queue()
+        self.orphans = queue.Queue()
+        self.pending = collections.OrderedDict()
+        self.es_failures = {}
+        self.sent = 0
+        self.fallbacks = 0
+        self.requeued = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sock = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._sock.listen()
+        threading.Thread(
+            target=self._accept, name="dispatcher", daemon=True
+        ).start()
+        self.backends.reactor.scheduler.execute_every(
+            period=0.1, func=self.deliver
+        )
+
+    def stop(self):
+        for peer in list(self.workers):
+            peer.close()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            os.unlink(self.path)
+
+    def _accept(self):
+        while self._sock is not None:
+            try:
+                sock, addr = self._sock.accept()
+            except OSError:
+                return
+            peer = Peer(
+                sock,
+                self._received,
+                self.logger,
+                size=self.size,
+                on_close=self._closed,
+            )
+            self.workers.append(peer)
+            self.logger.info("Worker connected; %d now", len(self.workers))
+
+    def _received(self, peer, msg):
+        if "ack" in msg:
+            with self._lock:
+                sent = self.pending.pop(msg["ack"], None)
+                if sent is not None and "es_failures" in msg:
+                    self.es_failures[sent[0]] = msg["es_failures"]
+        elif "feed" in msg:
+            self.backends.sal.feed.publish(msg["feed"])
+        else:
+            self.replies.put(msg)
+
+    def _closed(self, peer):
+        if peer in self.workers:
+            self.workers.remove(peer)
+            self.logger.warning(
+                "Worker disconnected; %d left", len(self.workers)
+            )
+        with self._lock:
+            self.es_failures.pop(peer, None)
+            lost = [
+                job_id
+                for job_id, (owner, job) in self.pending.items()
+                if owner is peer
+            ]
+            jobs = [self.pending.pop(job_id)[1] for job_id in lost]
+        if jobs:
+            self.logger.warning("Requeueing %d unfinished jobs", len(jobs))
+        for job in jobs:
+            # Resent on the reactor thread by deliver()
+            self.orphans.put(job)
+
+    def send(self, klass, network, conn, event, doc, attrs=None):
+        """Send a job to a worker.
+
+        :return: False if the job could not be sent
+        """
+        job = {
+            "id": next(self._ids),
+            "class": klass,
+            "network": network,
+            "nick": conn.get_nickname(),
+            "event": encode_event(event),
+            "doc": doc,
+            "attrs": attrs or {},
+        }
+        sent = self._send_job(job)
+        if sent:
+            self.sent += 1
+        else:
+            self.fallbacks += 1
+        return sent
+
+    def _send_job(self, job):
+        workers = [w for w in self.workers if not w.closed]
+        if not workers:
+            return False
+        key = zlib.crc32((job["event"]["target"] or "").encode("utf-8"))
+        peer = workers[key % len(workers)]
+        with self._lock:
+            self.pending[job["id"]] = (peer, job)
+        if peer.send(job):
+            return True
+        with self._lock:
+            self.pending.pop(job["id"], None)
+        return False
+
+    def requeue(self):
+        """Resend the jobs of disconnected workers.
+
+        Jobs that no worker can take are done by the front end.
+        """
+        bots = {bot.name: bot for bot in self.backends.bots}
+        while True:
+            try:
+                job = self.orphans.get_nowait()
+            except queue.Empty:
+                return
+            self.requeued += 1
+            if self._send_job(job):
+                continue
+            bot = bots.get(job["network"])
+            if bot is None:
+                self.logger.error("No bot for network %s", job["network"])
+                continue
+            bot.run_job(
+                job["class"],
+                bot.connection,
+                decode_event(job["event"]),
+                job["doc"],
+                **job["attrs"],
+            )
+
+    def get_es_failures(self):
+        """Most consecutive failed Elasticsearch writes of any worker."""
+        with self._lock:
+            return max(self.es_failures.values(), default=0)
+
+    def deliver(self):
+        """Resend orphaned jobs and say replies from workers."""
+        self.requeue()
+        bots = {bot.name: bot for bot in self.backends.bots}
+        while True:
+            try:
+                reply = self.replies.get_nowait()
+            except queue.Empty:
+                return
+            bot = bots.get(reply["network"])
+            if bot is None or not bot.connection.is_connected():
+                self.logger.warning("Dropped reply %r", reply)
+                continue
+            bot.connection.privmsg(reply["target"], reply["text"])
+
+    def stats(self):
+        return {
+            "workers": len(self.workers),
+            "sent": self.sent,
+            "fallbacks": self.fallbacks,
+            "pending": len(self.pending),
+            "requeued": self.requeued,
+        }
+
+
+class Connection(object):
+    """Stand in for the front end's IRC connection in a worker.
+
+    Messages sent with privmsg() are returned to the front end.
+    """
+
+    def __init__(self, worker, network, nick):
+        self.worker = worker
+        self.network = network
+        self.nick = nick
+
+    def get_nickname(self):
+        return self.nick
+
+    def privmsg(self, target, text):
+        self.worker.reply(self.network, target, text)
+
+
+class Worker(object):
+    """Run jobs sent by the IRC front end.
+
+    The socket is read on a thread and jobs are handed to the bot for the
+    job's network on the reactor thread, where they are queued with the
+    usual workload priorities. Each job is acked once it has run. SAL
+    messages published to the local feed are passed on to the front end,
+    which serves the feed.
+    """
+
+    def __init__(self, path, backends, logger, retry=5):
+        self.path = os.path.expanduser(path)
+        self.backends = backends
+        self.logger = logger
+        self.retry = retry
+        self.jobs = queue.Queue()
+        self.peer = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self.backends.sal.feed.on_publish = self.publish
+        threading.Thread(
+            target=self._connect, name="worker", daemon=True
+        ).start()
+        self.backends.reactor.scheduler.execute_every(
+            period=0.1, func=self.run
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self.peer is not None:
+            self.peer.close()
+
+    def _connect(self):
+        while not self._stop.is_set():
+            if self.peer is None or self.peer.closed:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.path)
+                except OSError:
+                    sock.close()
+                else:
+                    self.logger.info("Connected to %s", self.path)
+                    self.peer = Peer(sock, self._received, self.logger)
+            self._stop.wait(self.retry)
+
+    def reply(self, network, target, text):
+        if self.peer is None or not self.peer.send(
+            {"network": network, "target": target, "text": text}
+        ):
+            self.logger.warning("Dropped reply to %s: %s", target, text)
+
+    def ack(self, peer, job_id):
+        """Tell the front end that a job is done."""
+        if job_id is None:
+            return
+        peer.send({"ack": job_id, "es_failures": self.backends.es.failures})
+
+    def publish(self, doc):
+        """Pass a SAL message on to the front end's feed."""
+        if self.peer is not None:
+            self.peer.send({"feed": doc})
+
+    def _received(self, peer, job):
+        self.jobs.put((peer, job))
+
+    def run(self):
+        """Start the jobs received since the last call.
+
+        Jobs from a connection that has closed are skipped, since the
+        front end gives them to another worker.
+        """
+        bots = {bot.name: bot for bot in self.backends.bots}
+        while True:
+            try:
+                peer, job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if peer.closed:
+                self.logger.warning(
+                    "Skipping job %s from a closed connection", job.get("id")
+                )
+                continue
+            bot = bots.get(job["network"])
+            if bot is None:
+                self.logger.error("No bot for network %s", job["network"])
+                continue
+            bot.run_job(
+                job["class"],
+                Connection(self, job["network"], job["nick"]),
+                decode_event(job["event"]),
+                job["doc"],
+                # Ack on the connection the job came from
+                done=functools.partial(self.ack, peer, job.get("id")),
+                **job.get("attrs", {}),
+            )
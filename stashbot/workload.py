@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of bd808's stashbot application
+# Copyright (C) 2026 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Prioritized work queues with load shedding"""
+
+import collections
+import time
+
+SAL = "sal"
+BASH = "bash"
+PHAB = "phab"
+IRC = "irc"
+
+# Workload classes in priority order.
+# capacity: most jobs that can wait in the class's queue
+# high_water: total queued jobs (all classes) above which new jobs of the
+#   class are shed; None for classes that are never shed
+DEFAULT_CLASSES = collections.OrderedDict(
+    [
+        (SAL, {"capacity": 1000, "high_water": None}),
+        (BASH, {"capacity": 100, "high_water": None}),
+        (PHAB, {"capacity": 200, "high_water": 500}),
+        (IRC, {"capacity": 1000, "high_water": 100}),
+    ]
+)
+
+
+class Scheduler(object):
+    """Run bot work in priority order on the reactor.
+
+    Jobs are queued by workload class instead of being run by the IRC
+    event handler. Queued jobs are run from the reactor's scheduler,
+    highest priority class first, for at most 'budget' seconds at a time
+    so that the reactor can keep reading from the server.
+
+    Under load the least important work is dropped first: once the total
+    number of queued jobs passes a class's high water mark, new jobs of
+    that class are shed. With the default settings irc-* indexing is shed
+    first, then phab echo. SAL and bash jobs are only dropped if their own
+    queue is full.
+    """
+
+    def __init__(self, reactor, logger, config=None, budget=0.5):
+        self.reactor = reactor
+        self.logger = logger
+        self.budget = budget
+        self.classes = collections.OrderedDict()
+        for name, defaults in DEFAULT_CLASSES.items():
+            self.classes[name] = dict(defaults, **(config or {}).get(name, {}))
+        self.queues = collections.OrderedDict(
+            (name, collections.deque()) for name in self.classes
+        )
+        self.shed = collections.Counter()
+        self._scheduled = False
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def submit(self, klass, func, *args):
+        """Queue a job.
+
+        :param klass: workload class name
+        :param func: callable
+        :param args: arguments for func
+        :return: False if the job was shed
+        """
+        conf = self.classes[klass]
+        q = self.queues[klass]
+        high_water = conf["high_water"]
+        if len(q) >= conf["capacity"] or (
+            high_water is not None and len(self) >= high_water
+        ):
+            self.shed[klass] += 1
+            if self.shed[klass] % 100 == 1:
+                self.logger.warning(
+                    "Shedding %s work; %d jobs queued", klass, len(self)
+                )
+            return False
+        q.append((func, args))
+        if not self._scheduled:
+            self._scheduled = True
+            self.reactor.scheduler.execute_after(0, self.run)
+        return True
+
+    def run(self, budget=None, classes=None):
+        """Run queued jobs in priority order.
+
+        :param budget: seconds to spend before yielding to the reactor;
+            defaults to self.budget
+        :param classes: only run jobs of these classes; for shutdown
+        """
+        self._scheduled = False
+        budget = self.budget if budget is None else budget
+        deadline = time.monotonic() + budget
+        for name, q in self.queues.items():
+            if classes is not None and name not in classes:
+                continue
+            while q:
+                func, args = q.popleft()
+                try:
+                    func(*args)
+                except Exception:
+                    self.logger.exception("Error running %s job", name)
+                if time.monotonic() >= deadline:
+                    break
+            if q:
+                # Out of time
+                break
+        if classes is None and len(self) and not self._scheduled:
+            self._scheduled = True
+            self.reactor.scheduler.execute_after(0, self.run)
+
+    def stats(self):
+        return {
+            "queued": {name: len(q) for name, q in self.queues.items()},
+            "shed": dict(self.shed),
+        }